@@ -0,0 +1,137 @@
+"""
+Digital down converter, to extract a narrow channel from the input samples
+
+A channel is given as offset_hz:bandwidth_hz, the offset from the centre frequency of the input.
+The samples are low pass filtered to the bandwidth and decimated by as much as leaves the sample
+rate at least OVERSAMPLE times the bandwidth, so the transition band of the filter does not alias
+into the channel.
+
+The mixing is moved into the filter. Filtering x[n] e^(-jwn) with taps h[k] is the same as filtering
+x[n] with taps h[k] e^(jwk) and mixing the output, and the output is only needed at the decimated
+rate. So we mix once per output sample rather than once per input sample.
+
+The filter is polyphase. The input, with the last taps - decimation samples of the previous block
+in front of it, is viewed as rows of decimation samples. Each output sample is then the sum, over
+the taps / decimation phases, of a row times that phase of the taps. Each phase is a matrix vector
+product over all the rows at once, we loop only over the phases.
+"""
+import logging
+from typing import Tuple
+
+import numpy as np
+
+logger = logging.getLogger('spectrum_logger')
+
+OVERSAMPLE = 1.5  # output sample rate is at least this times the bandwidth
+TAPS_PER_PHASE = 24  # a blackman window of this many taps per phase has a transition of 0.23 output sample rates
+
+
+def parse_channel(spec: str) -> Tuple[float, float]:
+    """
+    :param spec: offset_hz:bandwidth_hz, e.g. 125e3:25e3
+    :return: The offset and bandwidth, or None for an empty spec
+    """
+    if not spec.strip():
+        return None
+    parts = spec.split(':')
+    try:
+        if len(parts) != 2:
+            raise ValueError()
+        offset_hz, bandwidth_hz = float(parts[0]), float(parts[1])
+        if bandwidth_hz <= 0:
+            raise ValueError()
+    except ValueError:
+        raise ValueError(f"Bad channel '{spec}', offset_hz:bandwidth_hz with a positive bandwidth")
+    return offset_hz, bandwidth_hz
+
+
+def low_pass(cutoff: float, taps: int) -> np.ndarray:
+    """
+    Windowed sinc low pass filter
+
+    :param cutoff: As a fraction of the sample rate, the -6dB point
+    :param taps: Length of the filter
+    :return: The taps, unity gain at DC
+    """
+    n = np.arange(taps) - (taps - 1) / 2
+    taps = np.sinc(2 * cutoff * n) * np.blackman(taps)
+    return taps / np.sum(taps)
+
+
+class Ddc:
+    def __init__(self, offset_hz: float, bandwidth_hz: float, sample_rate: float):
+        """
+        :param offset_hz: Centre of the channel from the centre frequency of the input
+        :param bandwidth_hz: Of the channel
+        :param sample_rate: Of the input
+        """
+        self._decimation = max(1, int(sample_rate / (bandwidth_hz * OVERSAMPLE)))
+        self._sample_rate = sample_rate / self._decimation
+        self._offset_hz = offset_hz
+        if abs(offset_hz) + bandwidth_hz / 2 > sample_rate / 2:
+            logger.error(f"Channel {offset_hz}Hz +-{bandwidth_hz / 2}Hz is not all inside +-{sample_rate / 2}Hz")
+
+        phases = TAPS_PER_PHASE if self._decimation > 1 else 1
+        taps = phases * self._decimation
+        omega = 2 * np.pi * offset_hz / sample_rate
+        # the transition band is from the edge of the channel to where it would alias back into the
+        # channel, output sample rate - bandwidth / 2, so centred on the output nyquist frequency
+        shifted = low_pass(0.5 / self._decimation, taps) * np.exp(1j * omega * np.arange(taps))
+        # phase m is the taps m*D to m*D+D-1, reversed to line up with a row of input samples
+        self._phases = np.ascontiguousarray(shifted.reshape(phases, self._decimation)[:, ::-1],
+                                            dtype=np.complex64)
+
+        # the mix of an output sample is e^(-jwn) of the input sample n its filter ends on,
+        # the first ends on sample decimation - 1
+        self._step = (-omega * self._decimation) % (2 * np.pi)
+        self._phase = (-omega * (self._decimation - 1)) % (2 * np.pi)
+
+        self._delay_seconds = (taps - 1) / 2 / sample_rate  # of the filter
+        self._history = (phases - 1) * self._decimation  # samples of the previous block we need
+        self._buffer = np.zeros(self._history, dtype=np.complex64)
+        self._held = self._history  # samples in the buffer not yet used
+
+    def get_sample_rate(self) -> float:
+        return self._sample_rate
+
+    def get_decimation(self) -> int:
+        return self._decimation
+
+    def get_offset(self) -> float:
+        return self._offset_hz
+
+    def get_delay_seconds(self) -> float:
+        return self._delay_seconds
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        """
+        Extract the channel from the next samples, the filter carries on from the last samples given
+
+        :param samples: Complex, at the input sample rate
+        :return: The channel, complex64 at the output sample rate
+        """
+        total = self._held + samples.size
+        if self._buffer.size < total:
+            grown = np.empty(total, dtype=np.complex64)
+            grown[:self._held] = self._buffer[:self._held]
+            self._buffer = grown
+        self._buffer[self._held:total] = samples
+
+        rows = total // self._decimation
+        outputs = max(0, rows - (self._phases.shape[0] - 1))
+        out = np.zeros(outputs, dtype=np.complex64)
+        if outputs:
+            blocks = self._buffer[:rows * self._decimation].reshape(rows, self._decimation)
+            last = self._phases.shape[0] - 1
+            for m, phase in enumerate(self._phases):
+                out += blocks[last - m:last - m + outputs] @ phase
+
+            mix = self._phase + self._step * np.arange(outputs)
+            out *= np.exp(1j * mix).astype(np.complex64)
+            self._phase = (self._phase + self._step * outputs) % (2 * np.pi)
+
+        # keep what the next outputs need, the history rows and any part row
+        used = outputs * self._decimation
+        self._held = total - used
+        self._buffer[:self._held] = self._buffer[used:total]
+        return out
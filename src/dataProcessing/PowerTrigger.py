@@ -0,0 +1,159 @@
+"""
+Trigger snapshots on the power in fft bins
+
+The trigger is a list of rules, any one of them exceeded counts as the frame being over:
+
+    mask:start_hz:stop_hz:dBm       any bin in the range above an absolute level
+    noise:dB                        any bin more than dB above its long term average
+    noise:start_hz:stop_hz:dB       the same over a range of frequencies
+
+and how we act on frames being over:
+
+    frames:N                        consecutive frames over before we trigger, default 1
+    holdoff:seconds                 after a trigger before we can trigger again, default 1
+    rearm:edge|level                edge (default) needs a frame that is not over before we trigger again,
+                                    level triggers again after the holdoff while we are still over
+
+e.g. mask:433.8e6:434.0e6:-60,noise:15,frames:2,holdoff:5
+
+The frequency ranges are turned into ranges of bins of the powers as they come from the fft, zero
+frequency first, when the centre frequency, sample rate or fft size changes. A frame then costs a
+max() of a slice for each range, with a subtract into a scratch array for those against the noise floor.
+"""
+import logging
+from typing import List
+from typing import Tuple
+
+import numpy as np
+
+logger = logging.getLogger('spectrum_logger')
+
+SETTLE_FRAMES = 300  # the long term average needs this long to settle before we trust the noise rules
+
+
+class PowerTrigger:
+    def __init__(self, spec: str):
+        """
+        Parse the rules
+
+        :param spec: Comma separated rules, see above
+        """
+        self._spec = spec
+        self._rules = []  # of (start_hz, stop_hz, level, relative), None for the frequencies is all of them
+        self._frames = 1
+        self._holdoff_nsec = 1e9
+        self._edge = True
+        for rule in [part.strip() for part in spec.split(',') if part.strip()]:
+            parts = rule.split(':')
+            try:
+                if parts[0] in ('mask', 'noise') and len(parts) == 4:
+                    start_hz, stop_hz = sorted((float(parts[1]), float(parts[2])))
+                    self._rules.append((start_hz, stop_hz, float(parts[3]), parts[0] == 'noise'))
+                elif parts[0] == 'noise' and len(parts) == 2:
+                    self._rules.append((None, None, float(parts[1]), True))
+                elif parts[0] == 'frames' and len(parts) == 2:
+                    self._frames = max(1, int(parts[1]))
+                elif parts[0] == 'holdoff' and len(parts) == 2:
+                    self._holdoff_nsec = abs(float(parts[1])) * 1e9
+                elif parts[0] == 'rearm' and len(parts) == 2 and parts[1] in ('edge', 'level'):
+                    self._edge = parts[1] == 'edge'
+                else:
+                    raise ValueError()
+            except ValueError:
+                raise ValueError(f"Bad power trigger rule '{rule}'")
+
+        self._geometry = None  # the centre frequency, sample rate and fft size the bins are for
+        self._bins = []  # of (first bin, last bin + 1, level, relative)
+        self._scratch = np.empty(0)
+        self._settle = 0  # frames until we use the noise rules
+
+        self._over_count = 0
+        self._armed = True
+        self._holdoff_until_nsec = 0
+        self._triggers = 0
+
+    def get_spec(self) -> str:
+        return self._spec
+
+    def get_triggers(self) -> int:
+        return self._triggers
+
+    def _bin_ranges(self, start_hz: float, stop_hz: float, centre_frequency_hz: float, sample_rate: float,
+                    fft_size: int) -> List[Tuple[int, int]]:
+        """
+        The bins of an fft, zero frequency first, covering a range of frequencies
+
+        :return: At most two ranges of bins, the range is split where it crosses zero frequency
+        """
+        if start_hz is None:
+            return [(0, fft_size)]
+        half = fft_size // 2
+        # in fftshift order, most negative frequency first
+        bin_hz = sample_rate / fft_size
+        first = max(0, int(np.floor((start_hz - centre_frequency_hz) / bin_hz + 0.5)) + half)  # nearest bins
+        last = min(fft_size, int(np.floor((stop_hz - centre_frequency_hz) / bin_hz + 0.5)) + half + 1)
+        if first >= last:
+            return []  # not in the spectrum we have
+        # back to zero frequency first
+        if last <= half:
+            return [(first + fft_size - half, last + fft_size - half)]
+        if first >= half:
+            return [(first - half, last - half)]
+        return [(first + fft_size - half, fft_size), (0, last - half)]
+
+    def _configure(self, centre_frequency_hz: float, sample_rate: float, fft_size: int) -> None:
+        self._geometry = (centre_frequency_hz, sample_rate, fft_size)
+        self._bins = []
+        for start_hz, stop_hz, level, relative in self._rules:
+            for first, last in self._bin_ranges(start_hz, stop_hz, centre_frequency_hz, sample_rate, fft_size):
+                self._bins.append((first, last, level, relative))
+        self._scratch = np.empty(fft_size)
+        self._settle = SETTLE_FRAMES if any(relative for _, _, _, relative in self._rules) else 0
+        self._over_count = 0
+        if not self._bins:
+            logger.error(f"Power trigger '{self._spec}' has nothing in the spectrum "
+                         f"of {centre_frequency_hz / 1e6}MHz +-{sample_rate / 2e6}MHz")
+
+    def _over(self, powers: np.ndarray, noise_floors: np.ndarray) -> bool:
+        for first, last, level, relative in self._bins:
+            if relative:
+                if self._settle:
+                    continue
+                above = np.subtract(powers[first:last], noise_floors[first:last], out=self._scratch[:last - first])
+                if above.max() > level:
+                    return True
+            elif powers[first:last].max() > level:
+                return True
+        return False
+
+    def evaluate(self, powers: np.ndarray, noise_floors: np.ndarray, centre_frequency_hz: float,
+                 sample_rate: float, time_nsec: float) -> bool:
+        """
+        Check a frame
+
+        :param powers: The fft bin powers in dB, zero frequency first as they come from the fft
+        :param noise_floors: The long term average of each bin in dB, in the same order
+        :param centre_frequency_hz: Of the spectrum
+        :param sample_rate: Of the spectrum
+        :param time_nsec: Of the frame
+        :return: True if we should trigger a snapshot
+        """
+        if self._geometry != (centre_frequency_hz, sample_rate, powers.size):
+            self._configure(centre_frequency_hz, sample_rate, powers.size)
+        if self._settle:
+            self._settle -= 1
+
+        if not self._over(powers, noise_floors):
+            self._over_count = 0
+            self._armed = True
+            return False
+
+        self._over_count += 1
+        if not self._armed or self._over_count < self._frames or time_nsec < self._holdoff_until_nsec:
+            return False
+
+        self._holdoff_until_nsec = time_nsec + self._holdoff_nsec
+        self._armed = not self._edge
+        self._triggers += 1
+        logger.info(f"Power trigger {self._triggers}")
+        return True
@@ -108,3 +108,6 @@ class ProcessSamples:
 
     def get_fft_used(self) -> str:
         return self._spec.get_fft_used()
+
+    def set_fft_used(self, fft: str) -> None:
+        self._spec.set_fft_used(fft)
@@ -187,6 +187,16 @@ class Spectrum:
         else:
             return "numpy"
 
+    def set_fft_used(self, fft: str) -> None:
+        """
+        Use a particular fft library rather than the fastest one we measured
+
+        :param fft: numpy, scipy or fftw, numpy if the library is not available
+        :return: None
+        """
+        self._use_scipy_fft = fft == "scipy" and fftpack is not None
+        self._use_fftw_fft = fft == "fftw" and pyfftw is not None
+
     def set_fft(self) -> None:
         """
         Decide which fft to use for the required fft length
@@ -1,18 +1,42 @@
 """
 For saving samples to file
 
-We save the raw float data to file:
-    * converting to 16bit ints takes to long
+We save the raw float data to file, or optionally 16 or 8bit ints:
+    * samples are converted to ints as they arrive, scaled, rounded and clipped by numpy into the buffer
+      they are kept in with a reusable float scratch buffer, so ints halve or quarter the memory held as well
+      as the file size
     * we don't write buffers immediately so that we won't stall the input samples
+    * samples go round a ring of segments, segments leave the ring when they are older than the pre-trigger
+      time and any running capture. Those not part of a snapshot are used again, so nothing is allocated
+      or copied per block
+    * a capture is just the start and end sample index in the ring, so captures can overlap and share the
+      samples. A trigger during a capture starts another one, and a quick second trigger still gets its
+      pre-trigger samples. A finished capture gives the writer views of the segments, not copies
+    * finished snapshots are written by a thread, the main loop hands it the buffers and carries on.
+      Snapshots waiting to be written are held in memory, a trigger that would take us over the
+      limit is rejected rather than stalling the input
     * if we are triggered before we have accumulated sufficient pre-trigger samples we just go with what we have
+    * the iqz format compresses the samples in chunks as they are written, see IqArchive
+    * a channel can be extracted, the samples are then down converted and decimated before anything
+      else is done with them, see Ddc. Everything held and written is then at the channel sample rate
 
 """
+import collections
 import datetime
+import functools
 import logging
+import os
 import pathlib
+import threading
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Tuple
 
 import numpy as np
 
+from dataProcessing import Ddc
+from misc import IqArchive
 from misc import Snapper
 from misc import wave_b as wave
 
@@ -22,14 +46,276 @@ try:
     import_error_msg = ""
     import sigmf
     from sigmf import SigMFFile
-    from sigmf.utils import get_data_type_str
 except ImportError as msg:
     sigmf = None
     SigMFFile = None
-    get_data_type_str = None
     import_error_msg = f"{__name__} has an no sigmf support: {str(msg)}"
     logging.error(import_error_msg)
 
+WRITE_CHUNK = 8 * 1024 * 1024  # bytes per write, progress is reported between them
+SEGMENT_SAMPLES = 1024 * 1024  # the ring of samples is made of segments of at most this many samples
+MIN_SEGMENT_SAMPLES = 16384
+FREE_SEGMENTS = 2  # segments kept to use again, more are made as snapshots take them
+
+# how we can store samples: numpy type of each of I and Q, scale from +-1.0 and the SigMF data type
+# the scales match those the file source uses to read them back
+SAMPLE_TYPES = {'32fle': (np.float32, 1.0, 'cf32_le'),
+                '16tle': (np.int16, 32767.5, 'ci16_le'),
+                '8t': (np.int8, 127.5, 'ci8')}
+
+
+def bytes_per_sample(sample_type: str) -> int:
+    return 2 * np.dtype(SAMPLE_TYPES[sample_type][0]).itemsize
+
+
+def sample_empty(samples: int, sample_type: str, buffer: np.ndarray = None) -> np.ndarray:
+    """
+    An uninitialised array for samples of the type, complex64 for floats or interleaved I,Q pairs of ints
+
+    :param samples: Size of the array
+    :param sample_type: One of SAMPLE_TYPES
+    :param buffer: Optional bytes to use for the array, at least samples * bytes_per_sample() of them
+    :return: The array
+    """
+    if buffer is None:
+        buffer = np.empty(samples * bytes_per_sample(sample_type), dtype=np.uint8)
+    buffer = buffer[:samples * bytes_per_sample(sample_type)]
+    if sample_type == '32fle':
+        return buffer.view(np.complex64)
+    return buffer.view(SAMPLE_TYPES[sample_type][0]).reshape(samples, 2)
+
+
+class SampleConverter:
+    """
+    Converts complex float samples to the type we store them as, straight into where they are stored
+    """
+
+    def __init__(self, sample_type: str):
+        int_type, scale, _ = SAMPLE_TYPES[sample_type]
+        self._to_int = sample_type != '32fle'
+        self._scale = np.float32(scale)
+        if self._to_int:
+            self._min = np.iinfo(int_type).min
+            self._max = np.iinfo(int_type).max
+        self._scratch = np.empty(0, dtype=np.float32)  # grows to the largest block we are given
+
+    def convert(self, data: np.ndarray, out: np.ndarray) -> None:
+        """
+        Convert the samples, no memory is allocated once the scratch buffer is big enough
+
+        :param data: Complex samples
+        :param out: Where they go, from sample_empty() and the same number of samples
+        :return: None
+        """
+        if not self._to_int:
+            out[:] = data
+            return
+        floats = np.ascontiguousarray(data, dtype=np.complex64).view(np.float32)
+        if self._scratch.shape[0] < floats.shape[0]:
+            self._scratch = np.empty(floats.shape[0], dtype=np.float32)
+        work = self._scratch[:floats.shape[0]]
+        np.multiply(floats, self._scale, out=work)
+        np.rint(work, out=work)
+        np.clip(work, self._min, self._max, out=work)
+        np.copyto(out, work.reshape(out.shape), casting='unsafe')
+
+
+class SnapWriter:
+    """
+    Writes finished snapshots on a thread, one at a time in the order they finished
+
+    The thread only runs while there is something to write, it is not a daemon so a snapshot
+    is finished before we exit.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs = collections.deque()  # of (write function, bytes)
+        self._thread = None
+        self._pending_bytes = 0  # waiting and being written
+        self._progress_bytes = 0  # of the one being written
+        self._finished = collections.deque()  # of (filename, file bytes)
+
+    def put(self, write: Callable[[Callable[[int], None]], Tuple[str, int]], size: int) -> None:
+        """
+        Queue a snapshot for writing
+
+        :param write: Writes the snapshot, given a function to report progress in bytes
+        :param size: Bytes we are holding for it
+        :return: None
+        """
+        with self._lock:
+            self._jobs.append((write, size))
+            self._pending_bytes += size
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="snap writer")
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                if not self._jobs:
+                    self._thread = None
+                    return
+                write, size = self._jobs[0]
+                self._progress_bytes = 0
+            result = None
+            try:
+                result = write(self._progress)
+            except Exception as msg:
+                # anything, or the thread dies holding the job and nothing more is written
+                logger.error(f"Failed to write snapshot, {type(msg).__name__}: {msg}")
+            finally:
+                with self._lock:
+                    self._jobs.popleft()  # frees the buffers
+                    self._pending_bytes -= size
+                    self._progress_bytes = 0
+                    if result:
+                        self._finished.append(result)
+
+    def _progress(self, count: int) -> None:
+        self._progress_bytes += count
+
+    def get_pending_bytes(self) -> int:
+        return self._pending_bytes
+
+    def get_finished(self) -> List[Tuple[str, int]]:
+        """
+        The snapshots written since we were last asked
+
+        :return: List of filename and file size in bytes
+        """
+        finished = []
+        while self._finished:
+            finished.append(self._finished.popleft())
+        return finished
+
+    def get_status(self) -> Dict:
+        """
+        :return: Number of snapshots waiting or being written, the MBytes they hold and the percentage written
+                 of the current one
+        """
+        with self._lock:
+            percent = 100.0 * self._progress_bytes / self._jobs[0][1] if self._jobs and self._jobs[0][1] else 0.0
+            return {'pending': len(self._jobs),
+                    'mbytes': round(self._pending_bytes / (1024 * 1024), 2),
+                    'percent': round(percent, 1)}
+
+    def wait(self) -> None:
+        """
+        Wait for everything queued to be written
+        """
+        with self._lock:
+            thread = self._thread
+        while thread is not None:
+            thread.join()
+            with self._lock:
+                thread = self._thread
+
+
+snap_writer = SnapWriter()  # shared by every FileOutput, so the memory limit covers them all
+
+
+def write_buffers(file, buffers: List[np.ndarray], progress: Callable[[int], None]) -> None:
+    """
+    Write the buffers in chunks, the pieces of a chunk are gathered into one system call where we can
+
+    :param file: Opened unbuffered, binary
+    :param buffers: What to write, in order
+    :param progress: Called with the bytes written after each chunk
+    :return: None
+    """
+    pieces = []
+    size = 0
+    for buff in buffers:
+        if buff.size == 0:
+            continue  # an empty array of int pairs can't be cast to bytes
+        data = memoryview(buff).cast('B')
+        for start in range(0, len(data), WRITE_CHUNK):
+            piece = data[start:start + WRITE_CHUNK]
+            pieces.append(piece)
+            size += len(piece)
+            if size >= WRITE_CHUNK:
+                _write_pieces(file, pieces)
+                progress(size)
+                pieces = []
+                size = 0
+    if pieces:
+        _write_pieces(file, pieces)
+        progress(size)
+
+
+def _write_pieces(file, pieces: List[memoryview]) -> None:
+    written = os.writev(file.fileno(), pieces) if hasattr(os, 'writev') else 0  # no writev on windows
+    for piece in pieces:
+        if written >= len(piece):
+            written -= len(piece)
+            continue
+        # a short write, carry on from where it stopped
+        piece = piece[written:]
+        written = 0
+        while len(piece):
+            piece = piece[file.write(piece):]
+
+
+def snap_filename(base_filename: str, start_time_nsec: float, centre_freq_hz: float, sample_rate_sps: float) -> str:
+    """
+    The name of a file of samples, without the extension
+
+    The file source gets the centre frequency and sample rate back from the name
+
+    :param base_filename: What the user wants it called
+    :param start_time_nsec: Time of the first sample
+    :param centre_freq_hz: Centre frequency of the samples
+    :param sample_rate_sps: Sample rate
+    :return: The filename
+    """
+    then = int(start_time_nsec / 1e9)
+    fractional_sec = (start_time_nsec / 1e9) - then
+    date_time = datetime.datetime.utcfromtimestamp(then).strftime('%Y-%m-%d_%H-%M-%S')
+    fractional_sec = str(round(fractional_sec, 3)).lstrip('0')
+    return base_filename + f".{date_time}{fractional_sec}" \
+                           f".cf{centre_freq_hz / 1e6:.6f}" \
+                           f".cplx.{sample_rate_sps:.0f}"
+
+
+def write_sigmf_meta(path: pathlib.PurePath, sample_rate_sps: float, captures: List[Tuple[int, float, float]],
+                     data_type: str = SAMPLE_TYPES['32fle'][2]) -> None:
+    """
+    Write the SigMF metadata that goes with a data file
+
+    :param path: Of the .sigmf-meta file
+    :param sample_rate_sps: Sample rate
+    :param captures: (sample index, time of that sample in nsec, centre frequency) for the start of each capture,
+                     a new one after any gap in the samples
+    :param data_type: SigMF data type of the samples
+    :return: None
+    """
+    meta = SigMFFile(
+        # don't use data_file, as we have a compliant data filename and OS can't find it without the path
+        # data_file = ,
+        # no paths allowed, so no leak of your environment
+        global_info={
+            SigMFFile.DATATYPE_KEY: data_type,
+            SigMFFile.SAMPLE_RATE_KEY: sample_rate_sps,
+            SigMFFile.DESCRIPTION_KEY: 'SDR samples.',
+            SigMFFile.VERSION_KEY: sigmf.__version__,
+            SigMFFile.RECORDER_KEY: 'pyspectrum'
+        }
+    )
+
+    for sample_index, start_time_nsec, centre_freq_hz in captures:
+        seconds, nanoseconds = divmod(int(start_time_nsec), 1000000000)
+        dt = datetime.datetime.fromtimestamp(seconds, datetime.timezone.utc) + datetime.timedelta(
+            microseconds=nanoseconds // 1000)
+        meta.add_capture(sample_index, metadata={
+            SigMFFile.FREQUENCY_KEY: centre_freq_hz,
+            SigMFFile.DATETIME_KEY: dt.isoformat(sep='T', timespec='microseconds') + 'Z',
+        })
+
+    # check for mistakes & write to disk
+    meta.tofile(str(path))
+
 
 class FileOutput:
     """
@@ -53,41 +339,71 @@ class FileOutput:
         self._post_milliseconds = config.postTriggerMilliSec
         self._pre_milliseconds = config.preTriggerMilliSec
         max_file_size = config.max_file_size
+        self._max_write_bytes = config.max_write_bytes
+        self._writer = snap_writer
 
         self._wav_flag = False
         self._sigmf_flag = False
+        self._archive_flag = False
         if config.file_format == "wav":
             self._wav_flag = True
         elif config.file_format == "sigmf":
-            self._sigmf_flag = True
+            if sigmf:
+                self._sigmf_flag = True
+            else:
+                logger.error(f"No sigmf support for snapshots, {import_error_msg}, writing raw")
+        elif config.file_format == IqArchive.EXTENSION:
+            self._archive_flag = True
+        self._archive_codec = config.archive_codec
+
+        self._sample_type = config.sample_type
+        if self._wav_flag and self._sample_type == '8t':
+            # 8bit wav is unsigned, nothing would read it back as signed I/Q
+            logger.error("No 8bit wav snapshots, using 16bit")
+            self._sample_type = '16tle'
+        self._bytes_per_sample = bytes_per_sample(self._sample_type)
+        self._converter = SampleConverter(self._sample_type)
+
+        # just a channel of the input, at the centre frequency and sample rate of the channel
+        self._ddc = None
+        channel = Ddc.parse_channel(config.channel)
+        if channel and channel[1] * Ddc.OVERSAMPLE * 2 <= self._sample_rate_sps:
+            self._ddc = Ddc.Ddc(channel[0], channel[1], self._sample_rate_sps)
+            self._centre_freq_hz += channel[0]
+            self._sample_rate_sps = self._ddc.get_sample_rate()
+            logger.info(f"Snapshots of {channel[1] / 1e3}kHz at {self._centre_freq_hz / 1e6}MHz, "
+                        f"decimated by {self._ddc.get_decimation()}")
+        elif channel:
+            logger.error(f"Snapshot channel of {channel[1] / 1e3}kHz is too wide to decimate, keeping all samples")
 
         self._max_total_samples = self._sample_rate_sps * ((self._pre_milliseconds + self._post_milliseconds) / 1000)
 
-        # check we don't go over the max file size we are allowing, 8bytes per IQ sample for float32 * 2
-        if (self._max_total_samples * 8) > max_file_size:
-            self._max_total_samples = max_file_size / 8
+        # check we don't go over the max file size we are allowing
+        if (self._max_total_samples * self._bytes_per_sample) > max_file_size:
+            self._max_total_samples = max_file_size / self._bytes_per_sample
             secs = self._max_total_samples / self._sample_rate_sps
             self._post_milliseconds = secs * 1000
             self._pre_milliseconds = 0  # curtail all pre-trigger samples
             logger.error(f"Max file size of {max_file_size}MBytes exceeded, limiting to post {secs}seconds")
 
-        self._number_samples_written = 0
-
-        self._complex_post_data = []
-        self._post_data_samples = 0
-        self._required_post_data_samples = (self._post_milliseconds / 1000) * self._sample_rate_sps
+        self._required_post_data_samples = int(np.ceil((self._post_milliseconds / 1000) * self._sample_rate_sps))
+        self._required_pre_data_samples = int(np.ceil((self._pre_milliseconds / 1000) * self._sample_rate_sps))
 
-        self._complex_pre_data = []
-        self._pre_data_samples = 0
-        self._required_pre_data_samples = (self._pre_milliseconds / 1000) * self._sample_rate_sps
-
-        self._triggered = False
-        self._file = None
-        self._start_time_nsec = 0
+        # samples go into a ring of segments, captures are ranges of the sample indices in it
+        self._segment_samples = max(MIN_SEGMENT_SAMPLES,
+                                    min(SEGMENT_SAMPLES,
+                                        self._required_pre_data_samples + self._required_post_data_samples))
+        self._segments = collections.deque()  # of [index of the first sample, samples, given to the writer]
+        self._free_segments = []  # out of the ring and not given to the writer, to use again
+        self._count = 0  # samples we have been given, the index of the next one
+        self._captures = []  # of (start index, end index, time of the start sample in nsec)
+        self._last_file_bytes = 0
+        self._error = ""
 
     def __del__(self):
-        if self._triggered:
-            self._write_to_file()
+        for start, _, start_time_nsec in self._captures:
+            # may be at exit when we can't start a thread, write what we have
+            self._write_to_file(start_time_nsec, self._views(start, self._count))
 
     def get_base_filename(self) -> str:
         return self._base_filename
@@ -107,64 +423,94 @@ class FileOutput:
     def get_post_trigger_milli_seconds(self) -> float:
         return self._post_milliseconds
 
+    def get_sample_type(self) -> str:
+        return self._sample_type
+
     def get_current_size_mbytes(self) -> float:
-        # 8bytes per sample
-        return (8 * (self._post_data_samples + self._pre_data_samples)) / (1024 * 1024)
+        return (self._bytes_per_sample * (self._count - self._keep_from())) / (1024 * 1024)
+
+    def get_active_captures(self) -> int:
+        return len(self._captures)
 
     def get_size_mbytes(self) -> float:
-        return (8 * self._max_total_samples) / (1024 * 1024)
+        return (self._bytes_per_sample * self._max_total_samples) / (1024 * 1024)
 
     def get_sps(self) -> float:
         return self._sample_rate_sps
 
-    def _start(self, time_rx_nsec: float) -> None:
-        """
-        initialise the start
+    def get_last_file_bytes(self) -> int:
+        return self._last_file_bytes
 
-        :param time_rx_nsec: the time we wish to use as the start time
-        :return: None
+    def get_and_reset_error(self) -> str:
+        error = self._error
+        self._error = ""
+        return error
+
+    def get_finished(self) -> List[Tuple[str, int]]:
+        return self._writer.get_finished()
+
+    def get_write_status(self) -> Dict:
+        return self._writer.get_status()
+
+    def wait(self) -> None:
+        self._writer.wait()
+
+    def _start(self, time_rx_nsec: float) -> bool:
         """
-        try:
-            secs_pre = self._pre_data_samples / self._sample_rate_sps
-            self._start_time_nsec = time_rx_nsec - secs_pre * 1e9
-            self._triggered = True
+        Start a capture of the pre-trigger samples we have and the post-trigger samples to come
 
-            self._complex_post_data = []
-            logger.info("Snap started")
-        except OSError as e:
-            logger.error(e)
-            self._file = None
-
-    def _filename(self, sigmf_type: str = 'data') -> str:
-        then = int(self._start_time_nsec / 1e9)
-        fractional_sec = (self._start_time_nsec / 1e9) - then
-        date_time = datetime.datetime.utcfromtimestamp(then).strftime('%Y-%m-%d_%H-%M-%S')
-        fractional_sec = str(round(fractional_sec, 3)).lstrip('0')
-        filename = self._base_filename + f".{date_time}{fractional_sec}" \
-                                         f".cf{self._centre_freq_hz / 1e6:.6f}" \
-                                         f".cplx.{self._sample_rate_sps:.0f}"
+        :param time_rx_nsec: Time of the first sample of the block we were triggered on
+        :return: False if the snapshots waiting to be written leave no memory for this one
+        """
+        start = max(self._count - self._required_pre_data_samples, self._oldest())
+        end = self._count + self._required_post_data_samples
+        size = self._bytes_per_sample * (end - start)
+        pending = self._writer.get_pending_bytes() + sum(self._bytes_per_sample * (capture_end - capture_start)
+                                                         for capture_start, capture_end, _ in self._captures)
+        if pending + size > self._max_write_bytes:
+            self._error = f"Snap trigger rejected, {pending / (1024 * 1024):.0f}MBytes still to be written"
+            logger.error(self._error)
+            return False
+
+        secs_pre = (self._count - start) / self._sample_rate_sps
+        if self._ddc:
+            secs_pre += self._ddc.get_delay_seconds()
+        self._captures.append((start, end, time_rx_nsec - secs_pre * 1e9))
+        logger.info(f"Snap started, {len(self._captures)} running")
+        return True
+
+    def _filename(self, start_time_nsec: float, sigmf_type: str = 'data') -> str:
+        filename = snap_filename(self._base_filename, start_time_nsec, self._centre_freq_hz, self._sample_rate_sps)
         if self._wav_flag:
             filename += ".wav"
         elif self._sigmf_flag:
             filename += f".sigmf-{sigmf_type}"  # surely this should be type-sigmf to allow easier parsing
+        elif self._archive_flag:
+            filename += f".{IqArchive.EXTENSION}"  # the sample type is in the archive
         else:
-            filename += ".32fle"
+            filename += f".{self._sample_type}"  # the file source takes the type from this
 
         return filename
 
-    def _write_wav(self, path: pathlib.PurePath):
+    def _write_wav(self, path: pathlib.PurePath, buffers: List[np.ndarray], progress: Callable[[int], None]):
         try:
             file = wave.open(str(path), "wb")
             file.setframerate(self._sample_rate_sps)
             file.setnchannels(2)  # iq
-            file.setsampwidth(4)  # 32bit floats
-            file.setwformat(wave.WAVE_FORMAT_IEEE_FLOAT)
+            file.setsampwidth(self._bytes_per_sample // 2)  # 32bit floats or 16bit ints
+            if self._sample_type == '32fle':
+                file.setwformat(wave.WAVE_FORMAT_IEEE_FLOAT)
+            else:
+                file.setwformat(wave.WAVE_FORMAT_PCM)
+            file.setnframes(sum(buff.shape[0] for buff in buffers))  # so the header is right first time
             # the wav module has no support for changing the format to float32
             # we will write complex float32 and the wave file will be set to int32
-            for buff in self._complex_pre_data:
-                file.writeframes(buff)
-            for buff in self._complex_post_data:
-                file.writeframes(buff)
+            chunk_samples = WRITE_CHUNK // self._bytes_per_sample
+            for buff in buffers:
+                for start in range(0, buff.shape[0], chunk_samples):
+                    chunk = buff[start:start + chunk_samples]
+                    file.writeframesraw(chunk)
+                    progress(chunk.nbytes)
             file.close()
         except OSError as e:
             err = f"failed to write wav snapshot to file, {e}"
@@ -173,127 +519,163 @@ class FileOutput:
             err = f"failed to write snapshot to wav file, {e}"
             raise ValueError(err)
 
-    def _write_sgmf_meta(self):
+    def _write_archive(self, path: pathlib.PurePath, start_time_nsec: float, buffers: List[np.ndarray],
+                       progress: Callable[[int], None]):
+        chunk_samples = WRITE_CHUNK // self._bytes_per_sample
+        with IqArchive.ArchiveWriter(str(path), self._sample_type, self._sample_rate_sps, self._centre_freq_hz,
+                                     start_time_nsec, self._archive_codec) as archive:
+            for buff in buffers:
+                for start in range(0, buff.shape[0], chunk_samples):
+                    chunk = buff[start:start + chunk_samples]
+                    archive.write(chunk)
+                    progress(chunk.nbytes)
+        logger.info(f"{path} compressed {archive.get_compression_ratio():.2f} times with {self._archive_codec}")
+
+    def _write_sgmf_meta(self, start_time_nsec: float):
         # meta data is in separate file
-        meta_filename = self._filename('meta')
+        meta_filename = self._filename(start_time_nsec, 'meta')
         path_and_meta_filename = pathlib.PurePath(self._base_directory, meta_filename)
+        write_sigmf_meta(path_and_meta_filename, self._sample_rate_sps, [(0, start_time_nsec, self._centre_freq_hz)],
+                         SAMPLE_TYPES[self._sample_type][2])
 
-        # create the metadata
-        meta = SigMFFile(
-            # don't use data_file, as we have a compliant data filename and OS can't find it without the path
-            # data_file = ,
-            # no paths allowed, so no leak of your environment
-            global_info={
-                SigMFFile.DATATYPE_KEY: get_data_type_str(self._complex_pre_data[0]),  # in this case, 'cf32_le' ??
-                SigMFFile.SAMPLE_RATE_KEY: self._sample_rate_sps,
-                SigMFFile.DESCRIPTION_KEY: 'SDR samples.',
-                SigMFFile.VERSION_KEY: sigmf.__version__,
-                SigMFFile.RECORDER_KEY: 'pyspectrum'
-            }
-        )
-
-        seconds, microseconds = divmod(self._start_time_nsec, 1000000000)
-        dt = datetime.datetime.fromtimestamp(seconds, datetime.timezone.utc) + datetime.timedelta(
-            microseconds=microseconds)
+    def _write_to_file(self, start_time_nsec: float, buffers: List[np.ndarray],
+                       progress: Callable[[int], None] = lambda count: None) -> Tuple[str, int]:
+        """
+        Write out the data to file, on the writer thread
 
-        # create a capture key at time index 0
-        meta.add_capture(0, metadata={
-            SigMFFile.FREQUENCY_KEY: self._centre_freq_hz,
-            SigMFFile.DATETIME_KEY: dt.isoformat(sep='T', timespec='microseconds') + 'Z',
-        })
+        :param start_time_nsec: Time of the first sample
+        :param buffers: The samples, in order
+        :param progress: Called with the bytes written as we go
+        :return: The filename and its size in bytes, None if we failed
+        """
+        filename = self._filename(start_time_nsec)
+        try:
+            path_and_filename = pathlib.PurePath(self._base_directory, filename)
+
+            if self._wav_flag:
+                self._write_wav(path_and_filename, buffers, progress)
+            elif self._archive_flag:
+                self._write_archive(path_and_filename, start_time_nsec, buffers, progress)
+            else:
+                # straight binary data of the sample type
+                with open(path_and_filename, "wb", buffering=0) as file:
+                    write_buffers(file, buffers, progress)
+
+                # may have to write the metadata to a separate file
+                if self._sigmf_flag:
+                    self._write_sgmf_meta(start_time_nsec)
+
+            self._last_file_bytes = os.path.getsize(path_and_filename)
+            written = sum(buff.shape[0] for buff in buffers)
+            seconds = written / self._sample_rate_sps
+            mmm = f"Record: {path_and_filename} {round(seconds, 6)}s, {written} samples"
+            logger.info(mmm)
+            return str(path_and_filename), self._last_file_bytes
+
+        except OSError as e:
+            logger.error(f"failed to write snapshot to file, {e}")
+        except wave.Error as e:
+            logger.error(f"failed to write snapshot to wav file, {e}")
+        except ValueError as e:
+            logger.error(e)
+        return None
 
-        # check for mistakes & write to disk
-        meta.tofile(str(path_and_meta_filename))
+    def _oldest(self) -> int:
+        return self._segments[0][0] if self._segments else self._count
 
-    def _write_to_file(self) -> None:
+    def _keep_from(self) -> int:
+        """
+        :return: Index of the oldest sample we still need, for the pre-trigger time or a running capture
         """
-        Write out the data to file
+        keep = min([self._count - self._required_pre_data_samples] + [start for start, _, _ in self._captures])
+        return max(keep, self._oldest())
 
+    def _views(self, start: int, end: int) -> List[np.ndarray]:
         """
-        if len(self._complex_post_data):
-            filename = self._filename()
+        The samples of a range of indices as views of the segments, which are then given to the writer
 
-            try:
-                path_and_filename = pathlib.PurePath(self._base_directory, filename)
+        :param start: Index of the first sample
+        :param end: Index after the last sample
+        :return: List of arrays, oldest first
+        """
+        views = []
+        for segment in self._segments:
+            first = max(start, segment[0])
+            last = min(end, segment[0] + self._segment_samples, self._count)
+            if first < last:
+                views.append(segment[1][first - segment[0]:last - segment[0]])
+                segment[2] = True  # the writer may still have it when it leaves the ring
+        return views
+
+    def _add_samples(self, data: np.ndarray) -> None:
+        """
+        Convert the samples into the ring, a new segment is only made when the one we are filling is full
+        and there is none free
 
-                if self._wav_flag:
-                    self._write_wav(path_and_filename)
+        :param data: The new samples
+        :return: None
+        """
+        if not self._captures:
+            # only the pre-trigger time of them can be in a snap, the rest we just count
+            skip = max(0, data.shape[0] - self._required_pre_data_samples)
+            self._count += skip
+            data = data[skip:]
+        used = 0
+        while used < data.shape[0]:
+            if not self._segments or self._count >= self._segments[-1][0] + self._segment_samples:
+                if self._free_segments:
+                    samples = self._free_segments.pop()
                 else:
-                    # straight binary data of complex 32f
-                    file = open(path_and_filename, "wb")
-                    for buff in self._complex_pre_data:
-                        file.write(buff)
-                    for buff in self._complex_post_data:
-                        file.write(buff)
-                    file.close()
-
-                    # may have to write the metadata to a separate file
-                    # do this before we delete the buffers
-                    if self._sigmf_flag:
-                        self._write_sgmf_meta()
-
-                written = self._post_data_samples + self._pre_data_samples
-                seconds = written / self._sample_rate_sps
-                mmm = f"Record: {path_and_filename} {round(seconds, 6)}s, {written} samples"
-                logger.info(mmm)
-
-                # reset
-                # Start again otherwise you will end up with samples being duplicated between quick triggers
-                self._complex_pre_data = []
-                self._pre_data_samples = 0
-                self._complex_post_data = []
-                self._post_data_samples = 0
-                self._triggered = False
-
-            except OSError as e:
-                logger.error(f"failed to write snapshot to file, {e}")
-            except wave.Error as e:
-                logger.error(f"failed to write snapshot to wav file, {e}")
-            except ValueError as e:
-                logger.error(e)
-
-            self._complex_post_data = []
-
-    def _limit_pre_samples(self) -> None:
+                    samples = sample_empty(self._segment_samples, self._sample_type)
+                self._segments.append([self._count, samples, False])
+            segment = self._segments[-1]
+            offset = self._count - segment[0]
+            count = min(data.shape[0] - used, self._segment_samples - offset)
+            self._converter.convert(data[used:used + count], segment[1][offset:offset + count])
+            used += count
+            self._count += count
+
+    def _drop_segments(self) -> None:
         """
-        keep the number of samples pre-trigger to the required number (slightly more due to blocks)
+        Segments all older than the samples we need leave the ring, those the writer has not got are used again
+
         :return: None
         """
-        while self._pre_data_samples > self._required_pre_data_samples:
-            self._pre_data_samples -= self._complex_pre_data[0].shape[0]
-            del self._complex_pre_data[0]
+        keep = self._keep_from()
+        while self._segments and min(self._segments[0][0] + self._segment_samples, self._count) <= keep:
+            _, samples, given = self._segments.popleft()
+            if not given and len(self._free_segments) < FREE_SEGMENTS:
+                self._free_segments.append(samples)
 
     def write(self, trigger: bool, data: np.array, time_rx_nsec: float) -> bool:
         """
-        Write the data for the snapshot.
-        Keep a record of samples we will write to file at the end
+        Add samples to the ring, starting a capture if we are triggered
+        Captures that have all their post-trigger samples are given to the writer thread, captures may overlap
+        and a trigger during a capture starts another one
 
-        :param trigger: Boolean that indicates we have to start writing to file
+        :param trigger: Start a capture, with this block as the first of its post-trigger samples
         :param data: To write, complex floating point values
         :param time_rx_nsec: time of this data block
-        :return: None
+        :return: True when a snapshot is finished, or the trigger was rejected
         """
+        if self._ddc:
+            data = self._ddc.process(data)
         end = False
-        if not self._triggered:
-            if trigger:
-                self._start(time_rx_nsec)  # sets self._triggered
-            else:
-                # add to pre-trigger samples
-                if self._pre_milliseconds > 0:
-                    copied = np.array(data)
-                    self._pre_data_samples += data.shape[0]
-                    self._complex_pre_data.append(copied)
-                    self._limit_pre_samples()
-
-        if self._triggered:
-            if (self._required_post_data_samples - self._post_data_samples) >= 0:
-                copied = np.array(data)
-                self._complex_post_data.append(copied)
-                self._post_data_samples += data.shape[0]
-
-            # are we finished, may not have sufficient pre-samples but can't do much about that
-            if (self._required_post_data_samples - self._post_data_samples) <= 0:
-                self._write_to_file()
+        if trigger and not self._start(time_rx_nsec):
+            end = True
+
+        self._add_samples(data)
+
+        running = []
+        for capture in self._captures:
+            start, capture_end, start_time_nsec = capture
+            if self._count >= capture_end:
+                buffers = self._views(start, capture_end)
+                size = sum(buff.nbytes for buff in buffers)
+                self._writer.put(functools.partial(self._write_to_file, start_time_nsec, buffers), size)
                 end = True
-
+            else:
+                running.append(capture)
+        self._captures = running
+        self._drop_segments()
         return end
@@ -0,0 +1,266 @@
+"""
+For recording spectrums for days of occupancy history, --spectrumRecord on the command line
+
+Each row is the peak hold of the spectrums over a few seconds, pooled keeping peaks (or repeated for
+small fft sizes) to a fixed number of bins from the most negative frequency up, and quantized:
+    * u8, a byte per bin on a fixed dB scale, or f16, half floats of the dB values
+
+Rows are kept in columns, one file each, in a directory per UTC day:
+    2024-03-24/meta.json        width, type and scale of the rows
+    2024-03-24/times.i8         nsec of the end of each row, int64
+    2024-03-24/centres.f8       centre frequency of each row, float64
+    2024-03-24/rates.f8         sample rate of each row, float64
+    2024-03-24/rows.u8          the rows, width values each
+
+The main loop only does a maximum() of each spectrum into the peak hold, rows are appended to the
+files a block of rows at a time. The reader maps the rows file, finds the rows by time from the
+times column and takes just the bins of the frequency range.
+"""
+import datetime
+import json
+import logging
+import os
+import pathlib
+from typing import List
+from typing import Tuple
+
+import numpy as np
+
+logger = logging.getLogger('spectrum_logger')
+
+ROW_TYPES = {'u8': np.dtype('u1'), 'f16': np.dtype('<f2')}
+U8_OFFSET = -200.0  # dB of a zero
+U8_STEP = 1.0  # dB
+BLOCK_ROWS = 256  # rows written at a time
+BLOCK_SECONDS = 300  # longest we hold rows before writing them
+
+
+def day_of(time_nsec: float) -> str:
+    return datetime.datetime.fromtimestamp(time_nsec / 1e9, datetime.timezone.utc).strftime('%Y-%m-%d')
+
+
+def resize(spectrum: np.ndarray, width: int) -> np.ndarray:
+    """
+    Pool a spectrum to a width keeping peaks, or repeat bins if it is narrower
+
+    :param spectrum: The powers, most negative frequency first
+    :param width: Bins wanted
+    :return: The resized spectrum
+    """
+    if spectrum.size == width:
+        return spectrum
+    if spectrum.size < width:
+        return spectrum[np.arange(width) * spectrum.size // width]
+    edges = np.arange(width) * spectrum.size // width
+    return np.maximum.reduceat(spectrum, edges)
+
+
+class SpectrumRecorder:
+    """
+    Records peak held spectrums as rows in daily columnar files
+    """
+
+    def __init__(self, directory: pathlib.PurePath, row_seconds: float, row_type: str = 'u8', width: int = 1024,
+                 block_rows: int = BLOCK_ROWS):
+        """
+        :param directory: Where the day directories go
+        :param row_seconds: Of spectrums peak held for each row
+        :param row_type: One of ROW_TYPES
+        :param width: Bins in each row
+        :param block_rows: Rows we hold before writing them
+        """
+        self._directory = directory
+        self._row_nsec = row_seconds * 1e9
+        self._row_type = row_type
+        self._width = width
+
+        self._peaks = None  # the peak hold for the row we are on
+        self._row_end_nsec = 0
+        self._last_nsec = 0
+        self._centre_freq_hz = 0.0
+        self._sample_rate_sps = 0.0
+
+        self._rows = np.zeros((block_rows, width), dtype=ROW_TYPES[row_type])
+        self._times = np.zeros(block_rows, dtype=np.int64)
+        self._centres = np.zeros(block_rows)
+        self._rates = np.zeros(block_rows)
+        self._count = 0  # rows in the block
+        self._block_start_nsec = 0
+        self._day = ""
+        self._rows_written = 0
+        os.makedirs(directory, exist_ok=True)
+        logger.info(f"Recording spectrums to {directory}, {row_seconds}s rows of {width} {row_type}")
+
+    def get_rows_written(self) -> int:
+        return self._rows_written
+
+    def add(self, powers: np.ndarray, centre_frequency_hz: float, sample_rate: float, time_nsec: float) -> None:
+        """
+        Peak hold a spectrum into the current row
+
+        :param powers: In dB, zero frequency first as they come from the fft
+        :param centre_frequency_hz: Of the spectrum
+        :param sample_rate: Of the spectrum
+        :param time_nsec: Of the spectrum
+        :return: None
+        """
+        if self._peaks is not None and (time_nsec >= self._row_end_nsec or powers.size != self._peaks.size or
+                                        centre_frequency_hz != self._centre_freq_hz or
+                                        sample_rate != self._sample_rate_sps):
+            self._end_row()
+        if self._peaks is None:
+            self._peaks = powers.copy()
+            self._row_end_nsec = time_nsec + self._row_nsec
+            self._centre_freq_hz = centre_frequency_hz
+            self._sample_rate_sps = sample_rate
+        else:
+            np.maximum(self._peaks, powers, out=self._peaks)
+        self._last_nsec = time_nsec
+
+    def _end_row(self) -> None:
+        time_nsec = int(self._last_nsec)
+        day = day_of(time_nsec)
+        if self._count and (day != self._day or self._count == self._times.size or
+                            time_nsec - self._block_start_nsec > BLOCK_SECONDS * 1e9):
+            self.flush()
+        if self._count == 0:
+            self._day = day
+            self._block_start_nsec = time_nsec
+
+        row = resize(np.fft.fftshift(self._peaks), self._width)
+        if self._row_type == 'u8':
+            scaled = (row - U8_OFFSET) / U8_STEP
+            np.clip(scaled, 0, 255, out=scaled)
+            self._rows[self._count] = np.rint(scaled, out=scaled)
+        else:
+            self._rows[self._count] = row
+        self._times[self._count] = time_nsec
+        self._centres[self._count] = self._centre_freq_hz
+        self._rates[self._count] = self._sample_rate_sps
+        self._count += 1
+        self._peaks = None
+
+    def flush(self) -> None:
+        """
+        Append the rows we hold to the files of their day
+
+        :return: None
+        """
+        if not self._count:
+            return
+        day_directory = pathlib.PurePath(self._directory, self._day)
+        try:
+            os.makedirs(day_directory, exist_ok=True)
+            meta = pathlib.Path(day_directory, "meta.json")
+            if not meta.exists():
+                meta.write_text(json.dumps({'width': self._width, 'type': self._row_type,
+                                            'offset': U8_OFFSET, 'step': U8_STEP}))
+            else:
+                existing = json.loads(meta.read_text())
+                if existing['width'] != self._width or existing['type'] != self._row_type:
+                    raise ValueError(f"{day_directory} has rows of a different width or type")
+            # rows first, a reader only uses the rows that have a time
+            for name, ext, data in (('rows', self._row_type, self._rows), ('centres', 'f8', self._centres),
+                                    ('rates', 'f8', self._rates), ('times', 'i8', self._times)):
+                with open(pathlib.PurePath(day_directory, f"{name}.{ext}"), "ab", buffering=0) as file:
+                    file.write(memoryview(data[:self._count]).cast('B'))
+            self._rows_written += self._count
+        except (OSError, ValueError) as msg:
+            logger.error(f"Failed to record spectrums, {msg}")
+        self._count = 0
+
+    def close(self) -> None:
+        if self._peaks is not None:
+            self._end_row()
+        self.flush()
+
+
+class SpectrumReader:
+    """
+    Reads the rows recorded by a SpectrumRecorder
+    """
+
+    def __init__(self, directory: pathlib.PurePath):
+        self._directory = directory
+
+    def days(self) -> List[str]:
+        return sorted(path.name for path in pathlib.Path(self._directory).iterdir()
+                      if pathlib.Path(path, "meta.json").exists())
+
+    def query(self, start_nsec: float, end_nsec: float, low_hz: float = None,
+              high_hz: float = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        The rows between two times, with just the bins between two frequencies
+
+        The frequencies are those of the bins of the first row, rows with a different centre frequency or
+        sample rate are mapped to the nearest of their bins, NaN where they have nothing
+
+        :param start_nsec: Earliest row end
+        :param end_nsec: Latest row end
+        :param low_hz: Lowest frequency, None for the lowest of the first row
+        :param high_hz: Highest frequency, None for the highest of the first row
+        :return: Times of the rows in nsec, frequencies of the bins and the dB values, rows by bins
+        """
+        days = [self._read_day(day, start_nsec, end_nsec) for day in self.days()
+                 if day_of(start_nsec) <= day <= day_of(end_nsec)]
+        days = [day for day in days if day[0].size]
+        if not days:
+            return np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros((0, 0), dtype=np.float32)
+
+        _, first_centre, first_rate, first_rows, _ = days[0]
+        width = first_rows.shape[1]
+        bin_hz = first_rate[0] / width
+        frequencies = first_centre[0] - first_rate[0] / 2 + bin_hz * (np.arange(width) + 0.5)
+        # bins that overlap the range
+        low = 0 if low_hz is None else int(np.searchsorted(frequencies, low_hz - bin_hz / 2, side='right'))
+        high = width if high_hz is None else int(np.searchsorted(frequencies, high_hz + bin_hz / 2, side='left'))
+        frequencies = frequencies[low:high]
+
+        times = np.concatenate([day[0] for day in days])
+        values = np.full((times.size, frequencies.size), np.nan, dtype=np.float32)
+        offset = 0
+        for day_times, centres, rates, rows, meta in days:
+            # rows only change geometry when the centre frequency or sample rate is changed, so few groups
+            geometry, groups = np.unique(np.stack([centres, rates], axis=1), axis=0, return_inverse=True)
+            groups = groups.reshape(-1)
+            for group, (centre, rate) in enumerate(geometry):
+                row_width = rows.shape[1]
+                bins = np.floor((frequencies - (centre - rate / 2)) / (rate / row_width)).astype(int)
+                columns = np.nonzero((bins >= 0) & (bins < row_width))[0]
+                if not columns.size:
+                    continue
+                selected = np.nonzero(groups == group)[0]
+                first_bin, last_bin = bins[columns[0]], bins[columns[-1]] + 1
+                # only the bins we want come off the disk
+                decoded = self._decode(rows[selected[0]:selected[-1] + 1, first_bin:last_bin], meta)
+                values[np.ix_(offset + selected, columns)] = \
+                    decoded[selected - selected[0]][:, bins[columns] - first_bin]
+            offset += day_times.size
+        return times, frequencies, values
+
+    def _read_day(self, day: str, start_nsec: float, end_nsec: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray,
+                                                                               np.ndarray, dict]:
+        day_directory = pathlib.PurePath(self._directory, day)
+        meta = json.loads(pathlib.Path(day_directory, "meta.json").read_text())
+        dtype = ROW_TYPES[meta['type']]
+        width = meta['width']
+        times = np.fromfile(str(pathlib.PurePath(day_directory, "times.i8")), dtype='<i8')
+        rows_path = pathlib.Path(day_directory, f"rows.{meta['type']}")
+        available = min(times.size, rows_path.stat().st_size // (width * dtype.itemsize))
+        first = int(np.searchsorted(times[:available], start_nsec, side='left'))
+        last = int(np.searchsorted(times[:available], end_nsec, side='right'))
+        if first >= last:
+            return np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0), np.zeros((0, width), dtype=dtype), meta
+
+        columns = []
+        for name in ('centres', 'rates'):
+            columns.append(np.fromfile(str(pathlib.PurePath(day_directory, f"{name}.f8")), dtype='<f8',
+                                       count=last)[first:last])
+        rows = np.memmap(rows_path, dtype=dtype, mode='r', shape=(available, width))[first:last]
+        return times[first:last], columns[0], columns[1], rows, meta
+
+    @staticmethod
+    def _decode(rows: np.ndarray, meta: dict) -> np.ndarray:
+        if meta['type'] == 'u8':
+            return rows * np.float32(meta['step']) + np.float32(meta['offset'])
+        return rows.astype(np.float32)
@@ -0,0 +1,263 @@
+"""
+For recording samples to file continuously, --record on the command line
+
+Unlike a snapshot nothing is held back, samples go to disk as they arrive:
+    * the main loop copies each block into one of a pool of large buffers, allocated once and page aligned,
+      converting to ints on the way if we are recording 16 or 8bit samples
+    * a full buffer goes to a writer thread, which writes it in one go and gives it back to the pool
+    * if the disk falls behind and the pool is empty samples are dropped and counted, the main loop never waits
+    * files are rotated by size or duration at a buffer boundary, each segment is named for the time of its
+      first sample and for sigmf has its own metadata, with a new capture after any dropped samples
+    * stopping only queues the end of the recording, the writer finishes the last segment on its own.
+      Only close() at exit waits for it
+"""
+import logging
+import pathlib
+import queue
+import threading
+from typing import Dict
+from typing import List
+
+import numpy as np
+
+from dataSink import DataSink_file
+from misc import Snapper
+
+logger = logging.getLogger('spectrum_logger')
+
+BUFFER_BYTES = 4 * 1024 * 1024  # each write to disk
+BUFFERS = 32  # in the pool, 128MBytes is a couple of seconds of a slow disk at 50MBytes/sec
+ALIGN = 4096  # bytes, memory alignment of the buffers
+
+
+def aligned_empty(samples: int, sample_type: str = '32fle', align: int = ALIGN) -> np.ndarray:
+    """
+    An uninitialised array of samples starting on an aligned address
+
+    :param samples: Size of the array
+    :param sample_type: How the samples are stored, one of DataSink_file.SAMPLE_TYPES
+    :param align: Alignment in bytes
+    :return: The array
+    """
+    raw = np.empty(samples * DataSink_file.bytes_per_sample(sample_type) + align, dtype=np.uint8)
+    offset = -raw.ctypes.data % align
+    return DataSink_file.sample_empty(samples, sample_type, raw[offset:])
+
+
+class StreamOutput:
+    """
+    Records every sample we are given to a series of files
+    """
+
+    def __init__(self, config: Snapper, record_dir: pathlib.PurePath,
+                 buffers: int = BUFFERS, buffer_bytes: int = BUFFER_BYTES):
+        """
+        Start recording
+
+        :param config: The base filename, centre frequency, sample rate and record options
+        :param record_dir: Where the files go
+        :param buffers: Number of buffers in the pool
+        :param buffer_bytes: Size of each buffer
+        """
+        self._base_filename = config.baseFilename if config.baseFilename else "snap"
+        self._base_directory = record_dir
+        self._centre_freq_hz = config.cf
+        self._sample_rate_sps = config.sps
+        self._sigmf_flag = config.record_format == "sigmf"
+        if self._sigmf_flag and not DataSink_file.sigmf:
+            logger.error(f"No sigmf support for recording, {DataSink_file.import_error_msg}, recording raw")
+            self._sigmf_flag = False
+        self._segment_bytes = int(config.record_segment_mbytes * 1024 * 1024)
+        self._segment_samples = int(config.record_segment_seconds * self._sample_rate_sps)  # 0 for no limit
+        self._sample_type = config.sample_type
+        self._bytes_per_sample = DataSink_file.bytes_per_sample(self._sample_type)
+        self._converter = DataSink_file.SampleConverter(self._sample_type)
+
+        self._buffer_samples = buffer_bytes // self._bytes_per_sample
+        self._free = queue.SimpleQueue()
+        for _ in range(buffers):
+            self._free.put(aligned_empty(self._buffer_samples, self._sample_type))
+        self._full = queue.SimpleQueue()  # of (buffer, samples, time of first sample, samples dropped before it)
+
+        # main loop side
+        self._buffer = None
+        self._count = 0
+        self._buffer_time_nsec = 0
+        self._dropped = 0  # samples, before the buffer we are filling
+        self._total_dropped = 0
+        self._stopped = False
+
+        # writer side
+        self._file = None
+        self._filename = ""
+        self._segment_written = 0  # samples
+        self._captures = []  # of (sample index, time nsec, centre frequency) in this segment
+        self._segments = 0
+        self._bytes_written = 0
+        self._error = ""
+        self._finished = queue.SimpleQueue()  # of filenames, for the main loop
+
+        self._writer = threading.Thread(target=self._run, name="stream writer")
+        self._writer.start()
+        logger.info(f"Recording {self._sample_type} to {self._base_directory}, "
+                    f"{'sigmf' if self._sigmf_flag else 'raw'} segments of "
+                    f"{config.record_segment_mbytes}MBytes or {config.record_segment_seconds}s")
+
+    def get_centre_frequency(self) -> float:
+        return self._centre_freq_hz
+
+    def get_sps(self) -> float:
+        return self._sample_rate_sps
+
+    def get_sample_type(self) -> str:
+        return self._sample_type
+
+    def get_status(self) -> Dict:
+        return {'file': self._filename,
+                'segments': self._segments,
+                'mbytes': round(self._bytes_written / (1024 * 1024), 2),
+                'dropped': self._total_dropped,
+                'error': self._error}
+
+    def get_finished(self) -> List[str]:
+        """
+        :return: The files finished since we were last asked
+        """
+        finished = []
+        while not self._finished.empty():
+            finished.append(self._finished.get())
+        return finished
+
+    def write(self, data: np.ndarray, time_rx_nsec: float) -> None:
+        """
+        Record the samples, they are copied so the caller can reuse the array
+
+        :param data: Complex samples
+        :param time_rx_nsec: Time of the first sample
+        :return: None
+        """
+        offset = 0
+        size = data.shape[0]
+        while offset < size:
+            if self._buffer is None:
+                try:
+                    self._buffer = self._free.get_nowait()
+                except queue.Empty:
+                    # disk is behind, drop rather than wait
+                    self._dropped += size - offset
+                    self._total_dropped += size - offset
+                    return
+                self._count = 0
+            if self._count == 0:
+                self._buffer_time_nsec = time_rx_nsec + int(1e9 * offset / self._sample_rate_sps)
+
+            count = min(size - offset, self._buffer_samples - self._count)
+            self._converter.convert(data[offset:offset + count], self._buffer[self._count:self._count + count])
+            self._count += count
+            offset += count
+            if self._count == self._buffer_samples:
+                self._hand_over()
+
+    def _hand_over(self) -> None:
+        self._full.put((self._buffer, self._count, self._buffer_time_nsec, self._dropped))
+        self._buffer = None
+        self._count = 0
+        self._dropped = 0
+
+    def stop(self) -> None:
+        """
+        Hand over what we have and end the recording, without waiting for the writer to finish
+
+        :return: None
+        """
+        if self._stopped:
+            return
+        self._stopped = True
+        if self._buffer is not None and self._count:
+            self._hand_over()
+        self._full.put(None)
+
+    def is_stopped(self) -> bool:
+        """
+        :return: True once stopped and the writer has finished the last file
+        """
+        return self._stopped and not self._writer.is_alive()
+
+    def close(self) -> None:
+        """
+        Write what we have and wait for the current file to be finished
+
+        :return: None
+        """
+        self.stop()
+        self._writer.join()
+
+    def _run(self) -> None:
+        while True:
+            item = self._full.get()
+            if item is None:
+                break
+            buffer, count, time_nsec, dropped = item
+            try:
+                self._write_buffer(buffer[:count], time_nsec, dropped)
+            except Exception as msg:
+                # anything, or the thread dies and every sample after is dropped
+                self._error = f"Failed to record to file, {type(msg).__name__}: {msg}"
+                logger.error(self._error)
+                self._close_segment()
+            finally:
+                self._free.put(buffer)
+        self._close_segment()
+        logger.info(f"Recording stopped, {self._segments} files {self._bytes_written / 1e6:.1f}MBytes, "
+                    f"{self._total_dropped} samples dropped")
+
+    def _write_buffer(self, samples: np.ndarray, time_nsec: float, dropped: int) -> None:
+        """
+        Write a buffer to the current segment, starting a new segment if this one is full
+
+        :param samples: To write
+        :param time_nsec: Time of the first sample
+        :param dropped: Number of samples dropped before these
+        :return: None
+        """
+        if self._file and (self._segment_written * self._bytes_per_sample + samples.nbytes > self._segment_bytes or
+                           (self._segment_samples and self._segment_written >= self._segment_samples)):
+            self._close_segment()
+
+        if self._file is None:
+            self._open_segment(time_nsec)
+        elif dropped:
+            self._captures.append((self._segment_written, time_nsec, self._centre_freq_hz))
+
+        data = memoryview(samples).cast('B')
+        while len(data):
+            data = data[self._file.write(data):]
+        self._segment_written += samples.shape[0]
+        self._bytes_written += samples.nbytes
+
+    def _open_segment(self, time_nsec: float) -> None:
+        filename = DataSink_file.snap_filename(self._base_filename, time_nsec, self._centre_freq_hz,
+                                               self._sample_rate_sps)
+        filename += ".sigmf-data" if self._sigmf_flag else f".{self._sample_type}"
+        self._filename = str(pathlib.PurePath(self._base_directory, filename))
+        self._file = open(self._filename, "wb", buffering=0)  # our buffers are big enough, no need to copy them
+        self._segment_written = 0
+        self._captures = [(0, time_nsec, self._centre_freq_hz)]
+        self._segments += 1
+
+    def _close_segment(self) -> None:
+        if self._file is None:
+            return
+        try:
+            self._file.close()
+            if self._sigmf_flag:
+                meta_filename = self._filename[:-len("data")] + "meta"
+                DataSink_file.write_sigmf_meta(pathlib.PurePath(meta_filename), self._sample_rate_sps,
+                                               self._captures, DataSink_file.SAMPLE_TYPES[self._sample_type][2])
+            seconds = self._segment_written / self._sample_rate_sps
+            logger.info(f"Record: {self._filename} {round(seconds, 6)}s, {self._segment_written} samples")
+            self._finished.put(self._filename)
+        except Exception as msg:
+            self._error = f"Failed to finish recording file, {type(msg).__name__}: {msg}"
+            logger.error(self._error)
+        self._file = None
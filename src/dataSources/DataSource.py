@@ -35,6 +35,25 @@ def read_and_reset_overflow() -> int:
     return tmp
 
 
+def ints_to_complex(data: bytes, int_type: str, scale: float) -> np.ndarray:
+    """
+    Convert interleaved I,Q ints to complex floats of +-1.0, scaled straight into the complex array
+
+    use a numpy array for speed, DO NOT use struct.unpack()
+
+    :param data: The bytes, any excess over a whole number of I,Q pairs is ignored
+    :param int_type: numpy type of I and Q, e.g. '<i2'
+    :param scale: Of a full scale int
+    :return: complex floats in a numpy array
+    """
+    int_type = np.dtype(int_type)
+    num_samples = len(data) // (2 * int_type.itemsize)
+    data_ints = np.frombuffer(data, dtype=int_type, count=num_samples * 2)
+    complex_data = np.empty(num_samples, dtype=np.complex64)
+    np.multiply(data_ints, np.float32(1.0 / scale), out=complex_data.view(np.float32))
+    return complex_data
+
+
 class DataSource:
     """
     Base class for all the DataSource classes
@@ -289,31 +308,15 @@ class DataSource:
 
         elif self._data_type == '16tle':
             # little endian short signed int
-            num_samples = len(data) // 2  # 2 bytes per number
-            # use a numpy array for speed, DO NOT use struct.unpack()
-            # unpack as shorts into ints
-            data_ints = np.ndarray(np.shape(1), dtype=f'<{num_samples}h', buffer=data)
-            # convert to floats +-1.0
-            data_floats = data_ints / 32767.5
-            # create complex, I,Q,I,Q interleaved in floats
-            complex_data = np.array(data_floats[0::2], dtype=np.complex64)
-            complex_data.imag = data_floats[1::2]
+            complex_data = ints_to_complex(data, '<i2', 32767.5)
 
         elif self._data_type == '16tbe':
             # big endian short signed int
-            num_samples = len(data) // 2  # 2 bytes per number
-            data_ints = np.ndarray(np.shape(1), dtype=f'>{num_samples}h', buffer=data)
-            data_floats = data_ints / 32767.5
-            complex_data = np.array(data_floats[0::2], dtype=np.complex64)
-            complex_data.imag = data_floats[1::2]
+            complex_data = ints_to_complex(data, '>i2', 32767.5)
 
         elif self._data_type == '8t':
             # signed 8bit binary, 2s complement
-            num_samples = len(data)  # 1 signed byte per inb
-            data_ints = np.ndarray(np.shape(1), dtype=f'{num_samples}b', buffer=data)
-            data_floats = data_ints / 127.5
-            complex_data = np.array(data_floats[0::2], dtype=np.complex64)
-            complex_data.imag = data_floats[1::2]
+            complex_data = ints_to_complex(data, 'i1', 127.5)
 
         elif self._data_type == '8o':
             # offset 8bit binary
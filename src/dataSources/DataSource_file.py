@@ -17,9 +17,9 @@ from misc import global_vars
 logger = logging.getLogger('spectrum_logger')
 
 module_type = "file"
-help_string = f"{module_type}:Filename \t- Filename, binary or wave, e.g. " \
+help_string = f"{module_type}:Filename \t- Filename, binary, wave or iqz archive, e.g. " \
               f"{module_type}:./xyz.cf123.4.cplx.200000.16tbe"
-web_help_string = "Filename - Filename, binary or wave, e.g. ./xyz.cf123.4.cplx.200000.16tbe"
+web_help_string = "Filename - Filename, binary, wave or iqz archive, e.g. ./xyz.cf123.4.cplx.200000.16tbe"
 
 
 # return an error string if we are not available
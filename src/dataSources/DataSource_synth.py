@@ -0,0 +1,335 @@
+"""
+A synthetic signal source, for load testing without any hardware
+
+Signals are a comma separated list of components, frequencies are offsets from the centre in Hz
+and levels are in dB relative to a full scale carrier:
+
+    tone:freq:level                         - a carrier
+    noise:level                             - complex gaussian noise
+    chirp:start:end:period:level            - linear sweep from start to end every period seconds
+    burst:freq:level:on:period              - a carrier on for 'on' seconds every period seconds
+    ook:freq:level:bit:period:bits          - on/off keyed packet of 'bits' random bits each 'bit' seconds long
+                                              every period seconds, like an ISM band remote
+    seed:N                                  - random seed for the noise and packets, default 1
+    unpaced                                 - produce samples as fast as they are asked for
+
+e.g. synth:tone:100e3:-20,noise:-60,ook:-250e3:-10:1e-4:0.5:64
+
+Everything is generated from tables computed when the source is opened, or the sample rate or
+block size changes, so each read is a handful of vectorised adds into a buffer we reuse.
+The returned array is overwritten by the next read.
+
+When paced we keep to the sample rate, if the reader falls more than a block behind the samples it
+missed are dropped and counted as overflows, much as real hardware would.
+"""
+
+import logging
+import time
+from typing import List
+from typing import Tuple
+
+import numpy as np
+
+from dataSources import DataSource
+
+logger = logging.getLogger('spectrum_logger')
+
+module_type = "synth"
+help_string = f"{module_type}:signals \t- Synthetic signals, comma separated list of " \
+              f"tone:freq:level, noise:level, chirp:start:end:period:level, burst:freq:level:on:period, " \
+              f"ook:freq:level:bit:period:bits, seed:N, unpaced. " \
+              f"e.g. {module_type}:tone:100e3:-20,noise:-60"
+web_help_string = "signals - Comma separated list of tone:freq:level, noise:level, " \
+                  "chirp:start:end:period:level, burst:freq:level:on:period, ook:freq:level:bit:period:bits, " \
+                  "seed:N, unpaced. e.g. tone:100e3:-20,noise:-60,ook:-250e3:-10:1e-4:0.5:64"
+
+import_error_msg = ""
+
+DEFAULT_SIGNALS = "tone:100e3:-20,noise:-60"
+NOISE_TABLE_SIZE = 1 << 18  # samples, reads step through it so the noise does not repeat every block
+MAX_TABLE_SIZE = 1 << 23  # samples, limits the memory for long chirps
+
+
+# return an error string if we are not available
+def is_available() -> Tuple[str, str]:
+    return module_type, import_error_msg
+
+
+def db_to_amplitude(level: float) -> float:
+    return 10 ** (level / 20.0)
+
+
+class Carrier:
+    """
+    A carrier, optionally keyed on and off by a periodic list of intervals
+    """
+
+    def __init__(self, freq: float, level: float, intervals: List[Tuple[float, float]] = None, period: float = 0.0):
+        """
+        :param freq: Offset from the centre in Hz
+        :param level: dB
+        :param intervals: (start, end) in seconds within the period when we are on, None for always on
+        :param period: Repeat period in seconds of the intervals
+        """
+        self.freq = freq
+        self.amplitude = db_to_amplitude(level)
+        self.intervals = intervals
+        self.period = period
+        self._phasors = None
+        self._scratch = None
+        self._rotation = 1.0
+        self._phase = complex(self.amplitude)
+        self._sample_intervals = []
+        self._period_samples = 0
+
+    def prepare(self, sample_rate: float, block: int) -> None:
+        omega = 2 * np.pi * self.freq / sample_rate
+        self._phasors = np.exp(1j * omega * np.arange(block)).astype(np.complex64)
+        self._scratch = np.empty(block, dtype=np.complex64)
+        self._rotation = complex(np.exp(1j * omega * block))
+        if self.intervals is not None:
+            self._period_samples = max(1, int(round(self.period * sample_rate)))
+            self._sample_intervals = [(int(round(start * sample_rate)), int(round(end * sample_rate)))
+                                      for start, end in self.intervals]
+
+    def add(self, out: np.ndarray, index: int) -> None:
+        """
+        Add a block of the carrier to out
+
+        :param out: Where to add, the block size
+        :param index: The sample index of the first sample in out
+        :return: None
+        """
+        if self.intervals is None:
+            np.multiply(self._phasors, self._phase, out=self._scratch)
+            out += self._scratch
+        else:
+            size = out.size
+            period_start = index - (index % self._period_samples)
+            while period_start < index + size:
+                for start, end in self._sample_intervals:
+                    first = max(period_start + start, index) - index
+                    last = min(period_start + end, index + size) - index
+                    if first < last:
+                        scratch = self._scratch[first:last]
+                        np.multiply(self._phasors[first:last], self._phase, out=scratch)
+                        out[first:last] += scratch
+                period_start += self._period_samples
+        # next block carries on where this one stopped, keep the magnitude from drifting
+        self._phase *= self._rotation
+        self._phase *= self.amplitude / abs(self._phase)
+
+
+class Table:
+    """
+    A long periodic table of samples read in blocks, used for noise and chirps
+    """
+
+    def __init__(self, samples: np.ndarray, step: int = 0):
+        """
+        :param samples: The table
+        :param step: Extra samples skipped between blocks, so a table shorter than a block rate is less obvious
+        """
+        self.samples = samples
+        self._step = step
+        self._offset = 0
+
+    def add(self, out: np.ndarray, index: int) -> None:
+        done = 0
+        size = out.size
+        table_size = self.samples.size
+        while done < size:
+            count = min(size - done, table_size - self._offset)
+            out[done:done + count] += self.samples[self._offset:self._offset + count]
+            done += count
+            self._offset = (self._offset + count) % table_size
+        self._offset = (self._offset + self._step) % table_size
+
+
+class Input(DataSource.DataSource):
+
+    def __init__(self,
+                 parameters: str,
+                 data_type: str,
+                 sample_rate: float,
+                 centre_frequency: float,
+                 input_bw: float):
+        """
+        The synthetic signal source
+
+        :param parameters: Comma separated list of signals, see the module help
+        :param data_type: Not used, samples are generated as complex floats
+        :param sample_rate: The sample rate we will generate at
+        :param centre_frequency: Reported back, signal frequencies are offsets from this
+        :param input_bw: Not used
+        """
+        if not parameters or parameters == "":
+            parameters = DEFAULT_SIGNALS
+        super().__init__(parameters, data_type, sample_rate, centre_frequency, input_bw)
+
+        self._name = module_type
+        self._connected = False
+        self._paced = True
+        self._seed = 1
+        self._specs = []  # parsed components, turned into tables by _prepare()
+        self._components = []
+        self._block = 0  # block size the tables are for
+        self._prepared_rate = 0.0
+        self._buffer = None
+        self._index = 0  # sample count since open, gives the time of the samples
+        self._start_ns = 0
+        self._start_time = 0.0  # perf_counter at the start for pacing
+        super().set_help(help_string)
+        super().set_web_help(web_help_string)
+
+    def open(self) -> bool:
+        if self._parameters == "?":
+            self._error = f"Can't scan for {module_type} devices"
+            return False
+
+        try:
+            self._parse(self._parameters)
+        except (ValueError, IndexError) as msg:
+            msgs = f"{module_type} parameters '{self._parameters}' not understood, {msg}"
+            self._error = msgs
+            logger.error(msgs)
+            raise ValueError(msgs)
+
+        self._block = 0  # tables get made on the first read
+        self._index = 0
+        self._start_ns = self.get_time_ns(0)
+        self._start_time = time.perf_counter()
+        self._overflows = 0 if self._paced else -1
+        self._connected = True
+        return self._connected
+
+    def close(self) -> None:
+        self._components = []
+        self._buffer = None
+        self._connected = False
+
+    def set_sample_rate_sps(self, sr: float) -> None:
+        super().set_sample_rate_sps(sr)
+        self._block = 0  # tables need to be made again
+        self._index = 0
+        self._start_ns = self.get_time_ns(0)
+        self._start_time = time.perf_counter()
+
+    def _parse(self, parameters: str) -> None:
+        """
+        Break the parameters up into a list of (type, values)
+
+        :param parameters: See the module help
+        :return: None
+        """
+        self._specs = []
+        self._paced = True
+        self._seed = 1
+        for part in [p.strip() for p in parameters.split(',') if p.strip() != ""]:
+            fields = part.split(':')
+            kind = fields[0]
+            values = [float(x) for x in fields[1:]]
+            if kind == "unpaced":
+                self._paced = False
+            elif kind == "seed":
+                self._seed = int(values[0])
+            elif kind in ["tone", "noise", "chirp", "burst", "ook"]:
+                expected = {"tone": 2, "noise": 1, "chirp": 4, "burst": 4, "ook": 5}[kind]
+                if len(values) != expected:
+                    raise ValueError(f"{kind} needs {expected} values, given {len(values)}")
+                self._specs.append((kind, values))
+            else:
+                raise ValueError(f"unknown signal '{kind}'")
+
+    def _prepare(self, block: int) -> None:
+        """
+        Create the tables for the current sample rate and block size
+
+        :param block: Number of samples in each read
+        :return: None
+        """
+        sps = self._sample_rate_sps
+        rng = np.random.default_rng(self._seed)
+        self._components = []
+        for kind, values in self._specs:
+            if kind == "tone":
+                component = Carrier(values[0], values[1])
+            elif kind == "noise":
+                # gaussian with the given total power
+                size = max(NOISE_TABLE_SIZE, 2 * block)
+                scale = db_to_amplitude(values[0]) / np.sqrt(2)
+                noise = (rng.standard_normal(size) + 1j * rng.standard_normal(size)) * scale
+                component = Table(noise.astype(np.complex64), step=int(rng.integers(1, block + 1)))
+            elif kind == "chirp":
+                start, end, period, level = values
+                size = min(max(1, int(round(period * sps))), MAX_TABLE_SIZE)
+                t = np.arange(size) / sps
+                rate = (end - start) / (size / sps)
+                phase = 2 * np.pi * (start * t + 0.5 * rate * t * t)
+                component = Table((db_to_amplitude(level) * np.exp(1j * phase)).astype(np.complex64))
+            elif kind == "burst":
+                freq, level, on, period = values
+                component = Carrier(freq, level, [(0.0, on)], period)
+            else:
+                # ook, runs of ones in a random packet become the on intervals
+                freq, level, bit, period, bits = values
+                pattern = [1] + list(rng.integers(0, 2, int(bits) - 1))  # always starts with a one
+                intervals = []
+                for number, value in enumerate(pattern):
+                    if value:
+                        if intervals and intervals[-1][1] == number * bit:
+                            intervals[-1] = (intervals[-1][0], (number + 1) * bit)
+                        else:
+                            intervals.append((number * bit, (number + 1) * bit))
+                component = Carrier(freq, level, intervals, period)
+
+            if isinstance(component, Carrier):
+                component.prepare(sps, block)
+            self._components.append(component)
+
+        self._buffer = np.zeros(block, dtype=np.complex64)
+        self._block = block
+        self._prepared_rate = sps
+
+    def _pace(self, number_samples: int) -> None:
+        """
+        Wait until the samples would have arrived, drop them if we are too far behind
+
+        :param number_samples: Number of samples we are about to produce
+        :return: None
+        """
+        sps = self._sample_rate_sps
+        due = self._start_time + (self._index + number_samples) / sps
+        now = time.perf_counter()
+        if now < due:
+            time.sleep(due - now)
+        elif (now - due) * sps > number_samples:
+            # more than a block behind, hardware would have overflowed and lost these
+            lost = int((now - due) * sps)
+            self._index += lost
+            self._overflows += 1
+
+    def read_cplx_samples(self, number_samples: int) -> Tuple[np.array, float]:
+        """
+        Get the next block of samples
+
+        :param number_samples: How many
+        :return: A tuple of a numpy array of complex samples, reused on the next call, and time in nsec
+        """
+        if not self._connected:
+            return None, 0
+
+        if number_samples != self._block or self._sample_rate_sps != self._prepared_rate:
+            self._prepare(number_samples)
+
+        if self._paced:
+            self._pace(number_samples)
+
+        out = self._buffer
+        out.fill(0)
+        for component in self._components:
+            component.add(out, self._index)
+
+        rx_time = self._start_ns + int(1e9 * self._index / self._sample_rate_sps)  # int keeps the nsec
+        self._index += number_samples
+        return out, rx_time
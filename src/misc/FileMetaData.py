@@ -8,7 +8,7 @@ File open class which hopefully alos gets the meta data:
 
 Only sampel type and sample rate will be recovered from a wav file.
 
-Handles binary and wav files
+Handles binary, wav and compressed iqz archive files, an archive has all the metadata in it
 Returns the open file and the associated metadata
 
 """
@@ -16,6 +16,7 @@ import logging
 from io import TextIOWrapper
 from typing import Tuple
 
+from misc import IqArchive
 from misc import wave_b as wave
 
 logger = logging.getLogger('spectrum_logger')
@@ -222,6 +223,16 @@ class FileMetaData:
             wav_file = True
 
         except wave.Error:
+            if IqArchive.is_archive(self._filename):
+                # reads as a binary file would
+                file = IqArchive.ArchiveReader(self._filename)
+                data_type = file.get_sample_type()
+                sps = file.get_sample_rate()
+                cf = file.get_centre_frequency()
+                logger.info(f"File {self._filename} opened with: cplx, {data_type}, "
+                            f"{sps:.0f}sps, {cf:.0f}Hz, {file.get_header()['codec']} archive")
+                return True, file, wav_file, data_type, sps, cf
+
             # try again as a binary file
             try:
                 file = open(self._filename, "rb")
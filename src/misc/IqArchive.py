@@ -0,0 +1,373 @@
+"""
+A compressed container for samples, for keeping snapshots that are mostly noise floor
+
+The samples are cut into chunks of a fixed duration and each chunk is compressed on its own, so we
+can start reading at any chunk. Integer samples, 16tle or 8t, compress far better than floats.
+
+    magic                   b'PYIQZ01\\n'
+    header length           uint32 little endian
+    header                  json, sample type, codec, sample rate, centre frequency, start time, chunk samples
+    chunk                   uint32 compressed bytes, uint32 samples, then the compressed samples
+    ...
+    index                   for each chunk: file offset, compressed bytes, first sample, samples, time nsec
+    index offset            uint64
+    index entries           uint32
+    magic
+
+The index is written last, if it is missing, say the writer was killed, the reader finds the chunks
+by walking their headers. Reading decompresses on a thread ahead of the reader.
+"""
+import functools
+import json
+import logging
+import lzma
+import queue
+import struct
+import threading
+import zlib
+from typing import Dict
+from typing import Tuple
+
+import numpy as np
+
+logger = logging.getLogger('spectrum_logger')
+
+MAGIC = b'PYIQZ01\n'
+EXTENSION = "iqz"
+CHUNK_SECONDS = 0.1  # of samples in each chunk
+READ_AHEAD = 4  # chunks decompressed ahead of the reader
+
+_chunk_header = struct.Struct('<II')  # compressed bytes, samples
+_footer = struct.Struct('<QI')  # index offset, index entries
+_index_type = np.dtype([('offset', '<u8'), ('bytes', '<u4'), ('sample', '<u8'), ('samples', '<u4'),
+                        ('time_nsec', '<i8')])
+
+# bytes per complex sample of the types we can hold
+SAMPLE_BYTES = {'32fle': 8, '16tle': 4, '8t': 2}
+
+# codec name: (compress, decompress), fast settings as we compress as the snapshot is written
+CODECS = {'zlib': (functools.partial(zlib.compress, level=1), zlib.decompress),
+          'lzma': (functools.partial(lzma.compress, preset=1), lzma.decompress)}
+
+try:
+    import lz4.frame
+
+    CODECS['lz4'] = (lz4.frame.compress, lz4.frame.decompress)
+except ImportError:
+    logger.info("No lz4 support in environment")
+
+try:
+    import zstandard
+
+    CODECS['zstd'] = (lambda data: zstandard.ZstdCompressor(level=1).compress(data),
+                      lambda data: zstandard.ZstdDecompressor().decompress(data))
+except ImportError:
+    logger.info("No zstd support in environment")
+
+
+def is_archive(filename: str) -> bool:
+    """
+    :param filename: File to check
+    :return: True if it starts as an archive does
+    """
+    try:
+        with open(filename, "rb") as file:
+            return file.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+class ArchiveWriter:
+    """
+    Writes samples to an archive, chunk by chunk as we are given them
+    """
+
+    def __init__(self, filename: str, sample_type: str, sample_rate_sps: float, centre_freq_hz: float,
+                 start_time_nsec: float, codec: str = 'zlib', chunk_seconds: float = CHUNK_SECONDS):
+        """
+        Create the archive
+
+        :param filename: Of the archive
+        :param sample_type: Of the samples we will be given, one of SAMPLE_BYTES
+        :param sample_rate_sps: Sample rate
+        :param centre_freq_hz: Centre frequency
+        :param start_time_nsec: Time of the first sample
+        :param codec: One of CODECS
+        :param chunk_seconds: Duration of each chunk
+        """
+        if codec not in CODECS:
+            raise ValueError(f"Archive codec {codec} not available, use one of {list(CODECS)}")
+        self._compress = CODECS[codec][0]
+        self._sample_bytes = SAMPLE_BYTES[sample_type]
+        self._sample_rate_sps = sample_rate_sps
+        self._start_time_nsec = int(start_time_nsec)
+        self._chunk_bytes = max(1, int(chunk_seconds * sample_rate_sps)) * self._sample_bytes
+
+        self._staged = bytearray()  # part of a chunk, when we are given samples that don't fill one
+        self._index = []
+        self._samples = 0
+        self._compressed_bytes = 0
+
+        self._file = open(filename, "wb")
+        header = json.dumps({'sample_type': sample_type,
+                             'codec': codec,
+                             'sample_rate': sample_rate_sps,
+                             'centre_frequency': centre_freq_hz,
+                             'start_time_nsec': self._start_time_nsec,
+                             'chunk_samples': self._chunk_bytes // self._sample_bytes}).encode()
+        self._file.write(MAGIC + struct.pack('<I', len(header)) + header)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def write(self, samples: np.ndarray) -> None:
+        """
+        Add samples to the archive, whole chunks are compressed straight from the array we are given
+
+        :param samples: Of the sample type of the archive
+        :return: None
+        """
+        if samples.size == 0:
+            return  # can't cast an empty array to bytes
+        data = memoryview(samples.reshape(-1)).cast('B')
+        if self._staged:
+            take = min(len(data), self._chunk_bytes - len(self._staged))
+            self._staged += data[:take]
+            data = data[take:]
+            if len(self._staged) == self._chunk_bytes:
+                self._write_chunk(self._staged)
+                self._staged = bytearray()
+        while len(data) >= self._chunk_bytes:
+            self._write_chunk(data[:self._chunk_bytes])
+            data = data[self._chunk_bytes:]
+        if len(data):
+            self._staged += data
+
+    def _write_chunk(self, data) -> None:
+        compressed = self._compress(data)
+        samples = len(data) // self._sample_bytes
+        time_nsec = self._start_time_nsec + int(1e9 * self._samples / self._sample_rate_sps)
+        self._index.append((self._file.tell(), len(compressed), self._samples, samples, time_nsec))
+        self._file.write(_chunk_header.pack(len(compressed), samples))
+        self._file.write(compressed)
+        self._samples += samples
+        self._compressed_bytes += len(compressed)
+
+    def get_compression_ratio(self) -> float:
+        return self._samples * self._sample_bytes / self._compressed_bytes if self._compressed_bytes else 1.0
+
+    def close(self) -> None:
+        """
+        Write what is left and the index
+
+        :return: None
+        """
+        if self._file is None:
+            return
+        if self._staged:
+            self._write_chunk(self._staged)
+            self._staged = bytearray()
+        index_offset = self._file.tell()
+        self._file.write(np.array(self._index, dtype=_index_type).tobytes())
+        self._file.write(_footer.pack(index_offset, len(self._index)) + MAGIC)
+        self._file.close()
+        self._file = None
+
+
+class ArchiveReader:
+    """
+    Reads an archive as if it was a file of raw samples, the chunks are decompressed on a thread ahead of us
+    """
+
+    def __init__(self, filename: str, read_ahead: int = READ_AHEAD):
+        """
+        Open the archive and read its index
+
+        :param filename: Of the archive
+        :param read_ahead: Number of decompressed chunks held ready for us
+        """
+        self._file = open(filename, "rb")
+        self._file_lock = threading.Lock()  # the decompression thread and the index share the file position
+        self._read_ahead = read_ahead
+        try:
+            if self._file.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{filename} is not an archive")
+            header_bytes, = struct.unpack('<I', self._file.read(4))
+            self._header = json.loads(self._file.read(header_bytes))
+            self._decompress = CODECS[self._header['codec']][1]
+            self._index = self._read_index(len(MAGIC) + 4 + header_bytes)
+        except KeyError as msg:
+            self._file.close()
+            raise ValueError(f"Archive {filename} has an unsupported codec or header, {msg}")
+        except (OSError, struct.error, json.JSONDecodeError) as msg:
+            self._file.close()
+            raise ValueError(f"Archive {filename} is unreadable, {msg}")
+        self._sample_bytes = SAMPLE_BYTES[self._header['sample_type']]
+
+        self._chunks = None  # decompressed chunks from the thread, None at the end
+        self._stop = None  # to stop the thread when we seek
+        self._current = b''  # the chunk we are reading from
+        self._position = 0  # in the current chunk
+        self._at_end = False
+        self._start(0, 0)
+
+    def _read_index(self, first_chunk: int) -> np.ndarray:
+        """
+        :param first_chunk: File offset of the first chunk
+        :return: The index, from the end of the file or by walking the chunks if it isn't there
+        """
+        self._file.seek(0, 2)
+        size = self._file.tell()
+        if size >= first_chunk + _footer.size + len(MAGIC):
+            self._file.seek(size - _footer.size - len(MAGIC))
+            footer = self._file.read(_footer.size + len(MAGIC))
+            if footer[_footer.size:] == MAGIC:
+                index_offset, entries = _footer.unpack(footer[:_footer.size])
+                self._file.seek(index_offset)
+                return np.frombuffer(self._file.read(entries * _index_type.itemsize), dtype=_index_type)
+
+        # no index, walk the chunks
+        logger.error("Archive has no index, recovering the chunks")
+        offset = first_chunk
+        index = []
+        sample = 0
+        while offset + _chunk_header.size <= size:
+            self._file.seek(offset)
+            compressed_bytes, samples = _chunk_header.unpack(self._file.read(_chunk_header.size))
+            if offset + _chunk_header.size + compressed_bytes > size:
+                break  # the last one is incomplete
+            time_nsec = self._header['start_time_nsec'] + int(1e9 * sample / self._header['sample_rate'])
+            index.append((offset, compressed_bytes, sample, samples, time_nsec))
+            offset += _chunk_header.size + compressed_bytes
+            sample += samples
+        return np.array(index, dtype=_index_type)
+
+    def get_header(self) -> Dict:
+        return self._header
+
+    def get_sample_type(self) -> str:
+        return self._header['sample_type']
+
+    def get_sample_rate(self) -> float:
+        return self._header['sample_rate']
+
+    def get_centre_frequency(self) -> float:
+        return self._header['centre_frequency']
+
+    def get_samples(self) -> int:
+        return int(self._index['sample'][-1] + self._index['samples'][-1]) if len(self._index) else 0
+
+    def get_time_range(self) -> Tuple[int, int]:
+        """
+        :return: Time of the first and last sample in nsec
+        """
+        start = self._header['start_time_nsec']
+        return start, start + int(1e9 * (self.get_samples() - 1) / self._header['sample_rate'])
+
+    def _start(self, chunk: int, skip_bytes: int) -> None:
+        """
+        Restart the decompression thread at the chunk
+
+        :param chunk: Index of the first chunk to decompress
+        :param skip_bytes: Bytes of the first chunk we don't want
+        :return: None
+        """
+        if self._stop:
+            self._stop.set()
+        self._stop = threading.Event()
+        self._chunks = queue.Queue(maxsize=self._read_ahead)
+        self._current = b''
+        self._position = skip_bytes
+        self._at_end = False
+        threading.Thread(target=self._run, args=(chunk, self._chunks, self._stop),
+                         name="archive reader", daemon=True).start()
+
+    def _run(self, first_chunk: int, chunks: queue.Queue, stop: threading.Event) -> None:
+        for entry in self._index[first_chunk:]:
+            try:
+                with self._file_lock:
+                    self._file.seek(int(entry['offset']) + _chunk_header.size)
+                    compressed = self._file.read(int(entry['bytes']))
+                item = self._decompress(compressed)
+            except (OSError, ValueError, zlib.error, lzma.LZMAError) as msg:
+                item = ValueError(f"Archive chunk at {entry['offset']} is unreadable, {msg}")
+            while not stop.is_set():
+                try:
+                    chunks.put(item, timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+            if stop.is_set() or isinstance(item, Exception):
+                return
+        while not stop.is_set():
+            try:
+                chunks.put(None, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def read(self, size: int) -> bytes:
+        """
+        Read the samples as bytes, as a file would
+
+        :param size: Bytes we want
+        :return: The bytes, fewer at the end of the archive
+        """
+        pieces = []
+        while size > 0 and not self._at_end:
+            if self._position >= len(self._current):
+                skip = self._position - len(self._current)  # only when we seek into a chunk
+                item = self._chunks.get()
+                if item is None:
+                    self._at_end = True
+                    break
+                if isinstance(item, Exception):
+                    self._at_end = True
+                    raise item
+                self._current = item
+                self._position = skip
+                continue
+            piece = memoryview(self._current)[self._position:self._position + size]
+            pieces.append(piece)
+            self._position += len(piece)
+            size -= len(piece)
+        return b''.join(pieces)
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        """
+        Move to a byte offset in the samples, from the start only
+
+        :param offset: In bytes
+        :param whence: Must be 0
+        :return: The offset
+        """
+        if whence != 0:
+            raise OSError("Archives can only seek from the start")
+        sample = offset // self._sample_bytes
+        chunk = max(0, int(np.searchsorted(self._index['sample'], sample, side='right')) - 1)
+        first = int(self._index['sample'][chunk]) if len(self._index) else 0
+        self._start(chunk, offset - first * self._sample_bytes)
+        return offset
+
+    def seek_time(self, time_nsec: float) -> int:
+        """
+        Move to the start of the chunk holding the samples at a time
+
+        :param time_nsec: Time we want
+        :return: The time of the first sample we will read in nsec
+        """
+        chunk = max(0, int(np.searchsorted(self._index['time_nsec'], time_nsec, side='right')) - 1)
+        if not len(self._index):
+            self._start(0, 0)
+            return self._header['start_time_nsec']
+        self._start(chunk, 0)
+        return int(self._index['time_nsec'][chunk])
+
+    def close(self) -> None:
+        if self._stop:
+            self._stop.set()
+        with self._file_lock:
+            self._file.close()
@@ -0,0 +1,180 @@
+"""
+Fixed bucket latency histograms
+
+Buckets are logarithmic with a fixed number of sub-buckets per power of two, HDR style, so the error
+on a reported percentile is a bounded fraction of the value whatever its magnitude.
+Recording is a bisect into a precomputed list of bucket edges and a couple of additions, cheap enough
+to use several times on every fft frame.
+"""
+
+import bisect
+from typing import Dict
+from typing import List
+
+MIN_SECONDS = 1e-6  # everything below this goes in the first bucket
+MAX_SECONDS = 16.0  # everything above this goes in the overflow bucket
+SUB_BUCKETS = 8  # per power of two, worst case error on a percentile of 1/8th of the value
+
+
+def _create_bucket_edges() -> List[float]:
+    edges = []
+    lower = MIN_SECONDS
+    while lower < MAX_SECONDS:
+        step = lower / SUB_BUCKETS
+        for sub in range(SUB_BUCKETS):
+            edges.append(lower + sub * step)
+        lower *= 2
+    edges.append(lower)
+    return edges
+
+
+# shared by all histograms, the upper edge of bucket N is _EDGES[N]
+_EDGES = _create_bucket_edges()
+
+
+class LatencyHistogram:
+
+    def __init__(self, budget: float = 0.0):
+        """
+        A histogram of times
+
+        :param budget: Times above this, in seconds, count as deadline misses. 0 for no deadline
+        """
+        self._counts = [0] * (len(_EDGES) + 1)
+        self._count = 0
+        self._total = 0.0
+        self._max = 0.0
+        self._misses = 0
+        self._budget = float('inf')
+        self.set_budget(budget)
+
+    def set_budget(self, budget: float) -> None:
+        self._budget = budget if budget > 0 else float('inf')
+
+    def get_budget(self) -> float:
+        return self._budget if self._budget != float('inf') else 0.0
+
+    def record(self, seconds: float) -> None:
+        """
+        Record a time
+
+        :param seconds: The time to record
+        :return: None
+        """
+        self._counts[bisect.bisect_left(_EDGES, seconds)] += 1
+        self._count += 1
+        self._total += seconds
+        if seconds > self._max:
+            self._max = seconds
+        if seconds > self._budget:
+            self._misses += 1
+
+    def get_count(self) -> int:
+        return self._count
+
+    def get_max(self) -> float:
+        return self._max
+
+    def get_mean(self) -> float:
+        if self._count:
+            return self._total / self._count
+        return 0.0
+
+    def get_misses(self) -> int:
+        return self._misses
+
+    def percentile(self, pc: float) -> float:
+        """
+        The time at or below which pc% of the recorded times fall
+
+        :param pc: The percentile required, 0 to 100
+        :return: Upper edge of the bucket holding the percentile, limited by the maximum seen, in seconds
+        """
+        if self._count == 0:
+            return 0.0
+        wanted = max(1, int(round(self._count * pc / 100.0)))
+        seen = 0
+        for index, count in enumerate(self._counts):
+            seen += count
+            if seen >= wanted:
+                if index < len(_EDGES):
+                    return min(_EDGES[index], self._max)
+                break
+        return self._max
+
+    def summary(self) -> Dict:
+        """
+        The state of the histogram in a form suitable for the UI, times in microseconds
+
+        :return: Dictionary of count, mean, p50, p99, p999, max and misses
+        """
+        return {'count': self._count,
+                'mean': round(1e6 * self.get_mean(), 1),
+                'p50': round(1e6 * self.percentile(50.0), 1),
+                'p99': round(1e6 * self.percentile(99.0), 1),
+                'p999': round(1e6 * self.percentile(99.9), 1),
+                'max': round(1e6 * self._max, 1),
+                'misses': self._misses}
+
+    def clear(self) -> None:
+        self._counts = [0] * (len(_EDGES) + 1)
+        self._count = 0
+        self._total = 0.0
+        self._max = 0.0
+        self._misses = 0
+
+
+class StageHistograms:
+
+    def __init__(self, stages: List[str] = None, budget: float = 0.0):
+        """
+        A set of named histograms, e.g. one per pipeline stage or plugin
+
+        :param stages: Names we know about up front, others are created on first use
+        :param budget: The deadline for each stage in seconds, 0 for none
+        """
+        self._budget = budget
+        self._histograms = {}
+        for stage in (stages or []):
+            self._histograms[stage] = LatencyHistogram(budget)
+
+    def get(self, stage: str) -> LatencyHistogram:
+        histogram = self._histograms.get(stage)
+        if histogram is None:
+            histogram = LatencyHistogram(self._budget)
+            self._histograms[stage] = histogram
+        return histogram
+
+    def record(self, stage: str, seconds: float) -> None:
+        self.get(stage).record(seconds)
+
+    def set_budget(self, budget: float) -> None:
+        self._budget = budget
+        for histogram in self._histograms.values():
+            histogram.set_budget(budget)
+
+    def get_budget(self) -> float:
+        return self._budget
+
+    def summary(self) -> Dict:
+        return {stage: histogram.summary() for stage, histogram in self._histograms.items()}
+
+    def log_line(self) -> str:
+        """
+        One line of text covering all the stages, times in microseconds
+
+        :return: The text
+        """
+        parts = []
+        for stage, histogram in self._histograms.items():
+            if histogram.get_count():
+                parts.append(f"{stage}[p50:{1e6 * histogram.percentile(50.0):.0f} "
+                             f"p99:{1e6 * histogram.percentile(99.0):.0f} "
+                             f"p99.9:{1e6 * histogram.percentile(99.9):.0f} "
+                             f"max:{1e6 * histogram.get_max():.0f} "
+                             f"miss:{histogram.get_misses()}]")
+        return ", ".join(parts)
+
+    def clear(self) -> None:
+        for histogram in self._histograms.values():
+            histogram.clear()
@@ -0,0 +1,94 @@
+"""
+Operational counters and gauges, shared with the web server for a prometheus style /metrics endpoint
+
+The values live in a shared memory array of doubles without a lock. Only the main process writes to it
+and an aligned double store is atomic on the platforms we run on, so the web server can read it at any
+time without stalling the main loop. A scrape may see one value updated and another not yet, which is fine.
+"""
+
+import multiprocessing
+import os
+from typing import List
+from typing import Tuple
+
+try:
+    import resource
+except ImportError:
+    resource = None  # windows
+
+# indexes into the shared values, must match the order of METRICS
+SAMPLES = 0
+FRAMES_PROCESSED = 1
+FRAMES_DROPPED = 2
+SOURCE_OVERFLOWS = 3
+UI_FRAMES_SENT = 4
+UI_FRAMES_DROPPED = 5
+SNAPSHOT_BYTES = 6
+PLUGIN_SECONDS = 7
+LOOP_CPU_PC = 8
+MEASURED_FPS = 9
+RSS_BYTES = 10
+
+# name, type and help for each value
+METRICS: List[Tuple[str, str, str]] = [
+    ('pyspectrum_samples_total', 'counter', 'Complex samples read from the source'),
+    ('pyspectrum_frames_processed_total', 'counter', 'FFT frames processed'),
+    ('pyspectrum_frames_dropped_total', 'counter', 'Input buffers thrown away by the keep/drop options'),
+    ('pyspectrum_source_overflows', 'gauge', 'Overflows reported by the source, -1 if it cannot tell'),
+    ('pyspectrum_ui_frames_sent_total', 'counter', 'Spectrums put on the queue to the UI'),
+    ('pyspectrum_ui_frames_dropped_total', 'counter', 'Spectrums not sent as the queue to the UI was full'),
+    ('pyspectrum_snapshot_bytes_written_total', 'counter', 'Bytes written to snapshot files'),
+    ('pyspectrum_plugin_seconds_total', 'counter', 'Time spent in analysis and report plugins'),
+    ('pyspectrum_loop_cpu_percent', 'gauge', 'Time around the main loop as a percentage of the fft frame time'),
+    ('pyspectrum_measured_fps', 'gauge', 'Spectrums per second sent to the UI'),
+    ('pyspectrum_resident_memory_bytes', 'gauge', 'Resident memory of the main process'),
+]
+
+
+def get_rss_bytes() -> int:
+    """
+    Resident memory of this process
+
+    :return: bytes, 0 if we can't find out
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    if resource:
+        # peak not current, and kbytes on linux but bytes on mac
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return 0
+
+
+class Metrics:
+
+    def __init__(self):
+        """
+        The shared values, create before starting the processes that read them
+        """
+        self._values = multiprocessing.RawArray('d', len(METRICS))
+
+    def inc(self, index: int, amount: float = 1) -> None:
+        self._values[index] += amount
+
+    def set(self, index: int, value: float) -> None:
+        self._values[index] = value
+
+    def get(self, index: int) -> float:
+        return self._values[index]
+
+    def render(self) -> str:
+        """
+        The values in the prometheus text exposition format
+
+        :return: The text
+        """
+        values = self._values[:]  # one copy so we are not reading whilst formatting
+        lines = []
+        for (name, metric_type, help_text), value in zip(METRICS, values):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.append(f"{name} {value:.17g}")
+        return "\n".join(lines) + "\n"
@@ -4,14 +4,24 @@ Put thumbnails in the web thumbnail directory
 
 This is a separate process that will run until the main program exits
 
+The snapshot directory is scanned once when we start, for files without a picture. After that the
+main loop tells us of each file the snapshot and record sinks finish. Pictures are drawn by a pool of
+worker processes, at most WORKERS of them, so a burst of snapshots is drawn in parallel. We hand the
+pool no more than a couple of files per worker at a time, the rest wait here. A worker tells us when it
+starts a file, so a picture is only slow if it takes too long once started. A slow one still counts
+against the files we hand the pool, as it still has a worker.
+
 """
 
+import collections
 import logging
 import multiprocessing
 import os
 import pathlib
+import queue
 import signal
 import time
+from typing import List
 
 from misc import SpectrumPicture
 from misc import global_vars
@@ -19,24 +29,78 @@ from misc import global_vars
 # for logging
 logger = logging.getLogger(__name__)
 
+WORKERS = max(1, min(4, (os.cpu_count() or 2) // 2))  # leave the main loop cpu
+PICTURE_SECONDS = 300  # a picture taking longer than this once started is logged
+IGNORE_EXTENSIONS = ['png', 'sigmf-meta']
+
+_picture = None  # each worker process has its own
+_started = None  # queue of (filename, time) to tell the generator a worker started a file
+
+
+def _init_worker(web_thumb_dir: str, started: multiprocessing.Queue) -> None:
+    global _picture, _started
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # we shut the pool down
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)  # which is how we do it
+    _picture = SpectrumPicture.SpectrumPicture(web_thumb_dir)
+    _started = started
+
+
+def _draw(filename: str) -> str:
+    """
+    Draw the picture of a file, in a worker process
+
+    :param filename: Of the snapshot
+    :return: An error, empty if there was none
+    """
+    _started.put((filename, time.time()))
+    try:
+        _picture.create_picture(pathlib.PurePath(filename))
+    except Exception as msg:
+        return f"{os.path.basename(filename)} {msg}"
+    return ""
+
+
+def needs_picture(path: pathlib.Path) -> bool:
+    """
+    :param path: Of a file in the snapshot directory
+    :return: True if it is a snapshot without a picture
+    """
+    filename = path.name
+    if filename.startswith(".") or any(filename.endswith(ext) for ext in IGNORE_EXTENSIONS):
+        return False
+    return not os.path.isfile(pathlib.PurePath(path.parent, filename + ".png"))
+
 
 class PicGenerator(multiprocessing.Process):
 
-    def __init__(self, snap_dir: pathlib.PurePath, web_thumb_dir: pathlib.PurePath, log_level: int):
+    def __init__(self, snap_dir: pathlib.PurePath, web_thumb_dir: pathlib.PurePath, log_level: int,
+                 workers: int = WORKERS):
         """
         Generate pictures, png, of each snapshot file
 
         :param snap_dir: Where the snapshots are
         :param web_thumb_dir: Where thumbnails for the web are to go
         :param log_level: logging
+        :param workers: Processes drawing pictures
         """
 
         multiprocessing.Process.__init__(self)
         self._snap_dir = snap_dir
         self._thumb_dir = web_thumb_dir
         self._log_level = log_level
+        self._workers = workers
+        self._new_files = multiprocessing.Queue()  # of filenames, from notify()
         self._shutdown = False
 
+    def notify(self, filename: str) -> None:
+        """
+        Called from the main process when a snapshot file is finished
+
+        :param filename: Of the new file
+        :return: None
+        """
+        self._new_files.put(str(filename))
+
     def shutdown(self):
         logger.debug("PicGenerator Shutting down")
         self._shutdown = True
@@ -60,40 +124,77 @@ class PicGenerator(multiprocessing.Process):
         # as we are in a separate process the thing that spawned us can't call shutdown correctly
         # but it can send us a signal, then we can shutdown our self
         signal.signal(signal.SIGINT, self.signal_handler)
+        signal.signal(signal.SIGTERM, self.signal_handler)  # so we stop our workers too
 
         logger.info("Pic generator started")
         logger.info(f"paths '{self._snap_dir}'")
         logger.info(f"thumbs '{self._thumb_dir}'")
 
         if SpectrumPicture.can_create_pictures():
-            gen = SpectrumPicture.SpectrumPicture(str(self._thumb_dir))
-            while not self._shutdown:
-                try:
-                    # get all the non-hidden and non png and meta files in snapshot dir
-                    for path in pathlib.Path(self._snap_dir).iterdir():
-                        filename = os.path.basename(path)
-                        if not filename.startswith("."):
-                            ignore_extensions = ['png', 'sigmf-meta']
-                            excluded = False
-                            for ext in ignore_extensions:
-                                if filename.endswith(ext):
-                                    excluded = True
-                            if not excluded:
-                                # if png does not exist then create one
-                                png_filename = pathlib.PurePath(path.parent, path.name + ".png")
-                                if not os.path.isfile(png_filename):
-                                    try:
-                                        _ = gen.create_picture(path)  # returns True if managed to create picture
-                                    except ValueError as msg:
-                                        logger.error(f"PicGenerator {msg}")
-
-                    time.sleep(1)  # check every second
-
-                except Exception as msg:
-                    logger.error(f"PicGenerator {msg}")
-                    time.sleep(1)
+            try:
+                self._draw_pictures()
+            except Exception as msg:
+                logger.error(f"PicGenerator {msg}")
         else:
             logger.error("Cant create spectral pictures, spectrumPicture failed")
 
         logger.error("Process exited")
         return
+
+    def _missing(self) -> List[str]:
+        try:
+            return sorted(str(path) for path in pathlib.Path(self._snap_dir).iterdir() if needs_picture(path))
+        except OSError as msg:
+            logger.error(f"PicGenerator {msg}")
+            return []
+
+    def _draw_pictures(self) -> None:
+        waiting = collections.deque(self._missing())
+        logger.info(f"{len(waiting)} snapshots without pictures, {self._workers} workers")
+        queued = set(waiting)  # waiting or being drawn, a file is only drawn once
+        drawing = {}  # of filename: [result, time a worker started it or None, logged as slow]
+        started = multiprocessing.Queue()
+        pool = multiprocessing.Pool(self._workers, _init_worker, (str(self._thumb_dir), started))
+        try:
+            while not self._shutdown:
+                # wait for new files, not for long if pictures are being drawn
+                try:
+                    filename = self._new_files.get(timeout=0.2 if drawing else 1.0)
+                    while True:
+                        if filename not in queued:
+                            queued.add(filename)
+                            waiting.append(filename)
+                        filename = self._new_files.get_nowait()
+                except queue.Empty:
+                    pass
+
+                try:
+                    while True:
+                        filename, start = started.get_nowait()
+                        if filename in drawing:
+                            drawing[filename][1] = start
+                except queue.Empty:
+                    pass
+
+                now = time.time()
+                for filename, (result, start, slow) in list(drawing.items()):
+                    if result.ready():
+                        error = result.get()
+                        if error:
+                            logger.error(f"PicGenerator {error}")
+                        drawing.pop(filename)
+                        queued.discard(filename)
+                    elif start is not None and not slow and now - start > PICTURE_SECONDS:
+                        # can't be taken off its worker, so it still counts as being drawn
+                        logger.error(f"PicGenerator {os.path.basename(filename)} taking over {PICTURE_SECONDS}s")
+                        drawing[filename][2] = True
+
+                while waiting and len(drawing) < 2 * self._workers:
+                    filename = waiting.popleft()
+                    if not needs_picture(pathlib.Path(filename)):
+                        queued.discard(filename)  # drawn since it was last notified
+                        continue
+                    drawing[filename] = [pool.apply_async(_draw, (filename,)), None, False]
+        finally:
+            pool.terminate()  # pictures not finished are drawn when we next start
+            pool.join()
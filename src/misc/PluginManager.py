@@ -7,6 +7,9 @@ A manager for the plugins
 import logging
 import os
 import sys
+import time
+
+from misc import LatencyHistogram
 
 logger = logging.getLogger('spectrum_logger')
 
@@ -24,6 +27,7 @@ class PluginManager:
             self._plugin_dir = os.path.dirname(__file__) + "/../plugins"
         self._help_strings = {}
         self._plugins = {}
+        self._timings = LatencyHistogram.StageHistograms()  # per plugin and method
         self._load_plugins()
         if register:
             self._register_plugins(**plugin_init_arguments)
@@ -31,6 +35,9 @@ class PluginManager:
     def get_plugin_helps(self) -> {}:
         return self._help_strings
 
+    def get_timings(self) -> LatencyHistogram.StageHistograms:
+        return self._timings
+
     def _load_plugins(self):
         """
         Load the modules to get the help strings, but don't register the modules
@@ -60,7 +67,9 @@ class PluginManager:
             if not methods or (set(methods) & set(self._plugins[plugin])):
                 try:
                     # lookup and execute the required plugin object/method
+                    time_start = time.perf_counter()
                     result = (getattr(plugin, method)(**args))
+                    self._timings.record(f"{plugin.__module__}.{method}", time.perf_counter() - time_start)
                     # add to the returned dictionary the output from this plugin, with it's preferred result key
                     if result is not None:
                         name, value = result
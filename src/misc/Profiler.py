@@ -0,0 +1,140 @@
+"""
+On demand profiling of the main processing loop
+
+A capture is started from the UI, runs for a number of frames or seconds, whichever comes first,
+and then writes a .pstats file to the logs directory. Load it with python -m pstats or snakeviz.
+A summary of the most expensive functions is kept for the UI.
+"""
+
+import cProfile
+import datetime
+import logging
+import os
+import pathlib
+import pstats
+import time
+from typing import Dict
+from typing import List
+
+from misc import global_vars
+
+logger = logging.getLogger('spectrum_logger')
+
+MAX_SECONDS = 300  # don't let a forgotten capture run for ever
+TOP_FUNCTIONS = 20  # how many functions in the summary
+SORT_KEYS = ['tottime', 'cumulative']
+
+
+class Profiler:
+
+    def __init__(self, log_dir: pathlib.PurePath = None):
+        """
+        Profile captures of the main loop
+
+        :param log_dir: Where the .pstats files go, default is the logs directory
+        """
+        if log_dir is None:
+            log_dir = pathlib.PurePath(os.path.dirname(__file__), "..", global_vars.log_dir)
+        self._log_dir = log_dir
+        self._profile = None
+        self._frames = 0
+        self._frames_required = 0
+        self._end_time = 0.0
+        self._start_time = 0.0
+        self._sort = SORT_KEYS[0]
+        self._status = {'state': 'idle'}
+
+    def is_running(self) -> bool:
+        return self._profile is not None
+
+    def get_status(self) -> Dict:
+        return self._status
+
+    def start(self, frames: int, seconds: float, sort: str = SORT_KEYS[0]) -> None:
+        """
+        Start a capture, ignored if one is already running
+
+        :param frames: Number of main loop iterations to capture
+        :param seconds: Maximum time to capture for
+        :param sort: How the summary is ordered, tottime or cumulative
+        :return: None
+        """
+        if self._profile:
+            return
+        self._frames = 0
+        self._frames_required = max(1, int(frames))
+        self._start_time = time.perf_counter()
+        self._end_time = self._start_time + min(max(float(seconds), 0.1), MAX_SECONDS)
+        self._sort = sort if sort in SORT_KEYS else SORT_KEYS[0]
+        self._status = {'state': 'running', 'frames': self._frames_required, 'seconds': seconds}
+        logger.info(f"Profiling started for {self._frames_required} frames or {seconds}s")
+        self._profile = cProfile.Profile()
+        try:
+            self._profile.enable()
+        except ValueError as msg:
+            # only one profiler at a time, e.g. we are already being run under cProfile
+            logger.error(f"Failed to start profiling, {msg}")
+            self._profile = None
+            self._status = {'state': 'error', 'error': str(msg)}
+
+    def tick(self) -> bool:
+        """
+        Call once per main loop iteration
+
+        :return: True if the capture has just finished
+        """
+        if self._profile:
+            self._frames += 1
+            if self._frames >= self._frames_required or time.perf_counter() >= self._end_time:
+                self.stop()
+                return True
+        return False
+
+    def stop(self) -> None:
+        """
+        Finish the capture, write it to file and summarise it
+
+        :return: None
+        """
+        if not self._profile:
+            return
+        self._profile.disable()
+        seconds = time.perf_counter() - self._start_time
+        stats = pstats.Stats(self._profile)
+        self._profile = None
+
+        date_time = datetime.datetime.utcnow().strftime('%Y-%m-%d_%H-%M-%S')
+        filename = pathlib.PurePath(self._log_dir, f"profile.{date_time}.pstats")
+        try:
+            stats.dump_stats(str(filename))
+        except OSError as msg:
+            logger.error(f"Failed to write profile, {msg}")
+            filename = ""
+
+        self._status = {'state': 'done',
+                        'file': str(filename),
+                        'frames': self._frames,
+                        'seconds': round(seconds, 3),
+                        'sort': self._sort,
+                        'top': summarise(stats, self._sort, TOP_FUNCTIONS)}
+        logger.info(f"Profiling finished, {self._frames} frames in {seconds:.1f}s written to {filename}")
+
+
+def summarise(stats: pstats.Stats, sort: str, count: int) -> List[Dict]:
+    """
+    The most expensive functions in a profile
+
+    :param stats: The profile
+    :param sort: tottime for time in the function itself, cumulative to include the functions it calls
+    :param count: How many functions
+    :return: List of function, calls, tottime and cumtime, times in milliseconds
+    """
+    entries = []
+    for (file, line, name), (_, calls, tottime, cumtime, _) in stats.stats.items():
+        entries.append({'function': f"{os.path.basename(file)}:{line}({name})",
+                        'calls': calls,
+                        'tottime': round(1e3 * tottime, 3),
+                        'cumtime': round(1e3 * cumtime, 3)})
+    key = 'cumtime' if sort == 'cumulative' else 'tottime'
+    entries.sort(key=lambda entry: entry[key], reverse=True)
+    return entries[:count]
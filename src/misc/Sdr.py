@@ -43,6 +43,7 @@ class Sdr:
         self.sent_count = 0
         self.stop = False
         self.web_port = 8080
+        self.headless = False  # no web UI processes
         self.ackTime = 0  # time in seconds of the last data displayed by the UI, updated by UI
         self.ui_delay = 0  # measured difference between now and ack from ui
         self.one_in_n = 0
@@ -62,6 +63,12 @@ class Sdr:
         #   --plugin xyz:abc:def
         self.plugin_options = []
 
+        # long term record of the spectrum, --spectrumRecord
+        self.spectrum_record_seconds = 0.0  # of peak hold for each row, 0 for off
+        self.spectrum_record_types = ['u8', 'f16']
+        self.spectrum_record_type = 'u8'
+        self.spectrum_record_width = 1024  # bins in a row
+
         self.error = ""  # any errors we want to have available in the UI
 
 
@@ -6,6 +6,13 @@ Passed to the UI as a jason string when required
 
 import json
 
+from misc import IqArchive
+
+try:
+    import sigmf
+except ImportError:
+    sigmf = None  # not offered as a format, DataSink_file logs the import error
+
 
 class Snapper:
     def __init__(self):
@@ -14,8 +21,11 @@ class Snapper:
         self.postTriggerMilliSec = 1000  # milliseconds of capture after a trigger event
         self.triggerState = "wait"  # "wait", "triggered"
         self.triggered = False  # rather than the state we have a simple boolean
-        self.triggers = ["manual", "off"]  # available trigger sources
+        self.triggers = ["manual", "power", "off"]  # available trigger sources
         self.triggerType = "manual"  # current trigger source
+        self.power_trigger = ""  # rules for the power trigger, see PowerTrigger
+        self.power_trigger_count = 0  # triggers from it
+        self.channel = ""  # offset_hz:bandwidth_hz of just the channel to keep, see Ddc, empty for all of it
 
         self.currentSizeMbytes = 0
         self.expectedSizeMbytes = 0
@@ -24,6 +34,20 @@ class Snapper:
         self.sps = 0
 
         self.max_file_size = 500000000  # This is held in memory until the end when it is written out
-        self.file_formats = ['bin', 'sigmf', 'wav']
+        self.max_write_bytes = 1000000000  # snapshots waiting to be written, triggers are rejected beyond this
+        self.writeStatus = {'pending': 0, 'mbytes': 0.0, 'percent': 0.0}  # from the writer thread
+        self.file_formats = ['bin'] + (['sigmf'] if sigmf else []) + ['wav', IqArchive.EXTENSION]
         self.file_format = self.file_formats[0]
+        self.sample_types = ['32fle', '16tle', '8t']  # stored as, converted from complex floats as they arrive
+        self.sample_type = self.sample_types[0]
+        self.archive_codecs = list(IqArchive.CODECS)  # for the compressed format, those we have support for
+        self.archive_codec = self.archive_codecs[0]
         self.directory_list = []  # each entry will be: name, date, sizeMbytes
+
+        # continuous recording, to files of at most this size or duration
+        self.record = False
+        self.record_formats = ['bin'] + (['sigmf'] if sigmf else [])
+        self.record_format = self.record_formats[0]
+        self.record_segment_mbytes = 1024
+        self.record_segment_seconds = 0  # 0 for no limit
+        self.recordStatus = {}
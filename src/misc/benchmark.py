@@ -0,0 +1,421 @@
+"""
+Benchmarks of each stage of the processing chain, -T on the command line
+
+Results are printed as a table and can be saved as json along with details of the environment.
+Given a previous json file as a baseline anything slower by more than a threshold is flagged.
+
+    python ./pyspectrum.py -T
+    python ./pyspectrum.py -T --benchmarkOut base.json
+    python ./pyspectrum.py -T --benchmarkBaseline base.json --benchmarkThreshold 10
+"""
+
+import datetime
+import json
+import os
+import pathlib
+import platform
+import queue
+import tempfile
+import time
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+import numpy as np
+
+from dataProcessing import PowerTrigger
+from dataProcessing import ProcessSamples
+from dataProcessing import Spectrum
+from dataSink import DataSink_file
+from dataSink import DataSink_spectrum
+from dataSink import DataSink_stream
+from dataSources import DataSource
+from dataSources import DataSource_file
+from dataSources import DataSource_synth
+from misc import PluginManager
+from misc import Sdr
+from misc import Snapper
+from misc import global_vars
+from webUI import WebSocketServer
+
+UNPACK_SIZES = [2048, 16384]
+FFT_SIZES = [256, 512, 1024, 2048, 4096, 8192, 16384, 32768]
+MIN_REPEAT_SECONDS = 0.05  # each repeat runs for at least this long
+REPEATS = 3  # best of
+DEFAULT_THRESHOLD_PC = 10.0
+POOL_WIDTH = 1500  # pixels, a typical display width for pooled websocket spectrums
+
+
+def time_it(func: Callable, min_seconds: float = MIN_REPEAT_SECONDS, repeats: int = REPEATS) -> float:
+    """
+    Time a function, best of a few repeats
+
+    :param func: What to time, called with no arguments
+    :param min_seconds: Minimum time for each repeat, sets the number of calls per repeat
+    :param repeats: How many repeats we take the best of
+    :return: seconds per call
+    """
+    time_start = time.perf_counter()
+    func()  # also warms up any caches
+    estimate = max(time.perf_counter() - time_start, 1e-7)
+    iterations = max(1, int(min_seconds / estimate))
+
+    best = float('inf')
+    for _ in range(repeats):
+        time_start = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        best = min(best, (time.perf_counter() - time_start) / iterations)
+    return best
+
+
+def random_samples(size: int) -> np.ndarray:
+    rands = np.random.rand(size * 2) - 0.5
+    samples = np.array(rands[0::2], dtype=np.complex64)
+    samples.imag = rands[1::2]
+    return samples
+
+
+def result(seconds: float, samples: int = 0) -> Dict:
+    """
+    :param seconds: Time per call
+    :param samples: Samples handled per call, 0 if not meaningful
+    :return: The time in usec and the equivalent maximum sample rate
+    """
+    entry = {'usec': round(seconds * 1e6, 3)}
+    if samples:
+        entry['msps'] = round(samples / seconds / 1e6, 3)
+    return entry
+
+
+def bench_unpack() -> Dict:
+    results = {}
+    for size in UNPACK_SIZES:
+        raw = np.random.randint(0, 256, size * 4, dtype=np.uint8).tobytes()  # max of 4bytes per complex sample
+        for data_type in DataSource.supported_data_types:
+            converter = DataSource.DataSource("null", data_type, 1e6, 1e6, 0)
+            raw_bytes = raw[:int(size * converter.get_bytes_per_complex_sample())]
+            results[f"unpack.{data_type}.{size}"] = result(time_it(lambda: converter.unpack_data(raw_bytes)), size)
+    return results
+
+
+def get_fft_backends() -> List[Tuple[str, Callable]]:
+    backends = [('numpy', np.fft.fft)]
+    if Spectrum.fftpack:
+        backends.append(('scipy', Spectrum.fftpack.fft))
+    if Spectrum.pyfftw:
+        backends.append(('fftw', Spectrum.pyfftw.interfaces.numpy_fft.fft))
+    return backends
+
+
+def bench_fft() -> Dict:
+    results = {}
+    for name, fft in get_fft_backends():
+        for size in FFT_SIZES:
+            samples = random_samples(size)
+            results[f"fft.{name}.{size}"] = result(time_it(lambda: fft(samples)), size)
+    return results
+
+
+def bench_process(configuration: Sdr) -> Dict:
+    results = {}
+    for size in FFT_SIZES:
+        configuration.fft_size = size
+        processor = ProcessSamples.ProcessSamples(configuration)
+        samples = random_samples(size)
+        results[f"process.{size}"] = result(time_it(lambda: processor.process(samples, configuration.dbm_offset)), size)
+        results[f"process.{size}"]['fft'] = processor.get_fft_used()
+    return results
+
+
+def bench_power_trigger(configuration: Sdr) -> Dict:
+    """
+    The power trigger on a frame that never triggers, a narrow mask and the whole band against the noise floor
+    """
+    results = {}
+    cf = configuration.centre_frequency_hz
+    sps = configuration.sample_rate
+    for size in FFT_SIZES:
+        powers = np.random.rand(size) - 100.0
+        noise_floors = np.full(size, -100.0)
+        trigger = PowerTrigger.PowerTrigger(f"mask:{cf - sps / 8}:{cf + sps / 8}:-50,noise:20")
+        for _ in range(PowerTrigger.SETTLE_FRAMES):
+            trigger.evaluate(powers, noise_floors, cf, sps, 0)
+        results[f"trigger.power.{size}"] = result(time_it(lambda: trigger.evaluate(powers, noise_floors, cf, sps, 0)),
+                                                  size)
+    return results
+
+
+def bench_spectrum_record(configuration: Sdr) -> Dict:
+    """
+    Adding a frame to the spectrum record, the peak hold the main loop pays for on every frame
+    """
+    results = {}
+    cf = configuration.centre_frequency_hz
+    sps = configuration.sample_rate
+    with tempfile.TemporaryDirectory() as record_dir:
+        for size in FFT_SIZES:
+            powers = np.random.rand(size) - 100.0
+            recorder = DataSink_spectrum.SpectrumRecorder(pathlib.PurePath(record_dir), 1e6)  # never ends a row
+            recorder.add(powers, cf, sps, 0)
+            results[f"spectrum.record.{size}"] = result(time_it(lambda: recorder.add(powers, cf, sps, 0)), size)
+    return results
+
+
+def bench_plugins(configuration: Sdr) -> Dict:
+    """
+    Dispatch of the analysis method to the plugins given on the command line, all disabled by default
+    """
+    results = {}
+    plugin_manager = PluginManager.PluginManager(plugin_init_arguments=vars(configuration))
+    for size in FFT_SIZES:
+        powers = np.random.rand(size) - 100.0
+        noise_floors = np.full(size, -100.0)
+
+        def analysis():
+            plugin_manager.call_plugin_method(method="analysis",
+                                              args={"powers": powers,
+                                                    "noise_floors": noise_floors,
+                                                    "reordered": False})
+
+        results[f"plugins.analysis.{size}"] = result(time_it(analysis), size)
+    return results
+
+
+def bench_send_to_ui(configuration: Sdr) -> Dict:
+    """
+    The peak hold and queueing of spectrums for the UI, at the configured fps
+    """
+    import pyspectrum  # not at the top as it imports us
+
+    results = {}
+    for size in FFT_SIZES:
+        configuration.fft_size = size
+        to_ui_queue = queue.Queue()  # never full, we empty it as we go
+        powers = np.random.rand(size) - 100.0
+        state = {'peaks': np.full(size, -200.0), 'count': 0, 'max': 0}
+
+        def send():
+            state['peaks'], state['count'], state['max'] = \
+                pyspectrum.send_to_ui(configuration, to_ui_queue, powers,
+                                      state['peaks'], state['count'], state['max'], time.time_ns())
+            if not to_ui_queue.empty():
+                to_ui_queue.get()
+
+        results[f"send_to_ui.{size}"] = result(time_it(send), size)
+    return results
+
+
+def bench_websocket() -> Dict:
+    results = {}
+    for size in FFT_SIZES:
+        magnitudes = np.fft.fftshift(np.random.rand(size) - 100.0)
+        now = time.time_ns()
+        results[f"websocket.encode.{size}"] = \
+            result(time_it(lambda: WebSocketServer.encode_spectrum(1e6, 433.92e6, magnitudes, now, now)), size)
+        view = WebSocketServer.get_view(size, 1e6, 433.92e6, POOL_WIDTH, 0, 0)
+        results[f"websocket.pool{POOL_WIDTH}.{size}"] = \
+            result(time_it(lambda: WebSocketServer.Frame(1e6, 433.92e6, magnitudes, now, now)
+                           .message('f32', view)), size)
+        for wire_format in ['u16', 'u8']:
+            results[f"websocket.{wire_format}.{size}"] = \
+                result(time_it(lambda: WebSocketServer.Frame(1e6, 433.92e6, magnitudes, now, now)
+                               .message(wire_format)), size)
+    return results
+
+
+def bench_snapshot(configuration: Sdr) -> Dict:
+    """
+    Pre-trigger buffering of every frame, of all of it and of a channel, and writing a complete one second snapshot in each format
+    """
+    results = {}
+    size = 2048
+    sps = 1e6
+    samples = random_samples(size)
+    with tempfile.TemporaryDirectory() as snap_dir:
+        snap_config = Snapper.Snapper()
+        snap_config.sps = sps
+        snap_config.cf = configuration.centre_frequency_hz
+        sink = DataSink_file.FileOutput(snap_config, pathlib.PurePath(snap_dir))
+        results[f"snapshot.pretrigger.{size}"] = result(time_it(lambda: sink.write(False, samples, 0)), size)
+
+        # a 25kHz channel, down converted and decimated before the pre-trigger ring
+        for channel_size in (size, 16384):
+            channel_samples = random_samples(channel_size)
+            snap_config.channel = f"{sps / 4}:25e3"
+            channel_sink = DataSink_file.FileOutput(snap_config, pathlib.PurePath(snap_dir))
+            results[f"snapshot.channel.{channel_size}"] = \
+                result(time_it(lambda: channel_sink.write(False, channel_samples, 0)), channel_size)
+        snap_config.channel = ""
+
+        for sample_type in snap_config.sample_types:
+            converter = DataSink_file.SampleConverter(sample_type)
+            out = DataSink_file.sample_empty(size, sample_type)
+            results[f"snapshot.convert.{sample_type}.{size}"] = result(time_it(lambda: converter.convert(samples, out)),
+                                                                       size)
+
+        for file_format in snap_config.file_formats:
+            snap_config.file_format = file_format
+            snap_config.preTriggerMilliSec = 500
+            snap_config.postTriggerMilliSec = 500
+
+            def snapshot():
+                snap_sink = DataSink_file.FileOutput(snap_config, pathlib.PurePath(snap_dir))
+                for _ in range(int(0.5 * sps / size)):
+                    snap_sink.write(False, samples, 0)
+                triggered = True
+                while not snap_sink.write(triggered, samples, 0):
+                    triggered = False
+                snap_sink.wait()  # the writer thread has it, time the whole snapshot
+                for name in os.listdir(snap_dir):
+                    os.remove(os.path.join(snap_dir, name))
+
+            results[f"snapshot.{file_format}.1s"] = result(time_it(snapshot, repeats=1), int(sps))
+    return results
+
+
+def bench_record(configuration: Sdr) -> Dict:
+    """
+    Continuous recording, samples are given as fast as we can so this is the rate we get to disk
+    """
+    size = 16384
+    blocks = 4096  # 512MBytes
+    samples = random_samples(size)
+    with tempfile.TemporaryDirectory() as record_dir:
+        snap_config = Snapper.Snapper()
+        snap_config.sps = 1e6
+        snap_config.cf = configuration.centre_frequency_hz
+        time_start = time.perf_counter()
+        recorder = DataSink_stream.StreamOutput(snap_config, pathlib.PurePath(record_dir))
+        for _ in range(blocks):
+            recorder.write(samples, 0)
+        recorder.close()
+        seconds = time.perf_counter() - time_start
+        written = (blocks * size - recorder.get_status()['dropped'])
+    return {f"record.disk.{size}": result(seconds * size / written, size)}
+
+
+def bench_file_source() -> Dict:
+    """
+    Reading from a file source as fast as possible, the file is hidden in the snapshot directory
+    """
+    results = {}
+    size = 16384
+    for data_type in DataSource.supported_data_types:
+        filename = f".benchmark.cf100.0.cplx.1000000.{data_type}"
+        path = pathlib.PurePath(global_vars.SNAPSHOT_DIRECTORY, filename)
+        source = DataSource_file.Input(filename, data_type, 1e6, 100e6, 1e6)
+        with open(path, "wb") as file:
+            file.write(np.random.randint(0, 256, int(64 * size * source.get_bytes_per_complex_sample()),
+                                         dtype=np.uint8).tobytes())
+        try:
+            source.open()
+            source.set_sleep(False)
+            results[f"source.file.{data_type}.{size}"] = \
+                result(time_it(lambda: source.read_cplx_samples(size)), size)
+        finally:
+            source.close()
+            os.remove(path)
+    return results
+
+
+def bench_synth_source() -> Dict:
+    """
+    The synthetic source unpaced, a busy mixture of signals
+    """
+    results = {}
+    signals = "tone:1e5:-20,noise:-60,chirp:-2e5:2e5:0.01:-30,ook:-3e5:-10:1e-4:0.05:64,unpaced"
+    for size in UNPACK_SIZES:
+        source = DataSource_synth.Input(signals, "32fle", 1e6, 100e6, 1e6)
+        source.open()
+        results[f"source.synth.{size}"] = result(time_it(lambda: source.read_cplx_samples(size)), size)
+        source.close()
+    return results
+
+
+def get_environment() -> Dict:
+    environment = {'time': datetime.datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+                   'python': platform.python_version(),
+                   'implementation': platform.python_implementation(),
+                   'platform': platform.platform(),
+                   'machine': platform.machine(),
+                   'processor': platform.processor(),
+                   'cpus': os.cpu_count(),
+                   'numpy': np.__version__,
+                   'scipy': None,
+                   'pyfftw': None}
+    if Spectrum.fftpack:
+        import scipy
+        environment['scipy'] = scipy.__version__
+    if Spectrum.pyfftw:
+        environment['pyfftw'] = Spectrum.pyfftw.__version__
+    return environment
+
+
+def compare(results: Dict, baseline: Dict, threshold_pc: float) -> List[Tuple[str, float, float, float]]:
+    """
+    Find the benchmarks that are slower than the baseline
+
+    :param results: The current results, name to {'usec': ...}
+    :param baseline: The baseline results in the same form
+    :param threshold_pc: How much slower, as a percentage, before we flag it
+    :return: List of name, baseline usec, current usec and percentage change
+    """
+    regressions = []
+    for name, entry in results.items():
+        if name in baseline and baseline[name]['usec'] > 0:
+            change = 100.0 * (entry['usec'] - baseline[name]['usec']) / baseline[name]['usec']
+            if change > threshold_pc:
+                regressions.append((name, baseline[name]['usec'], entry['usec'], round(change, 1)))
+    return regressions
+
+
+def run(configuration: Sdr, out_file: str = None, baseline_file: str = None,
+        threshold_pc: float = DEFAULT_THRESHOLD_PC) -> int:
+    """
+    Run all the benchmarks and show the results
+
+    :param configuration: Gives the plugin options, fps, centre frequency etc.
+    :param out_file: Where to save the results as json, None for no save
+    :param baseline_file: Previous results to compare against, None for no comparison
+    :param threshold_pc: Percentage slower than the baseline we flag as a regression
+    :return: The number of regressions
+    """
+    baseline = {}
+    if baseline_file:
+        with open(baseline_file) as f:
+            baseline = json.load(f)['results']
+
+    print(f"{'benchmark':32} {'usec':>12} {'Msps':>10} {'baseline':>12}")
+    results = {}
+    for bench in [bench_unpack,
+                  bench_fft,
+                  lambda: bench_process(configuration),
+                  lambda: bench_power_trigger(configuration),
+                  lambda: bench_spectrum_record(configuration),
+                  lambda: bench_plugins(configuration),
+                  lambda: bench_send_to_ui(configuration),
+                  bench_websocket,
+                  lambda: bench_snapshot(configuration),
+                  lambda: bench_record(configuration),
+                  bench_file_source,
+                  bench_synth_source]:
+        for name, entry in bench().items():
+            results[name] = entry
+            msps = f"{entry['msps']:10.3f}" if 'msps' in entry else " " * 10
+            base = f"{baseline[name]['usec']:12.1f}" if name in baseline else ""
+            print(f"{name:32} {entry['usec']:12.1f} {msps} {base}", flush=True)
+
+    regressions = compare(results, baseline, threshold_pc)
+    if baseline_file:
+        print(f"\n{len(regressions)} regressions of more than {threshold_pc}% against {baseline_file}")
+        for name, base, now, change in regressions:
+            print(f"REGRESSION {name:32} {base:12.1f} -> {now:12.1f}usec {change:+.1f}%")
+
+    if out_file:
+        with open(out_file, "w") as f:
+            json.dump({'environment': get_environment(), 'results': results}, f, indent=2)
+        print(f"\nResults written to {out_file}")
+
+    return len(regressions)
@@ -1,21 +1,30 @@
 import argparse
+import json
 import logging
 import os
 import textwrap
+from typing import List
 
+from dataProcessing import Ddc
+from dataProcessing import PowerTrigger
 from dataSources import DataSource
 from dataSources import DataSourceFactory
+from misc import IqArchive
 from misc import PluginManager
 from misc import Sdr
-from misc import timeSpectral
+from misc import Snapper
+from misc import global_vars
+from misc import benchmark
+from misc import soak
 
 
-def parse_command_line(configuration: Sdr, logger: logging.Logger) -> None:
+def parse_command_line(configuration: Sdr, logger: logging.Logger, snap_configuration: Snapper = None) -> None:
     """
     Parse all the command line options
 
     :param configuration: Where we store the configuration
     :param logger: logging
+    :param snap_configuration: Where we store the snapshot configuration, None to ignore the snapshot options
     :return: None
     """
     # noinspection PyTypeChecker
@@ -35,6 +44,12 @@ def parse_command_line(configuration: Sdr, logger: logging.Logger) -> None:
         Best to configure through the web interface, default is on port 8080.
         Select a source and type and give '?' as the option to see available sources
         
+        Unattended, without the web UI:
+            python3 ./pyspectrum.py --headless --config node.json
+        where node.json holds long option names and values, e.g.
+            {"input": "pluto:192.168.2.1", "sampleRate": 2e6, "plugin": ["report:mqtt:broker:localhost"]}
+        options on the command line override those in the file
+        
         Check log files under src/logs
         '''),
                                      )
@@ -88,7 +103,94 @@ def parse_command_line(configuration: Sdr, logger: logging.Logger) -> None:
     misc_opts.add_argument('-v', '--verbose', help='Verbose, -vvv debug, -vv info, -v warn', required=False,
                            action='count', default=0)
     misc_opts.add_argument('-H', '--HELP', help='This help', required=False, action='store_true')
-    misc_opts.add_argument('-T', '--TIME', help='Time the spectral algorithm)', required=False, action='store_true')
+    misc_opts.add_argument('-T', '--TIME', help='Benchmark the processing chain', required=False, action='store_true')
+    misc_opts.add_argument('--benchmarkOut', type=str, help='With -T, save the results to this json file',
+                           required=False)
+    misc_opts.add_argument('--benchmarkBaseline', type=str,
+                           help='With -T, flag regressions against the results in this json file', required=False)
+    misc_opts.add_argument('--benchmarkThreshold', type=float,
+                           help=f'With -T, percentage slower than the baseline that is a regression '
+                                f'(default: {benchmark.DEFAULT_THRESHOLD_PC})',
+                           default=benchmark.DEFAULT_THRESHOLD_PC, required=False)
+    misc_opts.add_argument('--soak', help='Find the maximum sample rate we can sustain, no SDR required',
+                           required=False, action='store_true')
+    misc_opts.add_argument('--soakFftSizes', type=str,
+                           help=f'With --soak, comma separated fft sizes (default: '
+                                f'{",".join(str(size) for size in soak.DEFAULT_FFT_SIZES)})',
+                           required=False)
+    misc_opts.add_argument('--soakSeconds', type=float,
+                           help=f'With --soak, seconds for each trial (default: {soak.DEFAULT_SECONDS})',
+                           default=soak.DEFAULT_SECONDS, required=False)
+    misc_opts.add_argument('--soakUiClients', type=str,
+                           help='With --soak, comma separated numbers of web clients, 0 for none (default: 0,1)',
+                           required=False)
+    misc_opts.add_argument('--soakWindows', type=str,
+                           help='With --soak, comma separated window types (default: the first we support)',
+                           required=False)
+    misc_opts.add_argument('--headless', help='No web UI, just acquisition, plugins and snapshots',
+                           required=False, action='store_true')
+    misc_opts.add_argument('--spectrumRecord', type=float,
+                           help='Record the spectrum peak held over this many seconds per row, to the '
+                                f'{global_vars.spectrum_directory_name} directory', required=False)
+    misc_opts.add_argument('--spectrumType', type=str, choices=configuration.spectrum_record_types,
+                           help=f'With --spectrumRecord, u8 for 1dB steps or f16 for half floats '
+                                f'(default: {configuration.spectrum_record_type})', required=False)
+    misc_opts.add_argument('--spectrumWidth', type=int,
+                           help=f'With --spectrumRecord, bins in each row, peaks kept '
+                                f'(default: {configuration.spectrum_record_width})', required=False)
+    misc_opts.add_argument('--config', type=str, help='JSON file of options, keys are the long option names',
+                           required=False)
+
+    ######################
+    # snapshot options
+    ##########
+    snap_defaults = Snapper.Snapper()
+    snap_opts = parser.add_argument_group('Snapshot')
+    snap_opts.add_argument('--snapName', type=str,
+                           help=f'Base filename for snapshots (default: {snap_defaults.baseFilename})',
+                           required=False)
+    snap_opts.add_argument('--snapFormat', type=str,
+                           help=f'Snapshot file format (default: {snap_defaults.file_format})',
+                           choices=snap_defaults.file_formats,
+                           required=False)
+    snap_opts.add_argument('--snapType', type=str,
+                           help=f'Sample type for snapshots and recordings, 32fle float, 16tle sc16 '
+                                f'or 8t sc8 (default: {snap_defaults.sample_type})',
+                           choices=snap_defaults.sample_types,
+                           required=False)
+    snap_opts.add_argument('--archiveCodec', type=str,
+                           help=f'Compression for the {IqArchive.EXTENSION} snapshot format '
+                                f'(default: {snap_defaults.archive_codec})',
+                           choices=snap_defaults.archive_codecs,
+                           required=False)
+    snap_opts.add_argument('--snapChannel', type=str,
+                           help='Snapshot just a channel, offset_hz:bandwidth_hz from the centre frequency, '
+                                'down converted and decimated, e.g. 125e3:25e3', required=False)
+    snap_opts.add_argument('--powerTrigger', type=str,
+                           help='Trigger snapshots on fft bin powers, comma separated rules, '
+                                'mask:start_hz:stop_hz:dBm noise:dB noise:start_hz:stop_hz:dB frames:N '
+                                'holdoff:seconds rearm:edge|level, '
+                                'e.g. mask:433.8e6:434.0e6:-60,noise:15,holdoff:5',
+                           required=False)
+    snap_opts.add_argument('--snapPreTrigger', type=int,
+                           help=f'Milliseconds before a trigger (default: {snap_defaults.preTriggerMilliSec})',
+                           required=False)
+    snap_opts.add_argument('--snapPostTrigger', type=int,
+                           help=f'Milliseconds after a trigger (default: {snap_defaults.postTriggerMilliSec})',
+                           required=False)
+    snap_opts.add_argument('--record', help='Record all the samples to file, as a series of files',
+                           required=False, action='store_true')
+    snap_opts.add_argument('--recordFormat', type=str,
+                           help=f'Recording file format (default: {snap_defaults.record_format})',
+                           choices=snap_defaults.record_formats,
+                           required=False)
+    snap_opts.add_argument('--recordMBytes', type=int,
+                           help=f'Start a new recording file at this size '
+                                f'(default: {snap_defaults.record_segment_mbytes})',
+                           required=False)
+    snap_opts.add_argument('--recordSeconds', type=float,
+                           help='Start a new recording file after this many seconds (default: no limit)',
+                           required=False)
 
     ######################
     # plugin options
@@ -102,7 +204,7 @@ def parse_command_line(configuration: Sdr, logger: logging.Logger) -> None:
     #####################
     # now parse them into configuration, maybe use a dictionary instead of a Class to hold these?
     ############
-    args = vars(parser.parse_args())
+    args = parse_with_config(parser)
 
     if args['HELP'] is True:
         parser.print_help()
@@ -129,6 +231,47 @@ def parse_command_line(configuration: Sdr, logger: logging.Logger) -> None:
 
         if args['web']:
             configuration.web_port = abs(int(args['web']))
+        configuration.headless = args['headless']
+        if args['spectrumRecord'] is not None:
+            configuration.spectrum_record_seconds = abs(float(args['spectrumRecord']))
+        if args['spectrumType']:
+            configuration.spectrum_record_type = args['spectrumType']
+        if args['spectrumWidth'] is not None:
+            configuration.spectrum_record_width = max(1, abs(int(args['spectrumWidth'])))
+
+        if snap_configuration:
+            if args['snapName']:
+                snap_configuration.baseFilename = args['snapName']
+            if args['snapFormat']:
+                snap_configuration.file_format = args['snapFormat']
+            if args['snapType']:
+                snap_configuration.sample_type = args['snapType']
+            if args['archiveCodec']:
+                snap_configuration.archive_codec = args['archiveCodec']
+            if args['snapChannel']:
+                try:
+                    Ddc.parse_channel(args['snapChannel'])
+                except ValueError as msg:
+                    parser.error(str(msg))
+                snap_configuration.channel = args['snapChannel']
+            if args['powerTrigger']:
+                try:
+                    PowerTrigger.PowerTrigger(args['powerTrigger'])
+                except ValueError as msg:
+                    parser.error(str(msg))
+                snap_configuration.power_trigger = args['powerTrigger']
+                snap_configuration.triggerType = "power"
+            if args['snapPreTrigger'] is not None:
+                snap_configuration.preTriggerMilliSec = abs(int(args['snapPreTrigger']))
+            if args['snapPostTrigger'] is not None:
+                snap_configuration.postTriggerMilliSec = abs(int(args['snapPostTrigger']))
+            snap_configuration.record = args['record']
+            if args['recordFormat']:
+                snap_configuration.record_format = args['recordFormat']
+            if args['recordMBytes'] is not None:
+                snap_configuration.record_segment_mbytes = max(1, abs(int(args['recordMBytes'])))
+            if args['recordSeconds'] is not None:
+                snap_configuration.record_segment_seconds = abs(float(args['recordSeconds']))
 
         if args['verbose']:
             if args['verbose'] > 2:
@@ -177,12 +320,74 @@ def parse_command_line(configuration: Sdr, logger: logging.Logger) -> None:
         configuration.plugin_options = args['plugin']
 
     if args['TIME'] is True:
-        timeSpectral.time_spectral(configuration)
+        regressions = benchmark.run(configuration,
+                                    args['benchmarkOut'], args['benchmarkBaseline'], args['benchmarkThreshold'])
+        quit(1 if regressions else 0)
+
+    if args['soak'] is True:
+        try:
+            fft_sizes = [int(size) for size in args['soakFftSizes'].split(',')] if args['soakFftSizes'] else None
+            clients = [int(count) for count in args['soakUiClients'].split(',')] if args['soakUiClients'] else None
+        except ValueError as msg:
+            print(f"Failed to convert soak option to a number, {msg}")
+            quit()
+        windows = args['soakWindows'].split(',') if args['soakWindows'] else None
+        soak.run(configuration, fft_sizes, args['soakSeconds'], clients, windows)
         quit()
 
     configuration.oneInN = int(configuration.sample_rate / (configuration.fps * configuration.fft_size))
 
 
+def parse_with_config(parser: argparse.ArgumentParser, argv: List[str] = None) -> dict:
+    """
+    Parse the options, those in a --config file are defaults the command line overrides
+
+    Plugins are not merged, any --plugin on the command line replaces all of those in the file.
+    argparse would append them to the list of the file if it was a default
+
+    :param parser: With the config and plugin options
+    :param argv: The arguments, None for those of the command line
+    :return: Dictionary of option name to value
+    """
+    known, _ = parser.parse_known_args(argv)
+    config_plugins = None
+    if known.config:
+        options = read_config_file(known.config, parser)
+        config_plugins = options.pop('plugin', None)
+        parser.set_defaults(**options)
+    args = vars(parser.parse_args(argv))
+    if args['plugin'] is None:
+        args['plugin'] = config_plugins
+    return args
+
+
+def read_config_file(filename: str, parser: argparse.ArgumentParser) -> dict:
+    """
+    Read options from a json file, used as defaults so the command line still overrides them
+
+    :param filename: The file
+    :param parser: So we can check the option names
+    :return: Dictionary of option name to value
+    """
+    try:
+        with open(filename) as f:
+            options = json.load(f)
+    except (OSError, ValueError) as msg:
+        print(f"Failed to read config file {filename}, {msg}")
+        quit()
+
+    known = [action.dest for action in parser._actions]
+    for name in options:
+        if name not in known or name == 'config':
+            print(f"Unknown option '{name}' in config file {filename}")
+            quit()
+
+    # plugins are a list of option strings in the file, argparse gives a list of lists
+    if 'plugin' in options:
+        options['plugin'] = [[plugin] if isinstance(plugin, str) else plugin for plugin in options['plugin']]
+    return options
+
+
 def list_plugin_help() -> None:
     """
     Show the help for the plugins we discover
@@ -0,0 +1,238 @@
+"""
+Find the maximum sample rate the main loop can sustain, --soak on the command line
+
+The pipeline of the main loop, processing, plugins, snapshot buffering and optionally the UI, is
+driven from an unpaced synthetic source. For each configuration the sample rate is doubled until the
+loop no longer keeps up, then bisected. Keeping up means the average loop time is within the time
+for one fft of samples and few loops miss that deadline, real sources buffer enough to cover the odd
+slow loop. No SDR is needed.
+
+    python ./pyspectrum.py --soak
+    python ./pyspectrum.py --soak --soakFftSizes 2048,16384 --soakSeconds 1 --plugin analysis:peak:enabled:on
+"""
+
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import pathlib
+import socket
+import tempfile
+import threading
+import time
+from typing import Dict
+from typing import List
+
+import numpy as np
+import websockets
+
+from dataProcessing import ProcessSamples
+from dataSink import DataSink_file
+from dataSources import DataSource_synth
+from misc import LatencyHistogram
+from misc import Metrics
+from misc import PluginManager
+from misc import Sdr
+from misc import Snapper
+from misc import benchmark
+from webUI import WebSocketServer
+
+SIGNALS = "tone:1e5:-20,noise:-60,ook:-3e5:-10:1e-4:0.05:64,unpaced"
+DEFAULT_FFT_SIZES = [1024, 4096, 16384]
+DEFAULT_SECONDS = 0.5  # per trial
+START_SPS = 1e6
+MAX_SPS = 256e6
+BISECT_STEPS = 3
+MAX_MISSES_PC = 5.0  # percentage of loops allowed to take longer than the fft frame time
+PEAK_ON = [['analysis:peak:enabled:on']]  # plugins added for the 'on' configurations
+
+
+def sustainable(trial: Dict) -> bool:
+    return trial['loop_pc'] <= 100.0 and trial['misses_pc'] <= MAX_MISSES_PC
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class UiClients:
+    """
+    A websocket server fed by a UI queue, as in normal running, with clients that read as fast as they can
+    """
+
+    def __init__(self, clients: int):
+        self.to_ui_queue = multiprocessing.Queue(10)
+        self._port = free_port()
+        self._server = WebSocketServer.WebSocketServer(self.to_ui_queue, logging.ERROR, self._port)
+        self._server.start()
+        self._stop = threading.Event()
+        self._threads = [threading.Thread(target=self._client, daemon=True) for _ in range(clients)]
+        for thread in self._threads:
+            thread.start()
+
+    def _client(self) -> None:
+        asyncio.run(self._receive())
+
+    async def _receive(self) -> None:
+        for _ in range(50):  # server may take a while to start
+            try:
+                async with websockets.connect(f"ws://127.0.0.1:{self._port}", max_size=None) as web_socket:
+                    while not self._stop.is_set():
+                        try:
+                            await asyncio.wait_for(web_socket.recv(), 0.1)
+                        except asyncio.TimeoutError:
+                            pass
+                return
+            except OSError:
+                await asyncio.sleep(0.1)
+
+    def close(self) -> None:
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(2)
+        self._server.terminate()
+        self._server.join()
+        while not self.to_ui_queue.empty():
+            _ = self.to_ui_queue.get()
+
+
+def run_trial(pyspectrum, config: Sdr, processor: ProcessSamples, plugin_manager: PluginManager,
+              to_ui_queue, seconds: float) -> Dict:
+    """
+    Run the main loop pipeline for a while at the configured sample rate
+
+    :param pyspectrum: The main module, passed in as it imports us
+    :param config: Sample rate, fft size etc.
+    :param processor: Already set up for the fft size, backend and window
+    :param plugin_manager: Plugins for this configuration
+    :param to_ui_queue: Where spectrums for the UI go, None for no UI
+    :param seconds: How long to run for
+    :return: Dictionary of the results
+    """
+    budget = config.fft_size / config.sample_rate
+    timings = LatencyHistogram.StageHistograms(pyspectrum.TIMED_STAGES, budget)
+    metrics = Metrics.Metrics()
+    source = DataSource_synth.Input(SIGNALS, "32fle", config.sample_rate, config.centre_frequency_hz,
+                                    config.sample_rate)
+    source.open()
+    peaks = np.full(config.fft_size, -200.0)
+    current_peak_count = 0
+    max_peak_count = 0
+    frames = 0
+
+    with tempfile.TemporaryDirectory() as snap_dir:
+        snap_config = Snapper.Snapper()
+        snap_config.sps = config.sample_rate
+        snap_config.cf = config.centre_frequency_hz
+        data_sink = DataSink_file.FileOutput(snap_config, pathlib.PurePath(snap_dir))
+
+        time_end = time.perf_counter() + seconds
+        loop_start = time.perf_counter()
+        while loop_start < time_end:
+            samples, time_rx_nsec = source.read_cplx_samples(config.fft_size)
+            processor.process(samples, config.dbm_offset)
+            pyspectrum.call_plugins(plugin_manager, processor, timings, config.sample_rate,
+                                    config.centre_frequency_hz, config.fft_size, time_rx_nsec)
+            data_sink.write(False, samples, time_rx_nsec)
+            if to_ui_queue:
+                peaks, current_peak_count, max_peak_count = \
+                    pyspectrum.send_to_ui(config, to_ui_queue, processor.get_powers(False), peaks,
+                                          current_peak_count, max_peak_count, time_rx_nsec, metrics)
+            loop_end = time.perf_counter()
+            timings.record('loop', loop_end - loop_start)
+            loop_start = loop_end
+            frames += 1
+    source.close()
+
+    loop = timings.get('loop')
+    return {'sps': config.sample_rate,
+            'frames': frames,
+            'loop_pc': 100.0 * loop.get_mean() / budget,
+            'loop_us': 1e6 * loop.get_mean(),
+            'p99_us': 1e6 * loop.percentile(99.0),
+            'misses_pc': 100.0 * loop.get_misses() / max(1, frames),
+            'ui_dropped': int(metrics.get(Metrics.UI_FRAMES_DROPPED))}
+
+
+def ramp(pyspectrum, config: Sdr, processor: ProcessSamples, plugin_manager: PluginManager,
+         to_ui_queue, seconds: float) -> Dict:
+    """
+    Double the sample rate until we fail then bisect
+
+    :return: The results of the fastest sustainable trial, sps of 0 if none were
+    """
+    best = {'sps': 0.0, 'frames': 0, 'loop_pc': 0.0, 'loop_us': 0.0, 'p99_us': 0.0, 'misses_pc': 0.0,
+            'ui_dropped': 0}
+    low = 0.0
+    high = START_SPS
+    while high <= MAX_SPS:
+        config.sample_rate = high
+        trial = run_trial(pyspectrum, config, processor, plugin_manager, to_ui_queue, seconds)
+        if not sustainable(trial):
+            break
+        best = trial
+        low = high
+        high *= 2
+    else:
+        return best  # faster than we will try
+
+    for _ in range(BISECT_STEPS):
+        config.sample_rate = (low + high) / 2
+        trial = run_trial(pyspectrum, config, processor, plugin_manager, to_ui_queue, seconds)
+        if sustainable(trial):
+            best = trial
+            low = config.sample_rate
+        else:
+            high = config.sample_rate
+    return best
+
+
+def run(configuration: Sdr, fft_sizes: List[int] = None, seconds: float = DEFAULT_SECONDS,
+        ui_clients: List[int] = None, windows: List[str] = None) -> List[Dict]:
+    """
+    Find the maximum sustainable sample rate for every configuration and show them as a table
+
+    :param configuration: The plugin options come from here
+    :param fft_sizes: FFT sizes to try
+    :param seconds: Time for each trial
+    :param ui_clients: Numbers of UI clients to try, 0 for no UI
+    :param windows: Window types to try, default is the first one we support
+    :return: List of results, one per configuration
+    """
+    import pyspectrum  # not at the top as it imports us
+
+    fft_sizes = fft_sizes or DEFAULT_FFT_SIZES
+    ui_clients = ui_clients if ui_clients is not None else [0, 1]
+    windows = windows or ProcessSamples.get_windows()[:1]
+    backends = [name for name, _ in benchmark.get_fft_backends()]
+    plugin_sets = {'off': configuration.plugin_options, 'on': configuration.plugin_options + PEAK_ON}
+
+    print(f"{'backend':8} {'window':12} {'plugins':7} {'ui':>3} {'fft':>6} {'Msps':>8} "
+          f"{'loop%':>6} {'loop_us':>8} {'p99_us':>8} {'miss%':>6} {'ui_drop':>7}")
+    results = []
+    for clients in ui_clients:
+        ui = UiClients(clients) if clients else None
+        try:
+            for plugins, window, fft_size in itertools.product(plugin_sets, windows, fft_sizes):
+                config = Sdr.Sdr()
+                config.fft_size = fft_size
+                config.window = window
+                config.plugin_options = plugin_sets[plugins]
+                plugin_manager = PluginManager.PluginManager(plugin_init_arguments=vars(config))
+                processor = ProcessSamples.ProcessSamples(config)
+                for backend in backends:
+                    processor.set_fft_used(backend)
+                    best = ramp(pyspectrum, config, processor, plugin_manager,
+                                ui.to_ui_queue if ui else None, seconds)
+                    best.update({'backend': backend, 'window': window, 'plugins': plugins,
+                                 'ui_clients': clients, 'fft_size': fft_size})
+                    results.append(best)
+                    print(f"{backend:8} {window:12} {plugins:7} {clients:3} {fft_size:6} "
+                          f"{best['sps'] / 1e6:8.2f} {best['loop_pc']:6.1f} {best['loop_us']:8.1f} "
+                          f"{best['p99_us']:8.1f} {best['misses_pc']:6.1f} {best['ui_dropped']:7}", flush=True)
+        finally:
+            if ui:
+                ui.close()
+    return results
@@ -4,7 +4,6 @@ Provide a basic spectrum analyser for digitised complex samples
 
 ## TODOs, in no particular order
     * TODO: Add a seconds marker to the bottom (left) of the spectrogram
-    * TODO: Plugin for triggering snapshot on fft bin power, with masks
     * TODO: On web interface update just the rows that changed on the configuration table
     * TODO: On web interface config and snap tables change to just update the current not the new cells
     * TODO: On web interface is there a way to update the help when a different source is selected
@@ -27,18 +26,25 @@ import queue
 import signal
 import sys
 import time
+from typing import List
 from typing import Tuple
 from typing import Type
 
 import numpy as np
 
+from dataProcessing import PowerTrigger
 from dataProcessing import ProcessSamples
 from dataSink import DataSink_file
+from dataSink import DataSink_spectrum
+from dataSink import DataSink_stream
 from dataSources import DataSource
 from dataSources import DataSourceFactory
 from misc import Ewma
+from misc import LatencyHistogram
+from misc import Metrics
 from misc import PicGenerator
 from misc import PluginManager
+from misc import Profiler
 from misc import Sdr
 from misc import Snapper
 from misc import commandLine
@@ -56,6 +62,9 @@ logger = logging.getLogger("spectrum_logger")  # a name we use to find this logg
 
 MAX_TO_UI_QUEUE_DEPTH = 10  # low for low latency
 
+# stages of the main loop we keep latency histograms for, in the order they are logged
+TIMED_STAGES = ['read', 'proc', 'analy', 'report', 'snap', 'ui', 'loop']
+
 
 def signal_handler(sig, __):
     global processing
@@ -80,18 +89,34 @@ def main() -> None:
         logger.warning(f"Python version nas no support for nanoseconds, current interpreter is V{sys.version}")
 
     # configuration shared across all processes
-    manager = multiprocessing.Manager()
-    shared_status = manager.dict()
-    shared_update = manager.dict()  # contains updates from the UI, reset each entry when we have actioned the entry
+    if sdr_config.headless:
+        # nothing to share with, so no manager process
+        shared_status = {}
+        shared_update = {}
+    else:
+        manager = multiprocessing.Manager()
+        shared_status = manager.dict()
+        shared_update = manager.dict()  # updates from the UI, reset each entry when we have actioned the entry
+    metrics = Metrics.Metrics()  # counters for the web server, written only by us
+    profiler = Profiler.Profiler()  # started on request from the UI
 
     # initialise our things
     data_source, display, websocket, to_ui_queue, processor, plugin_manager, source_factory, pic_generator, \
-        shared_status = initialise(sdr_config, snap_config, thumbs_dir, shared_status, shared_update)
+        shared_status = initialise(sdr_config, snap_config, thumbs_dir, shared_status, shared_update, metrics)
 
     # the snapshot config
     snap_config.cf = sdr_config.centre_frequency_hz
     snap_config.sps = sdr_config.sample_rate
     data_sink = DataSink_file.FileOutput(snap_config, global_vars.SNAPSHOT_DIRECTORY)
+    record_sink = None  # started by update_recorder() if we are recording
+    retired_sinks = []  # recordings stopped but still finishing their last file
+    power_trigger = PowerTrigger.PowerTrigger(snap_config.power_trigger)
+    spectrum_recorder = None
+    if sdr_config.spectrum_record_seconds:
+        spectrum_recorder = DataSink_spectrum.SpectrumRecorder(global_vars.SPECTRUM_DIRECTORY,
+                                                               sdr_config.spectrum_record_seconds,
+                                                               sdr_config.spectrum_record_type,
+                                                               sdr_config.spectrum_record_width)
 
     # Some info on the amount of time to get samples
     expected_samples_receive_time = sdr_config.fft_size / sdr_config.sample_rate
@@ -106,14 +131,14 @@ def main() -> None:
 
     # Default things before the main loop
     peak_powers_since_last_display = np.full(sdr_config.fft_size, -200)
-    # timing things, averages
-    capture_time = Ewma.Ewma(0.001)  # soapy is very blocky so different averaging, doens't seem to impact anything else
+    # timing things, the loop average drives the loop % shown in the UI
     loop_time = Ewma.Ewma(0.001)
-    process_time = Ewma.Ewma(0.01)
-    analysis_time = Ewma.Ewma(0.01)
-    reporting_time = Ewma.Ewma(0.01)
-    snap_time = Ewma.Ewma(0.01)
-    ui_time = Ewma.Ewma(0.01)
+    # histograms of each stage, against the time budget for one fft of samples
+    timings = LatencyHistogram.StageHistograms(TIMED_STAGES, expected_samples_receive_time)
+    capture_time = timings.get('read')
+    process_time = timings.get('proc')
+    snap_time = timings.get('snap')
+    ui_time = timings.get('ui')
     debug_time = 0
     config_time = 0  # when we will send our config to the UI
     fps_update_time = 0
@@ -134,7 +159,7 @@ def main() -> None:
     global processing
     while processing:
         loop_start = time.perf_counter()
-        if not multiprocessing.active_children():
+        if not sdr_config.headless and not multiprocessing.active_children():
             processing = False  # we will exit mow as we lost our processes
             continue
 
@@ -143,7 +168,7 @@ def main() -> None:
             data_source, data_sink, sdr_config, snap_config, config_changed = \
                 sync_state(sdr_config, snap_config,
                            data_source, source_factory, data_sink,
-                           thumbs_dir, processor, shared_status, shared_update)
+                           thumbs_dir, processor, shared_status, shared_update, profiler)
 
         ###########################################
         # Get and process the complex samples we will work on
@@ -159,7 +184,9 @@ def main() -> None:
                 samples, time_rx_nsec = data_source.read_cplx_samples(sdr_config.fft_size)
                 time_end = time.perf_counter()
                 sdr_config.input_overflows = data_source.get_overflows()
-                _ = capture_time.average(time_end - time_start)
+                capture_time.record(time_end - time_start)
+                if samples is not None:
+                    metrics.inc(Metrics.SAMPLES, samples.size)
 
                 # debug of dropping input buffers for resource constrained hardware
                 if sdr_config.keep > 1:
@@ -167,6 +194,7 @@ def main() -> None:
                     keep_count -= 1
                     if keep_count >= 0:
                         samples = None
+                        metrics.inc(Metrics.FRAMES_DROPPED)
                     else:
                         keep_count = sdr_config.keep
                 elif sdr_config.drop != 0:
@@ -174,6 +202,7 @@ def main() -> None:
                     if (drop_count % sdr_config.drop) == 0:
                         samples = None
                         drop_count = 0
+                        metrics.inc(Metrics.FRAMES_DROPPED)
                     drop_count += 1
 
             if samples is not None:
@@ -183,13 +212,20 @@ def main() -> None:
                 time_start = time.perf_counter()
                 processor.process(samples, sdr_config.dbm_offset)
                 time_end = time.perf_counter()
-                process_time.average(time_end - time_start)
+                process_time.record(time_end - time_start)
+                metrics.inc(Metrics.FRAMES_PROCESSED)
 
                 ##########################
                 # plugins
                 #################
-                call_plugins(plugin_manager, processor, analysis_time, reporting_time,
-                             sdr_config.sample_rate, sdr_config.fft_size, time_rx_nsec)
+                time_start = time.perf_counter()
+                call_plugins(plugin_manager, processor, timings, sdr_config.sample_rate,
+                             sdr_config.centre_frequency_hz, sdr_config.fft_size, time_rx_nsec)
+                metrics.inc(Metrics.PLUGIN_SECONDS, time.perf_counter() - time_start)
+
+                if spectrum_recorder:
+                    spectrum_recorder.add(processor.get_powers(False), sdr_config.centre_frequency_hz,
+                                          sdr_config.sample_rate, time_rx_nsec)
 
                 ##########################
                 # Handle snapshots
@@ -197,16 +233,45 @@ def main() -> None:
                 # due to pre-trigger we need to always give the samples
                 #################
                 time_start = time.perf_counter()
+                if snap_config.triggerType == "power" and not snap_config.triggered:
+                    if power_trigger.get_spec() != snap_config.power_trigger:
+                        power_trigger = PowerTrigger.PowerTrigger(snap_config.power_trigger)
+                    if power_trigger.evaluate(processor.get_powers(False), processor.get_long_average(False),
+                                              sdr_config.centre_frequency_hz, sdr_config.sample_rate,
+                                              time_rx_nsec):
+                        snap_config.triggered = True
+                        snap_config.triggerState = "triggered"
+                        snap_config.power_trigger_count = power_trigger.get_triggers()
+                        config_changed = True
                 if data_sink.write(snap_config.triggered, samples, time_rx_nsec):
-                    snap_config.triggered = False
-                    snap_config.triggerState = "wait"
+                    # finished, or rejected as too much is still to be written, the writer thread has it now
+                    error = data_sink.get_and_reset_error()
+                    if error:
+                        Sdr.add_to_error(sdr_config, error)
+                    config_changed = True
+                # the sink has the trigger, captures run on in it and another trigger starts another one
+                snap_config.triggered = False
+                trigger_state = "triggered" if data_sink.get_active_captures() else "wait"
+                if trigger_state != snap_config.triggerState:
+                    snap_config.triggerState = trigger_state
+                    config_changed = True
+                for filename, file_bytes in data_sink.get_finished():
+                    metrics.inc(Metrics.SNAPSHOT_BYTES, file_bytes)
+                    if pic_generator:
+                        pic_generator.notify(filename)
                     snap_config.directory_list = snapStuff.list_snap_files(global_vars.SNAPSHOT_DIRECTORY)
                     config_changed = True
                 time_end = time.perf_counter()
-                snap_time.average(time_end - time_start)
+                snap_time.record(time_end - time_start)
                 # update our snap state
                 snap_config.currentSizeMbytes = data_sink.get_current_size_mbytes()
                 snap_config.expectedSizeMbytes = data_sink.get_size_mbytes()
+                snap_config.writeStatus = data_sink.get_write_status()
+
+                # continuous recording
+                record_sink = update_recorder(record_sink, retired_sinks, snap_config, sdr_config, pic_generator)
+                if record_sink:
+                    record_sink.write(samples, time_rx_nsec)
 
                 # has underlying sps or cf changed for the snap
                 # if snap_configuration.cf != configuration.real_centre_frequency_hz or \
@@ -225,22 +290,24 @@ def main() -> None:
                     config_changed = False
 
                 ################################
-                # Update the UI spectral data
+                # Update the UI spectral data, nothing to do if we are headless
                 ###################
-                time_start = time.perf_counter()
-                peak_powers_since_last_display, current_peak_count, max_peak_count = \
-                    send_to_ui(sdr_config,
-                               to_ui_queue,
-                               processor.get_powers(False),
-                               peak_powers_since_last_display,
-                               current_peak_count,
-                               max_peak_count,
-                               time_rx_nsec)
-                time_end = time.perf_counter()
-                ui_time.average(time_end - time_start)
-
-                # average of number of count of spectrums between UI updates
-                peak_average.average(max_peak_count)
+                if to_ui_queue:
+                    time_start = time.perf_counter()
+                    peak_powers_since_last_display, current_peak_count, max_peak_count = \
+                        send_to_ui(sdr_config,
+                                   to_ui_queue,
+                                   processor.get_powers(False),
+                                   peak_powers_since_last_display,
+                                   current_peak_count,
+                                   max_peak_count,
+                                   time_rx_nsec,
+                                   metrics)
+                    time_end = time.perf_counter()
+                    ui_time.record(time_end - time_start)
+
+                    # average of number of count of spectrums between UI updates
+                    peak_average.average(max_peak_count)
 
         except ValueError:
             # incorrect number of samples, probably because something closed
@@ -259,6 +326,12 @@ def main() -> None:
             fps_update_time = now + 1
             sdr_config.time_measure_fps = now
             sdr_config.sent_count = 0
+            if record_sink:
+                record_status = record_sink.get_status()
+                if record_status['segments'] != snap_config.recordStatus.get('segments'):
+                    snap_config.directory_list = snapStuff.list_snap_files(global_vars.SNAPSHOT_DIRECTORY)
+                    config_changed = True
+                snap_config.recordStatus = record_status
             fill_status_fast(shared_status, sdr_config, snap_config)
 
         # Debug print on how long things are taking
@@ -266,15 +339,18 @@ def main() -> None:
             debug_print(sdr_config.sample_rate,
                         sdr_config.fft_size,
                         loop_time,
-                        capture_time,
-                        process_time,
-                        analysis_time,
-                        reporting_time,
-                        snap_time,
-                        ui_time,
+                        timings,
+                        plugin_manager.get_timings(),
                         peak_average.get_ewma(),
                         sdr_config.fps,
                         sdr_config.measured_fps)
+            # the UI gets the histograms for the period we just logged, then we start again
+            shared_status['latency'] = latency_status(timings, plugin_manager.get_timings())
+            timings.clear()
+            plugin_manager.get_timings().clear()
+            data_time = sdr_config.fft_size / sdr_config.sample_rate
+            timings.set_budget(data_time)
+            plugin_manager.get_timings().set_budget(data_time)
             debug_time = now + 6
 
         # check on the source, maybe the gain changed etc
@@ -283,18 +359,36 @@ def main() -> None:
             config_time = now + 1
             data_time = (sdr_config.fft_size / sdr_config.sample_rate)
             sdr_config.loop_cpu_pc = 100.0 * (loop_time.get_ewma() / data_time)
+            metrics.set(Metrics.SOURCE_OVERFLOWS, sdr_config.input_overflows)
+            metrics.set(Metrics.LOOP_CPU_PC, sdr_config.loop_cpu_pc)
+            metrics.set(Metrics.MEASURED_FPS, sdr_config.measured_fps)
+            metrics.set(Metrics.RSS_BYTES, Metrics.get_rss_bytes())
 
         if sdr_config.stop or not data_source.connected():
             loop_time.clear()
         else:
             loop_end = time.perf_counter()
             _ = loop_time.average(loop_end - loop_start)
+            timings.record('loop', loop_end - loop_start)
+
+        # a profile capture covers whole loops, publish the summary when it finishes
+        if profiler.tick():
+            shared_status['profile'] = profiler.get_status()
 
     ####################
     #
     # clean up
     #
     #############
+    profiler.stop()  # keep anything captured so far
+
+    for sink in [record_sink] + retired_sinks:
+        if sink:
+            sink.close()
+
+    if spectrum_recorder:
+        spectrum_recorder.close()
+
     if data_source:
         logger.debug("SpectrumAnalyser data_source close")
         data_source.close()
@@ -302,15 +396,11 @@ def main() -> None:
     if multiprocessing.active_children():
         logger.debug(f"Shutting down child processes, {multiprocessing.active_children()}")
         # belt and braces
-        display.terminate()
-        display.shutdown()
-        display.join()
-        websocket.terminate()
-        websocket.shutdown()
-        websocket.join()
-        pic_generator.terminate()
-        pic_generator.shutdown()
-        pic_generator.join()
+        for process in [display, websocket, pic_generator]:
+            if process:
+                process.terminate()
+                process.shutdown()
+                process.join()
 
     if to_ui_queue:
         while not to_ui_queue.empty():
@@ -320,7 +410,46 @@ def main() -> None:
     logger.error("SpectrumAnalyser exit")
 
 
-def call_plugins(plugin_manager, processor, analysis_time, reporting_time, sample_rate, fft_size, time_rx_nsec):
+def update_recorder(record_sink: DataSink_stream.StreamOutput, retired_sinks: List[DataSink_stream.StreamOutput],
+                    snap_config: Snapper, sdr_config: Sdr,
+                    pic_generator: PicGenerator.PicGenerator) -> DataSink_stream.StreamOutput:
+    """
+    Start or stop recording as required, a change of sample rate, centre frequency or sample type starts new files
+
+    A recording is stopped without waiting for the disk, it is retired until its writer has finished the last
+    file so we can still pass that on for a picture
+
+    :param record_sink: The current recording, None if we are not recording
+    :param retired_sinks: Recordings stopped but not yet finished, updated
+    :param snap_config: Whether we are recording and how
+    :param sdr_config: The sample rate and centre frequency
+    :param pic_generator: Told of the files the recording finishes, None if there are no pictures
+    :return: The recording, None if we are not recording
+    """
+    stop = record_sink and (not snap_config.record or
+                            record_sink.get_sps() != sdr_config.sample_rate or
+                            record_sink.get_centre_frequency() != sdr_config.centre_frequency_hz or
+                            record_sink.get_sample_type() != snap_config.sample_type)
+    if stop:
+        record_sink.stop()
+        retired_sinks.append(record_sink)
+        record_sink = None
+
+    done = [sink for sink in retired_sinks if sink.is_stopped()]  # before we ask, so all their files are there
+    for sink in [record_sink] + retired_sinks:
+        if sink and pic_generator:
+            for filename in sink.get_finished():
+                pic_generator.notify(filename)
+    retired_sinks[:] = [sink for sink in retired_sinks if sink not in done]
+
+    if snap_config.record and not record_sink:
+        snap_config.sps = sdr_config.sample_rate
+        snap_config.cf = sdr_config.centre_frequency_hz
+        record_sink = DataSink_stream.StreamOutput(snap_config, global_vars.SNAPSHOT_DIRECTORY)
+    return record_sink
+
+
+def call_plugins(plugin_manager, processor, timings, sample_rate, centre_frequency_hz, fft_size, time_rx_nsec):
     ###########################
     # analysis of the spectrum
     #################
@@ -331,7 +460,7 @@ def call_plugins(plugin_manager, processor, analysis_time, reporting_time, sampl
                                                       "noise_floors": processor.get_long_average(False),
                                                       "reordered": False})
     time_end = time.perf_counter()
-    analysis_time.average(time_end - time_start)
+    timings.record('analy', time_end - time_start)
     if results is not None:
         #####################
         # reporting results, plugin stuff
@@ -342,10 +471,9 @@ def call_plugins(plugin_manager, processor, analysis_time, reporting_time, sampl
             _ = plugin_manager.call_plugin_method(method="report",
                                                   args={"data_samples_time": time_rx_nsec,
                                                         "frequencies": freqs,
-                                                        "centre_frequency_hz":
-                                                            sdr_config.centre_frequency_hz})
+                                                        "centre_frequency_hz": centre_frequency_hz})
         time_end = time.perf_counter()
-        reporting_time.average(time_end - time_start)
+        timings.record('report', time_end - time_start)
 
 
 def setup() -> Tuple[Sdr.Sdr, Snapper.Snapper, pathlib.PurePath]:
@@ -358,7 +486,8 @@ def setup() -> Tuple[Sdr.Sdr, Snapper.Snapper, pathlib.PurePath]:
 
     # sdr configuration
     configuration = Sdr.Sdr()
-    commandLine.parse_command_line(configuration, logger)
+    snap_configuration = setup_snap_config()
+    commandLine.parse_command_line(configuration, logger, snap_configuration)
 
     # check we have a valid input sample type
     if configuration.sample_type not in DataSource.supported_data_types:
@@ -372,7 +501,6 @@ def setup() -> Tuple[Sdr.Sdr, Snapper.Snapper, pathlib.PurePath]:
     configuration.window_types = ProcessSamples.get_windows()
     configuration.window = configuration.window_types[0]
 
-    snap_configuration = setup_snap_config()
     thumbs_dir = set_thumbs_dir()
 
     return configuration, snap_configuration, thumbs_dir
@@ -432,7 +560,8 @@ def set_thumbs_dir() -> pathlib.PurePath:
 
 
 def initialise(sdr_config: Sdr, snap_config: Snapper,
-               thumbs_dir: pathlib.PurePath, shared_status: dict, shared_update: dict) \
+               thumbs_dir: pathlib.PurePath, shared_status: dict, shared_update: dict,
+               metrics: Metrics.Metrics) \
         -> Tuple[Type[DataSource.DataSource],
         FlaskInterface.FlaskInterface,
         WebSocketServer.WebSocketServer,
@@ -449,6 +578,8 @@ def initialise(sdr_config: Sdr, snap_config: Snapper,
     :param snap_config: snapshot config options
     :param thumbs_dir: Where the picture generator will store thumbnails
     :param shared_status: dictionary status shared for multi-processing use
+    :param shared_update: dictionary of updates from the UI
+    :param metrics: counters and gauges for the web server
     :return: Lots
     """
     try:
@@ -459,19 +590,27 @@ def initialise(sdr_config: Sdr, snap_config: Snapper,
             print("Available sources: ", factory.sources())
             raise ValueError(f"Error: Input source type of '{sdr_config.input_source}' is not supported")
 
-        # Queues for UI, control and data are separate when going to ui
-        to_ui_queue = multiprocessing.Queue(MAX_TO_UI_QUEUE_DEPTH)
-
         fill_shared_status(shared_status, sdr_config, snap_config)
+        shared_status['latency'] = {}  # filled in periodically by the main loop
+        shared_status['profile'] = {'state': 'idle'}
+
+        to_ui_queue = None
+        display = None
+        web_socket = None
+        if sdr_config.headless:
+            logger.info("Headless, no web UI")
+        else:
+            # Queues for UI, control and data are separate when going to ui
+            to_ui_queue = multiprocessing.Queue(MAX_TO_UI_QUEUE_DEPTH)
 
-        display = FlaskInterface.FlaskInterface(to_ui_queue, logger.level, shared_status, shared_update)
-
-        display.start()
-        logger.debug(f"Started WebServer, {display}")
+            display = FlaskInterface.FlaskInterface(to_ui_queue, logger.level, shared_status, shared_update, metrics)
+            display.start()
+            logger.debug(f"Started WebServer, {display}")
 
-        web_socket = WebSocketServer.WebSocketServer(to_ui_queue, logger.level, shared_status['web_socket_port'])
-        web_socket.start()
-        logger.debug(f"Started WebSocket, {web_socket}")
+            web_socket = WebSocketServer.WebSocketServer(to_ui_queue, logger.level, shared_status['web_socket_port'],
+                                                         shared_status, shared_update)
+            web_socket.start()
+            logger.debug(f"Started WebSocket, {web_socket}")
 
         # plugins, pass in all the variables as we don't know what the plugin may require
         plugin_manager = PluginManager.PluginManager(plugin_init_arguments=vars(sdr_config))
@@ -489,10 +628,12 @@ def initialise(sdr_config: Sdr, snap_config: Snapper,
         # The main processor for producing ffts etc
         processor = ProcessSamples.ProcessSamples(sdr_config)
 
-        # thumbnail and pic generator process
-        pic_generator = PicGenerator.PicGenerator(global_vars.SNAPSHOT_DIRECTORY, thumbs_dir, logger.level)
-        pic_generator.start()
-        logger.debug(f"Started PicGenerator")
+        # thumbnail and pic generator process, only the web UI shows them
+        pic_generator = None
+        if not sdr_config.headless:
+            pic_generator = PicGenerator.PicGenerator(global_vars.SNAPSHOT_DIRECTORY, thumbs_dir, logger.level)
+            pic_generator.start()
+            logger.debug(f"Started PicGenerator")
 
         sdr_config.time_measure_fps = time.time()
 
@@ -519,6 +660,9 @@ def fill_status_fast(shared_status: dict, sdr_config: Sdr, snap_config: Snapper)
 
     # snapshot stuff
     shared_status['snapTriggerState'] = snap_config.triggerState
+    shared_status['snapWrite'] = snap_config.writeStatus
+    shared_status['record'] = snap_config.record
+    shared_status['recordStatus'] = snap_config.recordStatus
 
 
 def fill_shared_status(shared_status: dict, sdr_config: Sdr, snap_config: Snapper):
@@ -573,17 +717,25 @@ def fill_shared_status(shared_status: dict, sdr_config: Sdr, snap_config: Snappe
     # snapshot stuff
     shared_status['snapTrigger'] = snap_config.triggered
     shared_status['snapTriggerState'] = snap_config.triggerState
-    shared_status['snapTriggerSources'] = ['manual', 'off']
+    shared_status['snapTriggerSources'] = snap_config.triggers
     shared_status['snapTriggerSource'] = snap_config.triggerType
+    shared_status['powerTrigger'] = snap_config.power_trigger
+    shared_status['powerTriggerCount'] = snap_config.power_trigger_count
     shared_status['snapName'] = snap_config.baseFilename
     shared_status['snapFormats'] = snap_config.file_formats
     shared_status['snapFormat'] = snap_config.file_format
+    shared_status['snapTypes'] = snap_config.sample_types
+    shared_status['snapType'] = snap_config.sample_type
+    shared_status['snapChannel'] = snap_config.channel
     shared_status['snapPreTrigger'] = snap_config.preTriggerMilliSec
     shared_status['snapPostTrigger'] = snap_config.postTriggerMilliSec
     shared_status['snaps'] = snap_config.directory_list
     shared_status['snapSize'] = ({'current': snap_config.currentSizeMbytes,
                                   'limit': snap_config.expectedSizeMbytes})
     shared_status['snapDelete'] = ""
+    shared_status['snapWrite'] = snap_config.writeStatus
+    shared_status['record'] = snap_config.record
+    shared_status['recordStatus'] = snap_config.recordStatus
 
     # web interface
     shared_status['web_server_port'] = sdr_config.web_port
@@ -598,7 +750,8 @@ def sync_state(sdr_config: Sdr,
                thumb_dir: pathlib.PurePath,
                processor: ProcessSamples,
                shared_status: dict,
-               shared_update: dict):
+               shared_update: dict,
+               profiler: Profiler.Profiler):
     """
     All changes instigated by the UI rest interfaces end up in the shared_update dictionary.
     Once the changes are made we delete the entries in the shared_update dictionary
@@ -612,6 +765,7 @@ def sync_state(sdr_config: Sdr,
     :param processor: the current processor (fft's)
     :param shared_status: dictionary of the current state for sharing to multi-processing
     :param shared_update: dictionary os updated items from UI
+    :param profiler: for profiling the main loop on request
     :return:
     """
     # -> Tuple[Type[DataSource.DataSource], DataSink_file.FileOutput,
@@ -776,19 +930,31 @@ def sync_state(sdr_config: Sdr,
             shared_update.pop('snapDelete')
 
         if 'snapTrigger' in shared_update:
-            if shared_update['snapTrigger'] and snap_config.triggerState != "triggered":
+            if shared_update['snapTrigger']:
                 if snap_config.triggerType == "manual":
                     snap_config.triggered = True
                     snap_config.triggerState = "triggered"
                     config_changed = True
             shared_update.pop('snapTrigger')
 
+        if 'record' in shared_update:
+            if shared_update['record'] != snap_config.record:
+                snap_config.record = shared_update['record']  # the main loop starts or stops it
+                config_changed = True
+            shared_update.pop('record')
+
         if 'snapTriggerSource' in shared_update:
             if shared_update['snapTriggerSource'] != snap_config.triggerType:
                 snap_config.triggerType = shared_update['snapTriggerSource']
                 config_changed = True
             shared_update.pop('snapTriggerSource')
 
+        if 'powerTrigger' in shared_update:
+            if shared_update['powerTrigger'] != snap_config.power_trigger:
+                snap_config.power_trigger = shared_update['powerTrigger']  # the main loop makes a new trigger
+                config_changed = True
+            shared_update.pop('powerTrigger')
+
         if 'snapName' in shared_update:
             if shared_update['snapName'] != snap_config.baseFilename:
                 snap_config.baseFilename = shared_update['snapName']
@@ -803,6 +969,20 @@ def sync_state(sdr_config: Sdr,
                 snap_changed = True
             shared_update.pop('snapFormat')
 
+        if 'snapType' in shared_update:
+            if shared_update['snapType'] != snap_config.sample_type:
+                snap_config.sample_type = shared_update['snapType']
+                config_changed = True
+                snap_changed = True
+            shared_update.pop('snapType')
+
+        if 'snapChannel' in shared_update:
+            if shared_update['snapChannel'] != snap_config.channel:
+                snap_config.channel = shared_update['snapChannel']
+                config_changed = True
+                snap_changed = True
+            shared_update.pop('snapChannel')
+
         if 'snapPreTrigger' in shared_update:
             if shared_update['snapPreTrigger'] != snap_config.preTriggerMilliSec:
                 snap_config.preTriggerMilliSec = shared_update['snapPreTrigger']
@@ -817,6 +997,12 @@ def sync_state(sdr_config: Sdr,
                 snap_changed = True
             shared_update.pop('snapPostTrigger')
 
+        if 'profile' in shared_update:
+            prof = shared_update['profile']
+            profiler.start(prof['frames'], prof['seconds'], prof['sort'])
+            shared_status['profile'] = profiler.get_status()
+            shared_update.pop('profile')
+
         if snap_changed:
             snap_config.sps = data_source.get_sample_rate_sps()
             data_sink = DataSink_file.FileOutput(snap_config, global_vars.SNAPSHOT_DIRECTORY)
@@ -843,7 +1029,8 @@ def send_to_ui(sdr_config: Sdr,
                peak_powers_since_last_display: np.ndarray,
                current_peak_count: int,
                max_peak_count: int,
-               time_spectrum: float) -> Tuple[np.ndarray, int, int]:
+               time_spectrum: float,
+               metrics: Metrics.Metrics = None) -> Tuple[np.ndarray, int, int]:
     """
     Send data to the queue used for talking to the ui processes
 
@@ -854,6 +1041,7 @@ def send_to_ui(sdr_config: Sdr,
     :param current_peak_count: count of spectrums we have peak held on
     :param max_peak_count: maximum since last time it was reset
     :param time_spectrum: Time of this spectrum in nanoseconds
+    :param metrics: Where we count the spectrums sent and dropped, optional
     :return: array of updated peak powers
     """
 
@@ -889,8 +1077,12 @@ def send_to_ui(sdr_config: Sdr,
                 current_peak_count = 0
                 sdr_config.sent_count += 1
                 sdr_config.update_count = 0  # success on putting into queue
+                if metrics:
+                    metrics.inc(Metrics.UI_FRAMES_SENT)
             except queue.Full:
                 peak_detect = True  # UI can't keep up
+                if metrics:
+                    metrics.inc(Metrics.UI_FRAMES_DROPPED)
         else:
             # nope, so peak detect the fft result instead
             peak_detect = True
@@ -934,15 +1126,25 @@ def send_to_ui(sdr_config: Sdr,
     return peak_powers_since_last_display, current_peak_count, max_peak_count
 
 
+def latency_status(timings: LatencyHistogram.StageHistograms,
+                   plugin_timings: LatencyHistogram.StageHistograms) -> dict:
+    """
+    The latency histograms in a form we can share with the UI
+
+    :param timings: Histograms of the main loop stages
+    :param plugin_timings: Histograms of each plugin method
+    :return: Dictionary of the frame budget and the summary of each histogram, times in microseconds
+    """
+    return {'budget': round(1e6 * timings.get_budget(), 1),
+            'stages': timings.summary(),
+            'plugins': plugin_timings.summary()}
+
+
 def debug_print(sps: float,
                 fft_size: int,
                 loop_time: Ewma,
-                sample_get_time: Ewma,
-                process_time: Ewma,
-                analysis_time: Ewma,
-                reporting_time: Ewma,
-                snap_time: Ewma,
-                ui_time: Ewma,
+                timings: LatencyHistogram.StageHistograms,
+                plugin_timings: LatencyHistogram.StageHistograms,
                 peak_count: float,
                 fps: int,
                 mfps: float) -> None:
@@ -951,12 +1153,9 @@ def debug_print(sps: float,
 
     :param sps: Digitisation rate
     :param fft_size: The number of samples per cycle
-    :param sample_get_time: How long it took as to receive the digitised samples
-    :param process_time: How long we have spent processing the samples
-    :param analysis_time: How long we have spent analysing things
-    :param reporting_time: How long we have spent reporting things
-    :param snap_time: How long we have spent saving snaps
-    :param ui_time: How long we have spent telling the ui
+    :param loop_time: Average time around the main loop
+    :param timings: Histograms of how long each stage of the main loop took
+    :param plugin_timings: Histograms of how long each plugin took
     :param peak_count: Count of how many spectrums we are peak detecting on for the UI
     :param fps: requested fps
     :param mfps: measured fps
@@ -966,27 +1165,28 @@ def debug_print(sps: float,
     data_time = (fft_size / sps)
     loop_cpu_pc = 100.0 * (loop_time.get_ewma() / data_time)
 
-    total = process_time.get_ewma()
-    total += analysis_time.get_ewma()
-    total += reporting_time.get_ewma()
-    total += reporting_time.get_ewma()
-    total += snap_time.get_ewma()
-    total += ui_time.get_ewma()
+    total = 0.0
+    for stage in ['proc', 'analy', 'report', 'snap', 'ui']:
+        total += timings.get(stage).get_mean()
 
     logger.debug(f'SPS:{sps:.0f}, '
                  f'FFT:{fft_size} '
                  f'{1e6 * data_time:.0f}usec, '
                  f'loop:{loop_cpu_pc:.0f}%, '
-                 f'read:{1e6 * sample_get_time.get_ewma():.0f}us, '
+                 f'read:{1e6 * timings.get("read").get_mean():.0f}us, '
                  f'total:{1e6 * total:.0f}us '
-                 f'[proc:{1e6 * process_time.get_ewma():.0f}us, '
-                 f'analy:{1e6 * analysis_time.get_ewma():.0f}us, '
-                 f'report:{1e6 * reporting_time.get_ewma():.0f}us, '
-                 f'snap:{1e6 * snap_time.get_ewma():.0f}us, '
-                 f'ui:{1e6 * ui_time.get_ewma():.0f}us], '
+                 f'[proc:{1e6 * timings.get("proc").get_mean():.0f}us, '
+                 f'analy:{1e6 * timings.get("analy").get_mean():.0f}us, '
+                 f'report:{1e6 * timings.get("report").get_mean():.0f}us, '
+                 f'snap:{1e6 * timings.get("snap").get_mean():.0f}us, '
+                 f'ui:{1e6 * timings.get("ui").get_mean():.0f}us], '
                  f'pk:{peak_count:0.1f}, '
                  f'fps:{fps}, '
                  f'mfps:{mfps}, ')
+    logger.debug(f'latency usec, budget {1e6 * data_time:.0f}: {timings.log_line()}')
+    plugins = plugin_timings.log_line()
+    if plugins:
+        logger.debug(f'plugin latency usec: {plugins}')
 
 
 if __name__ == '__main__':
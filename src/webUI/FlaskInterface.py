@@ -1,14 +1,22 @@
 #!/usr/bin/env python3
+import hashlib
+import json
 import logging
 import multiprocessing
 import os
 import pathlib
 import signal
+import threading
 import time
+from typing import Dict
+from typing import Tuple
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_restful import Resource, Api as Rest_Api
 
+from dataProcessing import Ddc
+from dataProcessing import PowerTrigger
+from misc import Metrics
 from misc import global_vars
 
 # root is directory relative to our source file
@@ -27,7 +35,8 @@ class FlaskInterface(multiprocessing.Process):
                  to_ui_queue: multiprocessing.Queue,
                  log_level: int,
                  shared_status: dict,
-                 shared_update: dict):
+                 shared_update: dict,
+                 metrics: Metrics.Metrics):
         """
         Initialise the server
 
@@ -35,11 +44,13 @@ class FlaskInterface(multiprocessing.Process):
         :param log_level: The logging level we wish to use
         :param shared_status: A dictionary with current status
         :param shared_update: A dictionary with the updates from the UI, will only contain updates
+        :param metrics: Counters and gauges maintained by the main process
         """
         multiprocessing.Process.__init__(self)
 
         self._status = shared_status
         self._update = shared_update
+        self._metrics = metrics
 
         # queues are for the web socket, not used in the web server
         self._to_ui_queue = to_ui_queue
@@ -90,6 +101,13 @@ class FlaskInterface(multiprocessing.Process):
         def index():
             return flask_app.send_static_file('index.html')
 
+        # prometheus scrape target, read straight from shared memory so no proxy to the main process
+        @flask_app.route("/metrics", methods=['GET'])
+        def metrics():
+            return Response(self._metrics.render(), mimetype='text/plain; version=0.0.4')
+
+        rest_api.add_resource(State, '/state',
+                              resource_class_kwargs={'status': self._status, 'version': StateVersion()})
         rest_api.add_resource(Input, '/input/<string:thing>',
                               resource_class_kwargs={'status': self._status, 'update': self._update})
         rest_api.add_resource(Digitiser, '/digitiser/<string:thing>',
@@ -141,6 +159,61 @@ class FlaskInterface(multiprocessing.Process):
 ############
 
 
+class StateVersion:
+    """
+    Version number of the shared status, it goes up each time a read finds the status has changed
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()  # flask serves requests on threads
+        self._digest = None
+        self._version = 0
+
+    def update(self, state: Dict) -> Tuple[int, str]:
+        """
+        Note the state we have just read
+
+        :param state: All of the shared status
+        :return: The version of the state and a digest of it
+        """
+        digest = state_digest(state)
+        with self._lock:
+            if digest != self._digest:
+                self._digest = digest
+                self._version += 1
+            return self._version, digest
+
+
+def state_digest(state: Dict) -> str:
+    return hashlib.sha1(json.dumps(state, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class State(Resource):
+    # Handle requests on the /state endpoint, all of the status in one go
+    # e.g. /state or /state?keys=fps,delay
+    # The reply has an ETag, a GET with If-None-Match gets a 304 and no body if those keys have not changed
+    def __init__(self, **kwargs):
+        self._status = kwargs['status']
+        self._version = kwargs['version']
+
+    def get(self):
+        state = self._status.copy()  # one proxy call so the keys are consistent with each other
+        version, digest = self._version.update(state)
+        keys = request.args.get('keys')
+        if keys:
+            keys = [key.strip() for key in keys.split(',') if key.strip() != ""]
+            unknown = [key for key in keys if key not in state]
+            if unknown:
+                return f"Unknown keys {','.join(unknown)}", 400
+            state = {key: state[key] for key in keys}
+            digest = state_digest(state)
+
+        response = jsonify({'version': version, 'state': state})
+        response.set_etag(digest)
+        response.cache_control.no_cache = True  # always check with us, we say if it has not changed
+        return response.make_conditional(request)
+
+
 class Input(Resource):
     # Handle all web requests on the /input endpoint
     def __init__(self, **kwargs):
@@ -278,8 +351,8 @@ class Control(Resource):
         self._status = kwargs['status']
         self._update = kwargs['update']
         self._allowed_get_endpoints = ['presetFps', 'fps', 'stop', 'fpsMeasured', 'delay', 'loopCpuPc',
-                                       'overflows', 'oneInN']
-        self._allowed_put_endpoints = ['ackTime', 'fps', 'stop']
+                                       'overflows', 'oneInN', 'latency', 'profile']
+        self._allowed_put_endpoints = ['ackTime', 'fps', 'stop', 'profile']
 
     def get(self, thing):
         if thing in self._allowed_get_endpoints:
@@ -297,6 +370,15 @@ class Control(Resource):
                     self._update[thing] = {'set': set_fps, 'measured': measured}
                 elif thing == 'stop':
                     self._update[thing] = request.json[thing]
+                elif thing == 'profile':
+                    # e.g. {"profile": {"frames": 1000, "seconds": 10, "sort": "tottime"}}
+                    prof = request.json[thing]
+                    frames = abs(int(prof.get('frames', 1000)))
+                    seconds = abs(float(prof.get('seconds', 10)))
+                    sort = prof.get('sort', 'tottime')
+                    if frames == 0 or seconds == 0 or sort not in ['tottime', 'cumulative']:
+                        raise ValueError()
+                    self._update[thing] = {'frames': frames, 'seconds': seconds, 'sort': sort}
                 return "ok"
             except Exception:
                 return "Failed to parse {thing} command", 400
@@ -311,10 +393,13 @@ class Snapshot(Resource):
         self._status = kwargs['status']
         self._update = kwargs['update']
         self._allowed_get_endpoints = ['snapTriggerSources', 'snapTriggerSource', 'snapTriggerState',
-                                       'snapName', 'snapFormats', 'snapFormat', 'snapPreTrigger', 'snapPostTrigger',
-                                       'snapSize', 'snaps']
-        self._allowed_put_endpoints = ['snapTrigger', 'snapTriggerSource', 'snapName', 'snapFormat',
-                                       'snapPreTrigger', 'snapPostTrigger']
+                                       'snapName', 'snapFormats', 'snapFormat', 'snapTypes', 'snapType',
+                                       'snapPreTrigger', 'snapPostTrigger',
+                                       'snapSize', 'snaps', 'snapWrite', 'record', 'recordStatus',
+                                       'powerTrigger', 'powerTriggerCount', 'snapChannel']
+        self._allowed_put_endpoints = ['snapTrigger', 'snapTriggerSource', 'snapName', 'snapFormat', 'snapType',
+                                       'snapPreTrigger', 'snapPostTrigger', 'record', 'powerTrigger',
+                                       'snapChannel']
         self._allowed_delete_endpoints = ['snapDelete']
 
     def get(self, thing):
@@ -345,12 +430,32 @@ class Snapshot(Resource):
                         self._update[thing] = frm
                     else:
                         raise ValueError()
+                elif thing == 'snapType':
+                    # e.g. {"snapType": "16tle"} for 16bit int samples
+                    typ = request.json[thing]
+                    if typ in self._status['snapTypes']:
+                        self._update[thing] = typ
+                    else:
+                        raise ValueError()
                 elif thing == 'snapPreTrigger':
                     pre = abs(int(request.json[thing]))
                     self._update[thing] = pre
                 elif thing == 'snapPostTrigger':
                     pos = abs(int(request.json[thing]))
                     self._update[thing] = pos
+                elif thing == 'powerTrigger':
+                    # e.g. {"powerTrigger": "mask:433.8e6:434.0e6:-60,holdoff:5"}, checked before we take it
+                    rules = request.json[thing]
+                    PowerTrigger.PowerTrigger(rules)
+                    self._update[thing] = rules
+                elif thing == 'snapChannel':
+                    # e.g. {"snapChannel": "125e3:25e3"} for just 25kHz at 125kHz above the centre frequency
+                    channel = request.json[thing]
+                    Ddc.parse_channel(channel)
+                    self._update[thing] = channel
+                elif thing == 'record':
+                    # e.g. {"record": true} to record everything to file until {"record": false}
+                    self._update[thing] = bool(request.json[thing])
                 return "ok"
             except Exception:
                 return "Failed to parse {thing} command", 400
@@ -1,15 +1,23 @@
 #!/usr/bin/env python3
 
 import asyncio
+import collections
+import functools
+import json
 import logging
 import multiprocessing
 import os
 import pathlib
 import queue
 import struct
+import threading
 import time
 from builtins import Exception
+from typing import Dict
+from typing import List
+from typing import Tuple
 
+import numpy as np
 import websockets
 from websockets import WebSocketServerProtocol
 
@@ -18,6 +26,489 @@ from misc import global_vars
 # for logging in the webSocket
 logger = logging.getLogger(__name__)
 
+HEADER = struct.Struct("!2id8i")
+HEADER_SIZE = HEADER.size  # 48 bytes
+QUANTIZED_HEADER = struct.Struct("!2fi")  # follows HEADER for quantized data
+QUANTIZED_HEADER_SIZE = HEADER_SIZE + QUANTIZED_HEADER.size  # 60 bytes
+CLIENT_FRAMES = 4  # frames waiting for each client before we drop the oldest
+READER_TIMEOUT = 0.5  # seconds, how often the queue reader checks if it should stop
+STATUS_INTERVAL = 0.25  # seconds between looking for changes in the shared status
+
+# data types, the first int of every message
+MAGNITUDES = 1  # float32 dB
+QUANTIZED = 2  # unsigned ints, dB = offset + value * step
+HISTORY = 3  # quantized rows from the waterfall history, not live
+QUANTIZED_16BIT = 1  # flags of quantized data
+QUANTIZED_DELTA = 2  # values are the difference from the previous frame, modulo 2^bits
+QUANTIZED_LAST = 4  # the last row of a history response
+
+# formats a client can ask for and the unsigned ints used for them
+WIRE_FORMATS = {'f32': None, 'u16': np.dtype('<u2'), 'u8': np.dtype('u1')}
+QUANTIZE_STEPS = [0.01, 0.02, 0.05, 0.1, 0.2, 0.25, 0.5, 1.0, 2.0]  # dB, smallest that covers the span is used
+OFFSET_GRID = 10.0  # dB, the offset moves in these steps so deltas stay small from frame to frame
+MIN_DB = -300.0  # anything lower is clipped
+KEY_FRAME_INTERVAL = 50  # delta frames between complete frames
+
+# waterfall history, about 6MB for 5 minutes at 20fps
+HISTORY_ROWS = 6000
+HISTORY_WIDTH = 1024  # bins in each row, spectrums are pooled to this
+HISTORY_OFFSET = -200.0  # dB of a zero
+HISTORY_STEP = 1.0  # dB, fixed so rows can be pooled over time as bytes
+
+
+def pack_header(message: bytearray, data_type: int, sps: float, centre: float, time_start: float,
+                time_end: float, num_values: int, fft_size: int, total: int, start: int) -> None:
+    """
+    The header common to all our messages, network order
+
+    :param message: Where the header goes, at the start
+    :param data_type: What follows the header
+    :param sps: Sample rate
+    :param centre: Centre frequency in Hz
+    :param time_start: Time of the first spectrum in this one, nsec
+    :param time_end: Time of the last spectrum in this one, nsec
+    :param num_values: Number of values in the message
+    :param fft_size: Number of bins in the spectrum we were given
+    :param total: Number of bins across the whole spectrum once pooled, the fft_size if not pooled
+    :param start: Which of the total bins is the first value
+    :return: None
+    """
+    centre_mhz = float(centre) / 1e6  # in MHz
+
+    # times are in nsec and javascript won't handle 8byte int so break it up
+    start_sec: int = int(time_start / 1e9)
+    start_nsec: int = int(time_start - start_sec * 1e9)
+    end_sec: int = int(time_end / 1e9)
+    end_nsec: int = int(time_end - end_sec * 1e9)
+
+    # 2 int, 1 double, 8 int
+    HEADER.pack_into(message, 0,
+                     int(data_type),  # 4bytes
+                     int(sps),  # 4bytes
+                     centre_mhz,  # 8byte double float (64bit)
+                     int(start_sec),  # 4bytes
+                     int(start_nsec),  # 4bytes
+                     int(end_sec),  # 4bytes
+                     int(end_nsec),  # 4bytes
+                     num_values,  # 4bytes (N)
+                     int(fft_size),  # 4bytes
+                     int(total),  # 4bytes
+                     int(start))  # 4bytes
+
+
+def encode_spectrum(sps: float, centre: float, magnitudes: np.ndarray, time_start: float, time_end: float,
+                    fft_size: int = 0, total: int = 0, start: int = 0) -> bytearray:
+    """
+    Pack a spectrum up in binary for the web client
+
+    :param sps: Sample rate
+    :param centre: Centre frequency in Hz
+    :param magnitudes: The spectrum in dB, or the part of a pooled spectrum the client sees
+    :param time_start: Time of the first spectrum in this one, nsec
+    :param time_end: Time of the last spectrum in this one, nsec
+    :param fft_size: Bins in the original spectrum, default is the size of magnitudes
+    :param total: Bins across the whole pooled spectrum, default is the size of magnitudes
+    :param start: Which of the total bins is the first of magnitudes
+    :return: The websocket message
+    """
+    num_floats = int(magnitudes.size)
+    # the header then N float32,
+    # the floats are little endian so the client can view them directly as a Float32Array,
+    # the header is a multiple of 4 bytes which keeps that view aligned
+    message = bytearray(HEADER_SIZE + 4 * num_floats)
+    pack_header(message, MAGNITUDES, sps, centre, time_start, time_end, num_floats,
+                fft_size or num_floats, total or num_floats, start)
+    # N * 4byte floats (32bit), converted straight into the message
+    np.frombuffer(message, dtype='<f4', count=num_floats, offset=HEADER_SIZE)[:] = magnitudes
+    return message
+
+
+def quantize(magnitudes: np.ndarray, dtype: np.dtype) -> Tuple[float, float, np.ndarray]:
+    """
+    Quantize a spectrum to unsigned ints
+
+    :param magnitudes: The spectrum in dB
+    :param dtype: The unsigned int type
+    :return: offset and step in dB and the values, dB = offset + value * step
+    """
+    levels = np.iinfo(dtype).max
+    low = max(float(np.min(magnitudes)), MIN_DB)
+    offset = np.floor(low / OFFSET_GRID) * OFFSET_GRID
+    span = float(np.max(magnitudes)) - offset
+    step = next((q for q in QUANTIZE_STEPS if q * levels >= span), max(span, 1.0) / levels)
+    scaled = np.clip(magnitudes, offset, offset + levels * step)
+    scaled -= offset
+    scaled /= step
+    return offset, step, np.rint(scaled, out=scaled).astype(dtype)
+
+
+def encode_quantized(sps: float, centre: float, offset: float, step: float, values: np.ndarray, delta: bool,
+                     time_start: float, time_end: float,
+                     fft_size: int = 0, total: int = 0, start: int = 0,
+                     data_type: int = QUANTIZED, last: bool = False) -> bytearray:
+    """
+    Pack a quantized spectrum up in binary for the web client
+
+    :param sps: Sample rate
+    :param centre: Centre frequency in Hz
+    :param offset: dB of a zero value
+    :param step: dB of each value
+    :param values: The quantized spectrum, or the difference from the previous one
+    :param delta: True if the values are differences
+    :param time_start: Time of the first spectrum in this one, nsec
+    :param time_end: Time of the last spectrum in this one, nsec
+    :param fft_size: Bins in the original spectrum, default is the size of values
+    :param total: Bins across the whole pooled spectrum, default is the size of values
+    :param start: Which of the total bins is the first of values
+    :param data_type: QUANTIZED for live spectrums, HISTORY for rows from the history
+    :param last: True for the last row of a history response
+    :return: The websocket message
+    """
+    num_values = int(values.size)
+    flags = (QUANTIZED_16BIT if values.itemsize == 2 else 0) | (QUANTIZED_DELTA if delta else 0) | \
+            (QUANTIZED_LAST if last else 0)
+    # the header then offset, step and flags then N values, 16bit values are little endian
+    message = bytearray(QUANTIZED_HEADER_SIZE + values.itemsize * num_values)
+    pack_header(message, data_type, sps, centre, time_start, time_end, num_values,
+                fft_size or num_values, total or num_values, start)
+    QUANTIZED_HEADER.pack_into(message, HEADER_SIZE, offset, step, flags)
+    np.frombuffer(message, dtype=values.dtype, count=num_values, offset=QUANTIZED_HEADER_SIZE)[:] = values
+    return message
+
+
+def get_view(fft_size: int, sps: float, centre: float, width: int, span: float,
+             span_centre: float) -> Tuple[int, int, int, int]:
+    """
+    Which bins a client sees and how much to pool them
+
+    The whole spectrum is pooled by an integer factor so the visible span is no more than width bins,
+    only the visible bins are sent.
+
+    :param fft_size: Bins in the spectrum
+    :param sps: Sample rate, the frequency span of the spectrum
+    :param centre: Centre frequency in Hz of the spectrum
+    :param width: Pixels across the client's display, 0 for no pooling
+    :param span: Frequency span in Hz the client is showing, 0 for all of it
+    :param span_centre: Centre frequency in Hz of what the client is showing
+    :return: Pooling factor, first pooled bin sent, number of pooled bins sent, pooled bins across the spectrum
+    """
+    visible = fft_size
+    first = 0
+    if span > 0 and sps > 0:
+        visible = min(fft_size, max(1, int(round(fft_size * span / sps))))
+        first = int(round(fft_size * ((span_centre - centre) / sps + 0.5) - visible / 2))
+        first = min(max(first, 0), fft_size - visible)
+
+    factor = max(1, -(-visible // width)) if width > 0 else 1
+    total = -(-fft_size // factor)
+    start = first // factor
+    count = min(-(-(first + visible) // factor), total) - start
+    return factor, start, count, total
+
+
+@functools.lru_cache(maxsize=64)
+def pool_indices(fft_size: int, factor: int, start: int, count: int) -> np.ndarray:
+    """
+    Where each pooled bin starts, for np.maximum.reduceat()
+    """
+    return np.arange(start * factor, min((start + count) * factor, fft_size), factor)
+
+
+def pool(magnitudes: np.ndarray, view: Tuple[int, int, int, int]) -> np.ndarray:
+    """
+    The visible part of the spectrum, each pooled bin is the maximum of the bins it covers so peaks are kept
+
+    :param magnitudes: The spectrum in dB
+    :param view: From get_view()
+    :return: The pooled bins
+    """
+    factor, start, count, _ = view
+    if factor == 1:
+        return magnitudes[start:start + count]
+    indices = pool_indices(magnitudes.size, factor, start, count)
+    return np.maximum.reduceat(magnitudes[:min((start + count) * factor, magnitudes.size)], indices)
+
+
+class Frame:
+    """
+    One spectrum for all the clients, pooled and encoded at most once for each view and format they want
+    """
+
+    def __init__(self, sps: float, centre: float, magnitudes: np.ndarray, time_start: float, time_end: float):
+        self.sps = sps
+        self.centre = centre
+        self.magnitudes = magnitudes
+        self.time_start = time_start
+        self.time_end = time_end
+        self._messages = {}
+        self._pooled = {}
+        self._quantized = {}
+
+    def full_view(self) -> Tuple[int, int, int, int]:
+        return 1, 0, self.magnitudes.size, self.magnitudes.size
+
+    def message(self, wire_format: str, view: Tuple[int, int, int, int] = None) -> bytearray:
+        """
+        The complete message, shared by every client using the format and view
+
+        :param wire_format: One of WIRE_FORMATS
+        :param view: From get_view(), None for the whole spectrum
+        :return: The websocket message
+        """
+        view = view or self.full_view()
+        key = (wire_format, view)
+        if key not in self._messages:
+            _, start, _, total = view
+            if wire_format == 'f32':
+                message = encode_spectrum(self.sps, self.centre, self.pooled(view), self.time_start, self.time_end,
+                                          self.magnitudes.size, total, start)
+            else:
+                offset, step, values = self.quantized(wire_format, view)
+                message = encode_quantized(self.sps, self.centre, offset, step, values, False,
+                                           self.time_start, self.time_end, self.magnitudes.size, total, start)
+            self._messages[key] = message
+        return self._messages[key]
+
+    def pooled(self, view: Tuple[int, int, int, int]) -> np.ndarray:
+        if view not in self._pooled:
+            self._pooled[view] = pool(self.magnitudes, view)
+        return self._pooled[view]
+
+    def quantized(self, wire_format: str, view: Tuple[int, int, int, int] = None) -> Tuple[float, float, np.ndarray]:
+        view = view or self.full_view()
+        key = (wire_format, view)
+        if key not in self._quantized:
+            self._quantized[key] = quantize(self.pooled(view), WIRE_FORMATS[wire_format])
+        return self._quantized[key]
+
+
+class WaterfallHistory:
+    """
+    A ring of recent spectrums for the waterfall
+
+    Each row is pooled, keeping peaks, to a fixed width and quantized to a byte per bin on a fixed
+    scale, with the time, sample rate and centre frequency it had.
+    """
+
+    def __init__(self, rows: int = HISTORY_ROWS, width: int = HISTORY_WIDTH):
+        """
+        :param rows: How many spectrums we keep
+        :param width: Bins in each row
+        """
+        self._data = np.zeros((rows, width), dtype=np.uint8)
+        self._times = np.zeros(rows, dtype=np.int64)  # nsec of the end of the spectrum
+        self._sps = np.zeros(rows)
+        self._centres = np.zeros(rows)
+        self._widths = np.zeros(rows, dtype=np.int32)  # bins used, smaller fft sizes don't fill a row
+        self._next = 0
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add(self, frame: Frame) -> None:
+        width = self._data.shape[1]
+        pooled = frame.pooled(get_view(frame.magnitudes.size, frame.sps, frame.centre, width, 0, 0))
+        scaled = pooled - HISTORY_OFFSET
+        scaled /= HISTORY_STEP
+        np.clip(scaled, 0, np.iinfo(np.uint8).max, out=scaled)
+
+        row = self._next
+        self._data[row, :pooled.size] = np.rint(scaled, out=scaled)
+        self._data[row, pooled.size:] = 0
+        self._times[row] = int(frame.time_end)
+        self._sps[row] = frame.sps
+        self._centres[row] = frame.centre
+        self._widths[row] = pooled.size
+        self._next = (self._next + 1) % self._times.size
+        self._count = min(self._count + 1, self._times.size)
+
+    def query(self, start: int = None, end: int = None, rows: int = 0) -> List[Tuple[int, float, float, np.ndarray]]:
+        """
+        Rows from the history, oldest first
+
+        With no times the most recent rows, otherwise those between the times pooled over time so
+        there are no more than the number of rows asked for
+
+        :param start: Earliest time in nsec, None for the oldest we have
+        :param end: Latest time in nsec, None for the newest
+        :param rows: The most rows wanted, 0 for all of them
+        :return: List of time in nsec, sample rate, centre frequency and the quantized row
+        """
+        order = (np.arange(self._count) + self._next - self._count) % self._times.size
+        if start is None and end is None:
+            if rows > 0:
+                order = order[-rows:]
+        else:
+            times = self._times[order]
+            in_range = np.ones(order.size, dtype=bool)
+            if start is not None:
+                in_range &= times >= start
+            if end is not None:
+                in_range &= times <= end
+            order = order[in_range]
+
+        data = self._data[order]
+        widths = self._widths[order]
+        if 0 < rows < order.size:
+            groups = np.linspace(0, order.size, rows, endpoint=False).astype(int)
+            data = np.maximum.reduceat(data, groups, axis=0)
+            widths = np.maximum.reduceat(widths, groups)
+            order = order[groups]
+
+        return [(int(self._times[index]), float(self._sps[index]), float(self._centres[index]), row[:width])
+                for index, row, width in zip(order, data, widths)]
+
+
+def encode_history(rows: List[Tuple[int, float, float, np.ndarray]]) -> List[bytearray]:
+    """
+    Messages for rows from the history, the last one is marked so the client knows it has them all
+
+    :param rows: From WaterfallHistory.query()
+    :return: The websocket messages
+    """
+    return [encode_quantized(sps, centre, HISTORY_OFFSET, HISTORY_STEP, values, False, time_ns, time_ns,
+                             data_type=HISTORY, last=number == len(rows) - 1)
+            for number, (time_ns, sps, centre, values) in enumerate(rows)]
+
+
+def encode_status(changes: Dict) -> str:
+    """
+    A text message of status changes for the web client
+
+    :param changes: The status keys that changed and their new values
+    :return: The websocket message, json
+    """
+    return json.dumps({'status': changes}, default=lambda value: value.item() if hasattr(value, 'item') else str(value))
+
+
+class Client:
+    """
+    A connected web client, frames wait here until the client's handler can send them
+
+    The frames are bounded and the oldest is dropped when full, so a slow client sees recent
+    spectrums and never holds up the broadcast or the other clients.
+
+    The client picks its format, by default float32, quantized values need a quarter or half of the
+    bandwidth. With delta the values are the difference from the last frame sent to this client,
+    mostly small, which permessage-deflate compresses well. Deltas follow what this client was sent
+    so dropped frames don't matter, a complete frame is sent every KEY_FRAME_INTERVAL frames or
+    whenever the quantization changes.
+
+    The client can also give its display width and the span it is showing, then only that span is
+    sent, pooled to about a bin per pixel.
+
+    Changes to the shared status are also sent, as json text messages.
+    """
+
+    def __init__(self, name: str, max_frames: int = CLIENT_FRAMES):
+        """
+        :param name: For logging, the address of the client
+        :param max_frames: How many frames can wait to be sent
+        """
+        self.name = name
+        self.sent = 0
+        self.dropped = 0
+        self.wire_format = 'f32'
+        self.delta = False
+        self.width = 0  # no pooling
+        self.span = 0.0  # all of the spectrum
+        self.span_centre = 0.0
+        self._frames = collections.deque(maxlen=max_frames)
+        self._status = {}  # changes not yet sent, merged so none are lost however slow the client is
+        self._ready = asyncio.Event()
+        self._reference = None  # (view, offset, step, values) last sent, for deltas
+        self._since_key = 0
+        self._view_for = None  # (fft_size, sps, centre) the view was worked out for
+        self._view = None
+
+    def configure(self, wire_format: str, delta: bool) -> None:
+        """
+        Change the format of the messages we send
+
+        :param wire_format: One of WIRE_FORMATS
+        :param delta: True for differences from the previous frame, ignored for f32
+        :return: None
+        """
+        if wire_format not in WIRE_FORMATS:
+            raise ValueError(f"unknown format '{wire_format}'")
+        self.wire_format = wire_format
+        self.delta = delta and wire_format != 'f32'
+        self._reference = None
+
+    def configure_view(self, width: int, span: float, span_centre: float) -> None:
+        """
+        Change what the client sees
+
+        :param width: Pixels across the display, 0 for no pooling
+        :param span: Frequency span in Hz shown, 0 for all of it
+        :param span_centre: Centre frequency in Hz of the span
+        :return: None
+        """
+        if width < 0 or span < 0:
+            raise ValueError(f"width {width} and span {span} can't be negative")
+        self.width = int(width)
+        self.span = float(span)
+        self.span_centre = float(span_centre)
+        self._view_for = None
+
+    def put(self, frame) -> None:
+        if len(self._frames) == self._frames.maxlen:
+            self.dropped += 1  # the deque drops the oldest for us
+        self._frames.append(frame)
+        self._ready.set()
+
+    def put_status(self, changes: Dict) -> None:
+        self._status.update(changes)
+        self._ready.set()
+
+    async def get(self):
+        """
+        The next thing to send, status changes go before frames
+
+        :return: A dictionary of status changes or a Frame
+        """
+        while not self._frames and not self._status:
+            self._ready.clear()
+            await self._ready.wait()
+        if self._status:
+            changes = self._status
+            self._status = {}
+            return changes
+        return self._frames.popleft()
+
+    def get_view(self, frame: Frame) -> Tuple[int, int, int, int]:
+        view_for = (frame.magnitudes.size, frame.sps, frame.centre)
+        if view_for != self._view_for:
+            self._view = get_view(frame.magnitudes.size, frame.sps, frame.centre,
+                                  self.width, self.span, self.span_centre)
+            self._view_for = view_for
+        return self._view
+
+    def encode(self, frame: Frame) -> bytearray:
+        """
+        The message for this client
+
+        :param frame: The spectrum
+        :return: The websocket message
+        """
+        view = self.get_view(frame)
+        if not self.delta:
+            return frame.message(self.wire_format, view)
+
+        offset, step, values = frame.quantized(self.wire_format, view)
+        reference = self._reference
+        self._reference = (view, offset, step, values)
+        if (reference is None or self._since_key >= KEY_FRAME_INTERVAL or
+                reference[:3] != (view, offset, step)):
+            self._since_key = 0
+            return frame.message(self.wire_format, view)
+
+        self._since_key += 1
+        _, start, _, total = view
+        return encode_quantized(frame.sps, frame.centre, offset, step, values - reference[3], True,
+                                frame.time_start, frame.time_end, frame.magnitudes.size, total, start)
+
 
 class WebSocketServer(multiprocessing.Process):
     """
@@ -27,13 +518,19 @@ class WebSocketServer(multiprocessing.Process):
     def __init__(self,
                  to_ui_queue: multiprocessing.Queue,
                  log_level: int,
-                 websocket_port: int):
+                 websocket_port: int,
+                 shared_status: dict = None,
+                 shared_update: dict = None,
+                 history_rows: int = HISTORY_ROWS):
         """
         Configure the basics of this class
 
         :param to_ui_queue: we will receive structured spectrum data from this queue
         :param log_level: The logging level we wish to use
         :param websocket_port: The port the web socket will be on
+        :param shared_status: A dictionary with current status, changes are pushed to the clients, None for none
+        :param shared_update: A dictionary with the updates from the UI, for the clients acks
+        :param history_rows: Spectrums kept for the waterfall history, 0 for none
         """
         multiprocessing.Process.__init__(self)
         self._to_ui_queue = to_ui_queue
@@ -41,6 +538,12 @@ class WebSocketServer(multiprocessing.Process):
         print(f"web socket port {self._port}")
         self._exit_now = False
         self._log_level = log_level
+        self._clients = set()  # of Client, only used in our own process
+        self._history_rows = history_rows
+        self._history = None  # made in our own process
+        self._shared_status = shared_status
+        self._shared_update = shared_update
+        self._status = {}  # latest status, for new clients
 
     def shutdown(self) -> None:
         logger.debug("WebSocketServer Shutting down")
@@ -76,10 +579,7 @@ class WebSocketServer(multiprocessing.Process):
         logger.info(f"WebSocket starting on port {self._port}")
         while not self._exit_now:
             try:
-                start_server = websockets.serve(self.handler, "0.0.0.0", self._port)
-
-                asyncio.get_event_loop().run_until_complete(start_server)
-                asyncio.get_event_loop().run_forever()
+                asyncio.run(self.serve())
             except Exception as msg:
                 logger.error(f"WebSocket {msg}")
                 time.sleep(1)
@@ -87,81 +587,200 @@ class WebSocketServer(multiprocessing.Process):
         logger.error("WebSocket server process exited")
         return
 
-    async def handler(self, web_socket: WebSocketServerProtocol, path: str):
+    async def serve(self) -> None:
+        """
+        Serve clients while the reader and status threads feed them
+
+        :return: None
+        """
+        self._history = WaterfallHistory(self._history_rows) if self._history_rows else None
+        loop = asyncio.get_running_loop()
+        stop = threading.Event()
+        threads = [threading.Thread(target=self.reader, args=(loop, stop), daemon=True)]
+        if self._shared_status is not None:
+            threads.append(threading.Thread(target=self.status_watcher, args=(loop, stop), daemon=True))
+        for thread in threads:
+            thread.start()
+        try:
+            async with websockets.serve(self.handler, "0.0.0.0", self._port):
+                await loop.create_future()  # until we are terminated
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+    def reader(self, loop: asyncio.AbstractEventLoop, stop: threading.Event) -> None:
+        """
+        Thread that waits on the queue, so the event loop never does, and hands each spectrum to the loop
+
+        :param loop: The event loop the clients are served on
+        :param stop: Set when we are to finish
+        :return: None
+        """
+        while not self._exit_now and not stop.is_set():
+            try:
+                spectrum = self._to_ui_queue.get(timeout=READER_TIMEOUT)
+            except queue.Empty:
+                # no data for us yet
+                continue
+            try:
+                loop.call_soon_threadsafe(self.broadcast, *spectrum)
+            except RuntimeError:
+                break  # loop closed
+
+    def status_watcher(self, loop: asyncio.AbstractEventLoop, stop: threading.Event) -> None:
+        """
+        Thread that reads the shared status, one proxy call for all of it, and hands any changes to the loop
+
+        :param loop: The event loop the clients are served on
+        :param stop: Set when we are to finish
+        :return: None
+        """
+        previous = {}
+        while not self._exit_now and not stop.wait(STATUS_INTERVAL):
+            try:
+                status = self._shared_status.copy()
+            except Exception as msg:
+                logger.error(f"WebSocket failed to read status, {msg}")
+                break  # main process has gone
+            changes = {key: value for key, value in status.items() if key not in previous or previous[key] != value}
+            previous = status
+            if changes:
+                try:
+                    loop.call_soon_threadsafe(self.push_status, changes)
+                except RuntimeError:
+                    break  # loop closed
+
+    def push_status(self, changes: Dict) -> None:
+        """
+        Give status changes to every client, called on the event loop
+
+        :param changes: The status keys that changed and their new values
+        :return: None
+        """
+        self._status.update(changes)
+        for client in self._clients:
+            client.put_status(changes)
+
+    def broadcast(self, sps: float, centre: float, magnitudes: np.ndarray, time_start: float,
+                  time_end: float) -> None:
+        """
+        Keep the spectrum in the history and give the same frame to every client,
+        each format is encoded once however many clients use it
+
+        Called on the event loop
+
+        :param sps: Sample rate
+        :param centre: Centre frequency in Hz
+        :param magnitudes: The spectrum in dB
+        :param time_start: Time of the first spectrum in this one, nsec
+        :param time_end: Time of the last spectrum in this one, nsec
+        :return: None
         """
-        Handle Tx to the client on the websocket
+        if self._clients or self._history is not None:
+            frame = Frame(sps, centre, magnitudes, time_start, time_end)
+            if self._history is not None:
+                self._history.add(frame)
+            for client in self._clients:
+                client.put(frame)
 
-        Tx goes from us (_data_queue) to the web client
+    async def handler(self, web_socket: WebSocketServerProtocol, path: str = "/"):
+        """
+        Handle Tx and Rx for the client on the websocket
+
+        Tx goes from broadcast(), through the client's own frames, to the web client
+        Rx is the client telling us the format it wants and acking what it has shown
 
         :param web_socket:
         :param path: Not used, default is '/'
         :return: None
         """
 
-        client = web_socket.remote_address[0]
-        logger.info(f"WebSocket serving client {client} {path}")
+        client = Client(web_socket.remote_address[0])
+        logger.info(f"WebSocket serving client {client.name} {path}")
+        if self._status:
+            client.put_status(self._status)
+        self._clients.add(client)
 
         tx_task = asyncio.ensure_future(
-            self.tx_handler(web_socket))
-        done, pending = await asyncio.wait(
-            [tx_task],
-            return_when=asyncio.FIRST_COMPLETED,
-        )
-        for task in pending:
-            task.cancel()
-        logger.info(f"WebSocket exited serving client {client} {path}")
+            self.tx_handler(web_socket, client))
+        rx_task = asyncio.ensure_future(
+            self.rx_handler(web_socket, client))
+        try:
+            done, pending = await asyncio.wait(
+                [tx_task, rx_task],
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            for task in pending:
+                task.cancel()
+        finally:
+            self._clients.discard(client)
+        logger.info(f"WebSocket exited serving client {client.name} {path}, sent {client.sent} frames, "
+                    f"dropped {client.dropped}")
 
-    async def tx_handler(self, web_socket: WebSocketServerProtocol):
+    async def tx_handler(self, web_socket: WebSocketServerProtocol, client: Client):
         """
         Send data to the UI client
 
         :param web_socket: The client connection
+        :param client: Where our frames and status changes come from
         :return: None
         """
-
-        client = web_socket.remote_address[0]
-        logger.info(f"web socket Tx for client {client}")
+        logger.info(f"web socket Tx for client {client.name}")
 
         # NOTE this is not going to end until:
         # websocket connection exceptions - probably closed
         # we force an exit
         try:
             while not self._exit_now:
-                # timeout on queue read so we can, if we wanted to, exit our forever loop
+                item = await client.get()
+                if isinstance(item, dict):
+                    await web_socket.send(encode_status(item))
+                else:
+                    await web_socket.send(client.encode(item))
+                    client.sent += 1
+
+        except Exception as msg:
+            logger.error(f"WebSocket socket Tx exception for {client.name}, {msg}")
+
+    async def rx_handler(self, web_socket: WebSocketServerProtocol, client: Client):
+        """
+        Requests from the UI client, json e.g. {"format": "u8", "delta": true}
+        or {"width": 1500, "span": 1e6, "centre": 433.92e6} in pixels and Hz
+        or {"history": {"start": nsec, "end": nsec, "rows": 500}} for rows from the waterfall history,
+        all optional, with no times the most recent rows
+        or {"ackTime": sec} the time of the last spectrum shown
+
+        :param web_socket: The client connection
+        :param client: What the requests change
+        :return: None
+        """
+        try:
+            async for request in web_socket:
                 try:
-                    sps, centre, magnitudes, time_start, time_end = self._to_ui_queue.get(timeout=0.1)
-
-                    centre_mhz = float(centre) / 1e6  # in MHz
-
-                    # times are in nsec and javascript won't handle 8byte int so break it up
-                    start_sec: int = int(time_start / 1e9)
-                    start_nsec: int = int(time_start - start_sec * 1e9)
-                    end_sec: int = int(time_end / 1e9)
-                    end_nsec: int = int(time_end - end_sec * 1e9)
-
-                    num_floats = int(magnitudes.size)
-                    # pack the data up in binary, watch out for sizes
-                    # ignoring times for now as still to handle 8byte ints in javascript
-                    # !2id5i{num_floats}f{num_floats}f is in network order 2 int, 1 double, 5 int, N float
-                    data_type: int = 1  # magnitude data
-                    message = struct.pack(f"!2id5i{num_floats}f",  # format
-                                          int(data_type),  # 4bytes
-                                          int(sps),  # 4bytes
-                                          centre_mhz,  # 8byte double float (64bit)
-                                          int(start_sec),  # 4bytes
-                                          int(start_nsec),  # 4bytes
-                                          int(end_sec),  # 4bytes
-                                          int(end_nsec),  # 4bytes
-                                          num_floats,  # 4bytes (N)
-                                          *magnitudes)  # N * 4byte floats (32bit)
-
-                    await web_socket.send(message)
-
-                except queue.Empty:
-                    # no data for us yet
-                    pass
-
-                await asyncio.sleep(0.001)  # max 1000fps !
+                    request = json.loads(request)
+                    if 'format' in request:
+                        client.configure(request['format'], bool(request.get('delta', False)))
+                    if 'width' in request:
+                        client.configure_view(int(request['width']), float(request.get('span', 0)),
+                                              float(request.get('centre', 0)))
+                    if 'ackTime' in request and self._shared_update is not None:
+                        # proxy write is a round trip to the manager, keep it off the loop
+                        await asyncio.get_running_loop().run_in_executor(
+                            None, self._shared_update.__setitem__, 'ackTime', request['ackTime'])
+                    if 'history' in request and self._history is not None:
+                        query = request['history']
+                        start = query.get('start')
+                        end = query.get('end')
+                        rows = self._history.query(None if start is None else int(start),
+                                                   None if end is None else int(end),
+                                                   int(query.get('rows', 0)))
+                        for message in encode_history(rows):
+                            await web_socket.send(message)
+                    logger.debug(f"web socket client {client.name} format {client.wire_format} "
+                                 f"delta {client.delta} width {client.width} span {client.span}")
+                except (ValueError, TypeError, AttributeError) as msg:
+                    logger.error(f"WebSocket bad request from {client.name}, {msg}")
 
         except Exception as msg:
-            logger.error(f"WebSocket socket Tx exception for {client}, {msg}")
+            logger.error(f"WebSocket socket Rx exception for {client.name}, {msg}")
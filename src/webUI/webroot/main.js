@@ -6,6 +6,13 @@ var spectrum = null;     // don't like this global but can't get onclick in tabl
 var sdrState = null;     // holds basics about the front end sdr
 var snapState = null;    // holds basics about snapshots
 var websocket = null;
+var quantizedReference = null; // last quantized spectrum, deltas are added to it
+var lastView = null;           // what we last asked the server to send
+var historyRequested = false;  // asked for the waterfall history since we connected
+var historyRows = null;        // rows of the history, placed once we have them all
+var historyBelow = 0;          // spectrum.inputCount when we asked for the history
+var historyBefore = 0;         // time of the first spectrum, history rows must be older
+var statusPushed = false;      // the server pushes status changes on the websocket, so no polling
 var updateTimer = null;  // for when we are not streaming we still need to update the display
 var configFormInFocus = false;
 var snapFormInFocus = false;
@@ -17,7 +24,6 @@ if (window.DeviceOrientationEvent) {
 
 function syncCurrent() {
     // currnet values not covered by fast update method
-    // TODO: maybe this should be one big json document instead of lots of small fetch'es
 
     // from UI interface
     $('#currentAvg').empty().append(spectrum.averaging);
@@ -25,231 +31,232 @@ function syncCurrent() {
     let zoomBw = sdrState.getSps()/spectrum.zoom;
     $('#currentSpan').empty().append(spectrum.convertFrequencyForDisplay(zoomBw,3));
 
-    let oldSourceType = sdrState.getInputSource();
-    let oldSourceParams = sdrState.getInputSourceParams();
+    // flagged that source changed so remove any green highlights from file table
+    updateSnapFileList();
 
-    // from api
-   fetch('./input/errors').then(function (response) {
+    // from api, unless the server is pushing changes to us on the websocket
+    if (statusPushed) {
+        return;
+    }
+    // errors are cleared when read, so they have their own endpoint
+    fetchStatus(['./input/errors']);
+    fetchState(['source', 'frequency', 'digitiserFrequency', 'digitiserFormat', 'digitiserSampleRate',
+                'digitiserBandwidth', 'digitiserPartsPerMillion', 'digitiserDbmOffset', 'digitiserGainType',
+                'fftSize', 'fftFrameTime', 'fftWindow', 'snapTriggerSource', 'snapName', 'snapFormat',
+                'snapType', 'snapChannel', 'powerTrigger', 'powerTriggerCount', 'snapPreTrigger',
+                'snapPostTrigger'], applyState);
+}
+
+// things that change all the time, these alone don't need the new column rebuilt
+var fastKeys = ['delay', 'loopCpuPc', 'overflows', 'fps', 'oneInN', 'digitiserGain', 'snapSize', 'snapTriggerState',
+                'snapWrite'];
+var stateTags = {};   // ETag of the last reply from /state, for each set of keys
+
+function syncCurrentFast() {
+    // things that we wish to update faster
+    if (statusPushed) {
+        return;
+    }
+    fetchState(fastKeys, applyState);
+}
+
+function applyState(obj) {
+    sdrState.setConfigFromJason(obj);
+    snapState.setSnapFromJason(obj);
+    showCurrent(obj);
+}
+
+function fetchStatus(uris) {
+    for (let i = 0; i < uris.length; i++) {
+        fetch(uris[i]).then(function (response) {
+            return response.json();
+        }).then(function (obj) {
+            applyState(obj);
+        }).catch(function (error) {
+        });
+    }
+}
+
+function fetchState(keys, show) {
+    // all the keys in one request, the server sends nothing back if none have changed since we last asked
+    let uri = './state?keys=' + keys.join(',');
+    let headers = {};
+    if (stateTags[uri] != undefined) {
+        headers['If-None-Match'] = stateTags[uri];
+    }
+    fetch(uri, {cache: 'no-store', headers: headers}).then(function (response) {
+        if (response.status != 200) {
+            return null;  // 304, not modified
+        }
+        stateTags[uri] = response.headers.get('ETag');
         return response.json();
     }).then(function (obj) {
-        if (obj && (obj['errors'] != "")) {
-            alert(obj['errors']);
+        if (obj) {
+            show(obj.state);
         }
     }).catch(function (error) {
     });
+}
 
-    fetch('./input/source').then(function (response) {
-        return response.json();
-    }).then(function (obj) {
-        sdrState.setConfigFromJason(obj);
+function handleStatus(changes) {
+    // the status that changed, pushed to us by the server on the websocket
+    statusPushed = true;
+    applyState(changes);
+
+    // the new column, only if something other than the fast changing values changed
+    if (Object.keys(changes).some(key => !fastKeys.includes(key))) {
+        if (!configFormInFocus) {
+            showNew(changes);
+        }
+        showNewSnap(changes);
+    }
+}
+
+function showCurrent(obj) {
+    // show the values in the current column, for whatever status obj has
+    if ((obj.errors != undefined) && (obj.errors != "")) {
+        alert(obj.errors);
+    }
+
+    if (obj.source != undefined) {
         let src = '<div>'+sdrState.getInputSource()+'</div>';
         src += '<div title="'+sdrState.getInputSourceParamHelp()+'" class="CropLongTexts100">'+sdrState.getInputSourceParams()+'</div>'
         src += '<div>'+(sdrState.getSourceConnected()?'Connected':'Not Connected')+'</div>';
         $('#currentSource').empty().append(src);
-    }).catch(function (error) {
-    });
-
-    // flagged that source changed so remove any green highlights from file table
-    updateSnapFileList();
+    }
 
-    fetch('./tuning/frequency').then(function (response) {
-        return response.json();
-    }).then(function (obj) {
-        sdrState.setConfigFromJason(obj);
+    if (obj.frequency != undefined) {
         $('#currentCentre').empty().append((sdrState.getFrequencyHz()/1e6).toFixed(6)+' MHz');
         $('#currentCfOffset').empty().append((sdrState.getFrequencyOffsetHz()/1e6).toFixed(6)+' MHz');
-    }).catch(function (error) {
-    });
+    }
 
-    fetch('./digitiser/digitiserFrequency').then(function (response) {
-        return response.json();
-    }).then(function (obj) {
-        sdrState.setConfigFromJason(obj);
+    if (obj.digitiserFrequency != undefined) {
         $('#currentSdrCentre').empty().append((sdrState.getSdrFrequencyHz()/1e6).toFixed(6)+' MHz');
-    }).catch(function (error) {
-    });
+    }
 
-    fetch('./digitiser/digitiserFormat').then(function (response) {
-        return response.json();
-    }).then(function (obj) {
-        sdrState.setConfigFromJason(obj);
+    if (obj.digitiserFormat != undefined) {
         $('#currentFormat').empty().append(sdrState.getDataFormat());
-    }).catch(function (error) {
-    });
+    }
 
-    fetch('./digitiser/digitiserSampleRate').then(function (response) {
-        return response.json();
-    }).then(function (obj) {
-        sdrState.setConfigFromJason(obj);
+    if (obj.digitiserSampleRate != undefined) {
         $('#currentSps').empty().append((sdrState.getSps()/1e6).toFixed(6)+' Msps');
         $('#currentRBW').empty().append(spectrum.convertFrequencyForDisplay(sdrState.getSps() / sdrState.getFftSize(),2));
-    }).catch(function (error) {
-    });
+    }
 
-    fetch('./digitiser/digitiserBandwidth').then(function (response) {
-        return response.json();
-    }).then(function (obj) {
-        sdrState.setConfigFromJason(obj);
+    if (obj.digitiserBandwidth != undefined) {
         $('#currentSdrBw').empty().append((sdrState.getSdrBwHz()/1e6).toFixed(6)+' MHz');
-    }).catch(function (error) {
-    });
+    }
 
-    fetch('./digitiser/digitiserPartsPerMillion').then(function (response) {
-        return response.json();
-    }).then(function (obj) {
-        sdrState.setConfigFromJason(obj);
+    if (obj.digitiserPartsPerMillion != undefined) {
         $('#currentPpm',).empty().append((sdrState.getPpmError()).toFixed(3));
-    }).catch(function (error) {
-    });
+    }
 
-    fetch('./digitiser/digitiserDbmOffset').then(function (response) {
-        return response.json();
-    }).then(function (obj) {
-        sdrState.setConfigFromJason(obj);
+    if (obj.digitiserDbmOffset != undefined) {
         $('#currentdBmOffset',).empty().append((sdrState.getDBmOffset()).toFixed(3));
-    }).catch(function (error) {
-    });
+    }
 
-    fetch('./digitiser/digitiserGainType').then(function (response) {
-        return response.json();
-    }).then(function (obj) {
-        sdrState.setConfigFromJason(obj);
+    if (obj.digitiserGainType != undefined) {
         $('#currentGmode').empty().append(sdrState.getGainMode());
-    }).catch(function (error) {
-    });
-    
-    fetch('./spectrum/fftSize').then(function (response) {
-        return response.json();
-    }).then(function (obj) {
-        sdrState.setConfigFromJason(obj);
+    }
+
+    if (obj.fftSize != undefined) {
         $('#currentFft').empty().append(sdrState.getFftSize());
         $('#currentRBW').empty().append(spectrum.convertFrequencyForDisplay(sdrState.getSps() / sdrState.getFftSize(),2));
-    }).catch(function (error) {
-    });
+    }
 
-    fetch('./spectrum/fftFrameTime').then(function (response) {
-        return response.json();
-    }).then(function (obj) {
-        sdrState.setConfigFromJason(obj);
+    if (obj.fftFrameTime != undefined) {
         $('#fftFrameTime').empty().append(sdrState.getFftFrameTime().toFixed(0) + " usec");
-    }).catch(function (error) {
-    });
+    }
 
-    fetch('./spectrum/fftWindow').then(function (response) {
-        return response.json();
-    }).then(function (obj) {
-        sdrState.setConfigFromJason(obj);
+    if (obj.fftWindow != undefined) {
         $('#currentFftWindow').empty().append(sdrState.getFftWindow());
-    }).catch(function (error) {
-    });
+    }
 
-    fetch('./snapshot/snapTriggerSource').then(function (response) {
-        return response.json();
-    }).then(function (obj) {
-        snapState.setSnapFromJason(obj);
+    if (obj.snapTriggerSource != undefined) {
         $('#currentSnapTriggerType').empty().append(snapState.getTriggerType());
-    }).catch(function (error) {
-    });
+    }
 
-    fetch('./snapshot/snapName').then(function (response) {
-        return response.json();
-    }).then(function (obj) {
-        snapState.setSnapFromJason(obj);
+    if (obj.powerTrigger != undefined || obj.powerTriggerCount != undefined) {
+        let rules = snapState.getPowerTrigger();
+        let current = '<div title="'+rules+'" class="CropLongTexts100">'+rules+'</div>';
+        if (snapState.getPowerTriggerCount() > 0) {
+            current += snapState.getPowerTriggerCount() + ' triggers';
+        }
+        $('#currentPowerTrigger').empty().append(current);
+    }
+
+    if (obj.snapName != undefined) {
         let name = '<div title="'+snapState.getBaseName()+'" class="CropLongTexts100">'+snapState.getBaseName()+'</div>'
         $('#currentSnapBaseName').empty().append(name);
-    }).catch(function (error) {
-    });
+    }
 
-    fetch('./snapshot/snapFormat').then(function (response) {
-        return response.json();
-    }).then(function (obj) {
-        snapState.setSnapFromJason(obj);
+    if (obj.snapFormat != undefined) {
         $('#currentFileFormat').empty().append(snapState.getFileFormat());
-    }).catch(function (error) {
-    });
+    }
 
-    fetch('./snapshot/snapPreTrigger').then(function (response) {
-        return response.json();
-    }).then(function (obj) {
-        snapState.setSnapFromJason(obj);
-        $('#currentSnapPreTrigger').empty().append(snapState.getPreTriggerMilliSec().toFixed(0) + ' msec');
-    }).catch(function (error) {
-    });
+    if (obj.snapType != undefined) {
+        $('#currentSampleType').empty().append(snapState.getSampleType());
+    }
 
-    fetch('./snapshot/snapPostTrigger').then(function (response) {
-        return response.json();
-    }).then(function (obj) {
-        snapState.setSnapFromJason(obj);
-        $('#currentSnapPostTrigger').empty().append(snapState.getPostTriggerMilliSec().toFixed(0) + ' msec');
-    }).catch(function (error) {
-    });
+    if (obj.snapChannel != undefined) {
+        $('#currentSnapChannel').empty().append(snapState.getChannel() == "" ? "all" : snapState.getChannel());
+    }
 
-}
+    if (obj.snapPreTrigger != undefined) {
+        $('#currentSnapPreTrigger').empty().append(snapState.getPreTriggerMilliSec().toFixed(0) + ' msec');
+    }
 
-function syncCurrentFast() {
-    // things that we wish to update faster
+    if (obj.snapPostTrigger != undefined) {
+        $('#currentSnapPostTrigger').empty().append(snapState.getPostTriggerMilliSec().toFixed(0) + ' msec');
+    }
 
-    fetch('./control/delay').then(function (response) {
-        return response.json();
-    }).then(function (obj) {
+    if (obj.delay != undefined) {
         sdrState.setUiDelay(obj.delay);
         $('#currentDelay').empty().append(sdrState.getUiDelay().toFixed(2));
-    }).catch(function (error) {
-    });
+    }
 
-    fetch('./control/loopCpuPc').then(function (response) {
-        return response.json();
-    }).then(function (obj) {
+    if (obj.loopCpuPc != undefined) {
         sdrState.setLoopCpuPc(obj.loopCpuPc);
         $('#currentLoopCpuPc').empty().append(sdrState.getLoopCpuPc().toFixed(1) +'%');
-    }).catch(function (error) {
-    });
+    }
 
-    fetch('./control/overflows').then(function (response) {
-        return response.json();
-    }).then(function (obj) {
+    if (obj.overflows != undefined) {
         sdrState.setOverflows(obj.overflows);
         $('#currentOverflows').empty().append(sdrState.getOverflows());
-    }).catch(function (error) {
-    });
+    }
 
-    fetch('./control/fps').then(function (response) {
-        return response.json();
-    }).then(function (obj) {
+    if (obj.fps != undefined) {
         sdrState.setFps(obj.fps);
         let maxFps = sdrState.getSps() / sdrState.getFftSize();
         $('#currentFPS').empty().append(sdrState.getMeasuredFps().toFixed(1), "/", sdrState.getFps().toFixed(0),", max:", maxFps.toFixed(1));
-    }).catch(function (error) {
-    });
+    }
 
-    fetch('./control/oneInN').then(function (response) {
-        return response.json();
-    }).then(function (obj) {
+    if (obj.oneInN != undefined) {
         $('#currentOneInN').empty().append(obj.oneInN.toFixed(1)+" traces");
-    }).catch(function (error) {
-    });
+    }
 
-    fetch('./digitiser/digitiserGain').then(function (response) {
-        return response.json();
-    }).then(function (obj) {
+    if (obj.digitiserGain != undefined) {
         sdrState.setGain(obj.digitiserGain);
         $('#currentGain').empty().append(sdrState.getGain() + ' dB');
-    }).catch(function (error) {
-    });
+    }
 
-    fetch('./snapshot/snapSize').then(function (response) {
-        return response.json();
-    }).then(function (obj) {
+    if (obj.snapSize != undefined) {
         snapState.setCurrentSize(obj.snapSize.current);
         snapState.setExpectedSize(obj.snapSize.limit);
         $('#currentSnapSize').empty().append(snapState.getCurrentSize().toFixed(2) + ' MBytes');
         $('#newSnapSize').empty().append(snapState.getExpectedSize().toFixed(2) + ' MBytes');
-    }).catch(function (error) {
-    });
+    }
 
-    fetch('./snapshot/snapTriggerState').then(function (response) {
-        return response.json();
-    }).then(function (obj) {
+    if (obj.snapWrite != undefined) {
+        let writing = 'idle';
+        if (obj.snapWrite.pending > 0) {
+            writing = obj.snapWrite.pending + ' snaps, ' + obj.snapWrite.mbytes.toFixed(0) + ' MBytes, ' +
+                obj.snapWrite.percent.toFixed(0) + '%';
+        }
+        $('#currentSnapWrite').empty().append(writing);
+    }
+
+    if (obj.snapTriggerState != undefined) {
         snapState.setTriggerState(obj.snapTriggerState);
         $('#currentSnapTriggerState').empty().append(snapState.getTriggerState());
         if (snapState.getTriggerState() == "triggered") {
@@ -259,48 +266,31 @@ function syncCurrentFast() {
             $('#currentSnapTriggerState').addClass('greenTrigger');
             $('#currentSnapTriggerState').removeClass('redTrigger');
         }
-    }).catch(function (error) {
-    });
+    }
 }
 
 function syncNew() {
     // this rewrites all the values in the configuration table 'new' column
 
-    // if we have focus on a form then don't update the table
-    if (configFormInFocus) {
+    // if we have focus on a form then don't update the table, the server may be pushing changes to us
+    if (configFormInFocus || statusPushed) {
         return;
     }
 
     // get all the main stuff
-    let initUris = ['./input/sources', './digitiser/digitiserFormats', './spectrum/fftSizes', './spectrum/fftFrameTime',
-                './spectrum/fftWindows', './digitiser/digitiserGainTypes', './control/presetFps',
-                './digitiser/digitiserGain', './digitiser/digitiserSampleRate', './tuning/frequency',
-                './digitiser/digitiserBandwidth', './digitiser/digitiserPartsPerMillion',
-                './digitiser/digitiserDbmOffset'];
-    for (let i = 0; i < initUris.length; i++) {
-        fetch(initUris[i]).then(function (response) {
-            return response.json();
-        }).then(function (obj) {
-            // update the configuration and the html when we get a reply
-            sdrState.setConfigFromJason(obj)
-            showNew(obj);
-        }).catch(function (error) {
-        });
-    }
+    fetchState(['sources', 'digitiserFormats', 'fftSizes', 'fftFrameTime', 'fftWindows', 'digitiserGainTypes',
+                'presetFps', 'digitiserGain', 'digitiserSampleRate', 'frequency', 'digitiserBandwidth',
+                'digitiserPartsPerMillion', 'digitiserDbmOffset'], function (obj) {
+        // update the configuration and the html when we get a reply
+        sdrState.setConfigFromJason(obj);
+        showNew(obj);
+    });
 
     // snap stuff
-    initUris = ['./snapshot/snapTriggerSources',
-                './snapshot/snapFormats', './snapshot/snaps'];
-    for (let i = 0; i < initUris.length; i++) {
-        fetch(initUris[i]).then(function (response) {
-            return response.json();
-        }).then(function (obj) {
-            // update the configuration and the html when we get a reply
-            snapState.setSnapFromJason(obj);
-            showNewSnap(obj);
-        }).catch(function (error) {
-        });
-    }
+    fetchState(['snapTriggerSources', 'snapFormats', 'snapTypes', 'snaps'], function (obj) {
+        snapState.setSnapFromJason(obj);
+        showNewSnap(obj);
+    });
 }
 
 function showNew(jsonConfig) {
@@ -561,26 +551,51 @@ function showNew(jsonConfig) {
     }
 }
 
-async function handleBlob(binary_blob_data) {
-    // We expect a binary blob in a particular format
-    // Extract the data out of the binary blob, which was packed up by the python in a struct.
-    // See the python WebSocketServer code for the format of the blob
+function decodeQuantized(dataView, buffer, index, num_values) {
+    // quantized dB values, dB = offset + value * step, optionally the difference from the previous frame
+    let offset = dataView.getFloat32((index), false);
+    index += 4;
+    let step = dataView.getFloat32((index), false);
+    index += 4;
+    let flags = dataView.getInt32((index), false);
+    index += 4;
+
+    // values are little endian so view them in place
+    let values = (flags & 1) ? new Uint16Array(buffer, index, num_values) : new Uint8Array(buffer, index, num_values);
+    if (flags & 2) {
+        // the typed array wraps the sum just as the server wrapped the difference
+        if (!quantizedReference || (quantizedReference.length != num_values) ||
+                (quantizedReference.BYTES_PER_ELEMENT != values.BYTES_PER_ELEMENT)) {
+            return null;    // no complete frame yet to add to
+        }
+        for (let i=0; i<num_values; i++){
+            quantizedReference[i] += values[i];
+        }
+    } else {
+        quantizedReference = values.slice();
+    }
 
-    try {
-        let buffer = await binary_blob_data.arrayBuffer();
+    let peaks = new Float32Array(num_values);
+    for (let i=0; i<num_values; i++){
+        peaks[i] = offset + quantizedReference[i] * step;
+    }
+    return peaks;
+}
 
-        // data is network order, i.e. big endian
-        // access the data as a buffer of bytes
-        let data_bytes = new Uint8Array(buffer);
-        // and allow different views on the data
-        let dataView = new DataView(data_bytes.buffer);
+function handleSpectrum(buffer) {
+    // We expect a binary buffer in a particular format
+    // Extract the data out of the buffer, which was packed up by the python in a struct.
+    // See the python WebSocketServer code for the format of the buffer
+
+    try {
+        // header is network order, i.e. big endian
+        let dataView = new DataView(buffer);
 
         let index = 0;
         let data_type = dataView.getInt32((index), false);
         index += 4;
 
-        // assume magnitude data for now
-        if (data_type != 1) {
+        if ((data_type != 1) && (data_type != 2) && (data_type != 3)) {
             console.log("Received non-magnitude data from websocket, type", data_type);
         } else {
             // mixed int and floats
@@ -602,10 +617,40 @@ async function handleBlob(binary_blob_data) {
             let num_floats = dataView.getInt32((index), false);
             index += 4;
 
-            let peaks = new Float32Array(num_floats);
-            for (var i=0; i<num_floats; i++){
-                peaks[i]=dataView.getFloat32((index), false);
-                index += 4;
+            // the server may pool the spectrum down to total bins and only send those we see
+            let fft_size = dataView.getInt32((index), false);
+            index += 4;
+            let total = dataView.getInt32((index), false);
+            index += 4;
+            let start = dataView.getInt32((index), false);
+            index += 4;
+
+            if (data_type == 3) {
+                handleHistoryRow(dataView, buffer, index, num_floats, spsHz, parseInt(cfMHz*1e6),
+                                 start_time_sec + start_time_nsec / 1e9);
+                return;
+            }
+
+            let peaks = null;
+            if (data_type == 1) {
+                // the spectrum itself is little endian float32, view it in place
+                peaks = new Float32Array(buffer, index, num_floats);
+            } else {
+                // decoded even when stopped so the deltas keep track
+                peaks = decodeQuantized(dataView, buffer, index, num_floats);
+            }
+
+            // if we are stopped then ignore this spectrum
+            if (!peaks || stop.value) {
+                return;
+            }
+
+            if ((total != num_floats) || (start != 0)) {
+                // fill the bins we don't see with the lowest we do
+                let floor = peaks.reduce(function(a, b) {return Math.min(a, b);});
+                let whole = new Float32Array(total).fill(floor);
+                whole.set(peaks, start);
+                peaks = whole;
             }
 
             sdrState.setLastDataTime(start_time_sec);
@@ -613,14 +658,14 @@ async function handleBlob(binary_blob_data) {
             // tell the spectrum how this data is configured, which could change
             if ( (sdrState.getSps() != spsHz) ||
                     (sdrState.getFrequencyHz() != parseInt(cfMHz*1e6)) ||
-                    (sdrState.getFftSize() != num_floats) ||
+                    (sdrState.getFftSize() != fft_size) ||
                     spectrum.getResetAvgChanged() ||
                     spectrum.getResetZoomChanged() ) {
 
                 let cfHz = cfMHz*1e6;
                 sdrState.setFrequencyHz(cfHz);
                 sdrState.setSps(spsHz);
-                sdrState.setFftSize(num_floats);
+                sdrState.setFftSize(fft_size);
 
                 spectrum.setSps(spsHz);
                 spectrum.setSpanHz(spsHz);
@@ -629,11 +674,69 @@ async function handleBlob(binary_blob_data) {
                 spectrum.updateAxes();
             }
             spectrum.addData(peaks, start_time_sec, start_time_nsec, end_time_sec, end_time_nsec);
+            requestView();
+            if (!historyRequested) {
+                requestHistory(start_time_sec + start_time_nsec / 1e9);
+            }
         }
     }
     catch (e)
     {
-        console.log("Exception while processing blob from websocket, "+e.message);
+        console.log("Exception while processing spectrum from websocket, "+e.message);
+    }
+}
+
+function requestHistory(before) {
+    // fill the waterfall below the first spectrum with the server's history
+    historyRequested = true;
+    historyRows = [];
+    historyBelow = spectrum.inputCount;
+    historyBefore = before;
+    websocket.send(JSON.stringify({history: {rows: spectrum.wf_rows}}));
+}
+
+function handleHistoryRow(dataView, buffer, index, num_values, spsHz, cfHz, time) {
+    // a row of the history, quantized bytes across the whole span, placed when we have them all
+    let offset = dataView.getFloat32((index), false);
+    index += 4;
+    let step = dataView.getFloat32((index), false);
+    index += 4;
+    let flags = dataView.getInt32((index), false);
+    index += 4;
+
+    if (historyRows == null) {
+        return;     // not asked for
+    }
+    if ((time < historyBefore) && (spsHz == sdrState.getSps()) && (cfHz == sdrState.getFrequencyHz())) {
+        // to the bins we show
+        let values = new Uint8Array(buffer, index, num_values);
+        let bins = spectrum.fftSize;
+        let row = new Float32Array(bins);
+        for (let i=0; i<bins; i++){
+            row[i] = offset + values[Math.floor(i * num_values / bins)] * step;
+        }
+        historyRows.push(row);
+    }
+    if (flags & 4) {
+        // oldest first, so the newest goes just below the spectrums that arrived since we asked
+        let depth = spectrum.inputCount - historyBelow + 1;
+        for (let i=historyRows.length-1; i>=0; i--) {
+            spectrum.putWaterfallRow(historyRows[i], depth);
+            depth += 1;
+        }
+        spectrum.drawWaterfall();
+        historyRows = null;
+    }
+}
+
+function requestView() {
+    // tell the server what we show, it then sends just that at about a bin per pixel
+    let view = JSON.stringify({width: spectrum.canvas.clientWidth,
+                               span: Math.round(spectrum.getZoomSpanHz()),
+                               centre: Math.round(spectrum.getZoomCfHz())});
+    if ((view != lastView) && websocket && (websocket.readyState == WebSocket.OPEN)) {
+        websocket.send(view);
+        lastView = view;
     }
 }
 
@@ -698,6 +801,10 @@ function zoomedToCf() {
 }
 
 function ack() {
+    if (statusPushed) {
+        websocket.send(JSON.stringify({"ackTime":sdrState.getLastDataTime()}));
+        return;
+    }
     fetch("./control/ackTime", {
         method: "PUT",
         headers: {
@@ -1012,6 +1119,27 @@ function showNewSnap() {
     new_html += '</select></form>';
     $('#newFileFormat').empty().append(new_html);
 
+    let sampleTypes = snapState.getSampleTypes();
+    let sampleType = snapState.getSampleType();
+    new_html = '<form';
+    new_html += ' onfocusin="snapTableFocusIn()" onfocusout="snapTableFocusOut()" ';
+    new_html += ' action="javascript:handleSnapSampleTypeChange(snapSampleType.value)">';
+    new_html += '<select id="snapSampleType" name="snapSampleType" onchange="this.form.submit()">';
+    sampleTypes.forEach(function(type) {
+        new_html += '<option value="'+type+'"'+((type==sampleType)?"selected":"")+'>'+type+'</option>';
+    });
+    new_html += '</select></form>';
+    $('#newSampleType').empty().append(new_html);
+
+    new_html = '<form ';
+    new_html += ' onfocusin="snapTableFocusIn()" onfocusout="snapTableFocusOut()" ';
+    new_html += 'action="javascript:handleSnapChannelChange(snapChannel.value)">';
+    new_html += '<input data-toggle="tooltip" title="offset_hz:bandwidth_hz e.g. 125e3:25e3, empty for all"';
+    new_html += ' type="text" size="10" value="' + snapState.getChannel();
+    new_html += '" id="snapChannel" name="snapChannel">';
+    new_html += '</form>';
+    $('#newSnapChannel').empty().append(new_html);
+
     let triggerTypes = snapState.getTriggers();
     let triggerType = snapState.getTriggerType();
     if (triggerTypes.length > 0) {
@@ -1029,6 +1157,15 @@ function showNewSnap() {
     }
     $('#newSnapTriggerType').empty().append(new_html);
 
+    new_html = '<form ';
+    new_html += ' onfocusin="snapTableFocusIn()" onfocusout="snapTableFocusOut()" ';
+    new_html += 'action="javascript:handleSnapPowerTriggerChange(snapPowerTrigger.value)">';
+    new_html += '<input data-toggle="tooltip" title="mask:start_hz:stop_hz:dBm noise:dB frames:N holdoff:sec rearm:edge|level"';
+    new_html += ' type="text" size="10" value="' + snapState.getPowerTrigger();
+    new_html += '" id="snapPowerTrigger" name="snapPowerTrigger">';
+    new_html += '</form>';
+    $('#newPowerTrigger').empty().append(new_html);
+
     new_html = '<form ';
     new_html += ' onfocusin="snapTableFocusIn()" onfocusout="snapTableFocusOut()" ';
     new_html += 'action="javascript:handleSnapPreTriggerChange(snapPreTrigMilliSec.value)">';
@@ -1062,6 +1199,7 @@ function configFocusIn(){
 }
 function configFocusOut(){
     configFormInFocus = false;
+    stateTags = {};  // the form may have been edited, get all of it next time even if it has not changed
 }
 
 function connectWebSocket(spec) {
@@ -1070,9 +1208,20 @@ function connectWebSocket(spec) {
     let server = "ws://"+server_hostname+":"+server_port+"/";
     console.log("WebSocket connecting to", server);
     websocket = new WebSocket(server);
+    // spectrums arrive in order and are decoded straight away, deltas rely on this
+    websocket.binaryType = "arraybuffer";
+    quantizedReference = null;
+    lastView = null;
+    historyRequested = false;
 
     websocket.onopen = function(event) {
         console.log("WebSocket connected to", server);
+        // ask for a compact format if the page was loaded with e.g. ?wire=u8&delta=1
+        let params = new URLSearchParams(window.location.search);
+        let wire = params.get("wire");
+        if (wire) {
+            websocket.send(JSON.stringify({format: wire, delta: params.get("delta") == "1"}));
+        }
         // Update the status led
         $("#connection_state").empty();
         let new_element = '<img src="./icons/led-yellow.png" alt="connected" title="Connected" >';
@@ -1082,6 +1231,7 @@ function connectWebSocket(spec) {
     websocket.onclose = function(event) {
         console.log("WebSocket closed");
         data_active = false;
+        statusPushed = false;   // back to polling until we reconnect
         // Update the status led
         let new_element = '<img src="./icons/led-red.png" alt="no connection title="No connection" ">';
         $("#connection_state").empty();
@@ -1109,10 +1259,16 @@ function connectWebSocket(spec) {
             $('#connection_state').append(new_element);
         }
 
-        // if we are stopped then ignore this blob
-        if (!stop.value) {
-            if (event.data instanceof Blob) {
-                handleBlob(event.data);
+        if (event.data instanceof ArrayBuffer) {
+            handleSpectrum(event.data);
+        } else {
+            try {
+                let obj = JSON.parse(event.data);
+                if (obj.status != undefined) {
+                    handleStatus(obj.status);
+                }
+            } catch (e) {
+                console.log("Exception while processing text from websocket, "+e.message);
             }
         }
     }
@@ -1142,6 +1298,10 @@ function check_for_support(){
             ok += ", Missing blob arrayBuffer support";
         }
     }
+    // spectrum values from the websocket are little endian and viewed directly as typed arrays
+    if (new Uint8Array(new Float32Array([1.0]).buffer)[3] != 0x3f) {
+        ok += ", Big endian platform";
+    }
     if (!window.jQuery) {
         ok += ", Missing jQuery";
     }
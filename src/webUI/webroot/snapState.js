@@ -41,6 +41,21 @@ snapState.prototype.setFileFormat = function(fileFormat) {
 snapState.prototype.setFileFormats = function(fileFormats) {
     this.fileFormats = fileFormats;
 }
+snapState.prototype.setChannel = function(channel) {
+    this.channel = channel;
+}
+snapState.prototype.setPowerTrigger = function(rules) {
+    this.powerTrigger = rules;
+}
+snapState.prototype.setPowerTriggerCount = function(count) {
+    this.powerTriggerCount = count;
+}
+snapState.prototype.setSampleType = function(sampleType) {
+    this.sampleType = sampleType;
+}
+snapState.prototype.setSampleTypes = function(sampleTypes) {
+    this.sampleTypes = sampleTypes;
+}
 
 
 snapState.prototype.getBaseName = function() {
@@ -79,6 +94,21 @@ snapState.prototype.getFileFormat = function() {
 snapState.prototype.getFileFormats = function() {
     return this.fileFormats;
 }
+snapState.prototype.getChannel = function() {
+    return this.channel;
+}
+snapState.prototype.getPowerTrigger = function() {
+    return this.powerTrigger;
+}
+snapState.prototype.getPowerTriggerCount = function() {
+    return this.powerTriggerCount;
+}
+snapState.prototype.getSampleType = function() {
+    return this.sampleType;
+}
+snapState.prototype.getSampleTypes = function() {
+    return this.sampleTypes;
+}
 snapState.prototype.getDirectoryListEntries = function() {
     return this.directoryList.length;
 }
@@ -112,6 +142,21 @@ snapState.prototype.setSnapFromJason = function(jsonConfig) {
     if (jsonConfig.snapFormat != undefined) {
         snapState.setFileFormat(jsonConfig.snapFormat);
     }
+    if (jsonConfig.snapChannel != undefined) {
+        snapState.setChannel(jsonConfig.snapChannel);
+    }
+    if (jsonConfig.powerTrigger != undefined) {
+        snapState.setPowerTrigger(jsonConfig.powerTrigger);
+    }
+    if (jsonConfig.powerTriggerCount != undefined) {
+        snapState.setPowerTriggerCount(jsonConfig.powerTriggerCount);
+    }
+    if (jsonConfig.snapTypes != undefined) {
+        snapState.setSampleTypes(jsonConfig.snapTypes);
+    }
+    if (jsonConfig.snapType != undefined) {
+        snapState.setSampleType(jsonConfig.snapType);
+    }
 
     // just on size discrepancy for now
     if(jsonConfig.snaps != undefined) {
@@ -190,6 +235,42 @@ function handleSnapFileFormatChange(fileFormat) {
     });
     snapState.setFileFormat(fileFormat);
 }
+function handleSnapChannelChange(channel) {
+    fetch("./snapshot/snapChannel", {
+        method: "PUT",
+        headers: {
+            "Content-Type": "application/json",
+        },
+        body: JSON.stringify({"snapChannel":(channel)})
+    }).then(response => {
+        return response.json();
+    });
+    snapState.setChannel(channel);
+}
+function handleSnapPowerTriggerChange(rules) {
+    fetch("./snapshot/powerTrigger", {
+        method: "PUT",
+        headers: {
+            "Content-Type": "application/json",
+        },
+        body: JSON.stringify({"powerTrigger":(rules)})
+    }).then(response => {
+        return response.json();
+    });
+    snapState.setPowerTrigger(rules);
+}
+function handleSnapSampleTypeChange(sampleType) {
+    fetch("./snapshot/snapType", {
+        method: "PUT",
+        headers: {
+            "Content-Type": "application/json",
+        },
+        body: JSON.stringify({"snapType":(sampleType)})
+    }).then(response => {
+        return response.json();
+    });
+    snapState.setSampleType(sampleType);
+}
 
 
 function snapState() {
@@ -205,4 +286,9 @@ function snapState() {
     this.deleteFileName = "";
     this.fileFormats = [];
     this.fileFormat = "";
+    this.sampleTypes = [];
+    this.channel = "";
+    this.powerTrigger = "";
+    this.powerTriggerCount = 0;
+    this.sampleType = "";
 }
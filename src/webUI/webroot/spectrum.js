@@ -76,6 +76,14 @@ Spectrum.prototype.addWaterfallRow = function(bins) {
     this.drawWaterfall();
 }
 
+Spectrum.prototype.putWaterfallRow = function(bins, row) {
+    // put a row at a depth in the waterfall, for history older than what we have
+    if ((bins.length == this.wf_size) && (row < this.wf_rows)) {
+        this.rowToImageData(bins);
+        this.ctx_wf.putImageData(this.imagedata, 0, row);
+    }
+}
+
 Spectrum.prototype.drawFFT = function(bins, colour) {
     if(bins != null) {
         this.ctx.beginPath();
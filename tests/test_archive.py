@@ -0,0 +1,48 @@
+import os
+
+import numpy as np
+
+from misc import IqArchive
+
+
+def write_archive(filename, data, codec='zlib'):
+    with IqArchive.ArchiveWriter(filename, '16tle', 10000, 100e6, 1_000_000_000, codec, chunk_seconds=0.1) as archive:
+        # pieces that don't line up with the 1000 sample chunks
+        for start in range(0, data.shape[0], 700):
+            archive.write(data[start:start + 700])
+
+
+def test_round_trip(tmp_path):
+    data = np.random.default_rng(1).integers(-100, 100, (5500, 2), dtype=np.int16)
+    filename = os.path.join(tmp_path, "test.iqz")
+    for codec in IqArchive.CODECS:
+        write_archive(filename, data, codec)
+        assert IqArchive.is_archive(filename)
+
+        reader = IqArchive.ArchiveReader(filename, read_ahead=2)
+        assert reader.get_sample_type() == '16tle' and reader.get_samples() == 5500
+        assert reader.read(4 * 6000) == data.tobytes()  # short at the end, as a file is
+        assert reader.read(4) == b''
+
+        reader.seek(4 * 2345)
+        assert reader.read(4 * 10) == data[2345:2355].tobytes()
+        assert reader.seek_time(1_000_000_000 + 250_000_000) == 1_200_000_000  # start of the chunk it is in
+        assert reader.read(4) == data[2000].tobytes()
+        reader.seek(0)
+        assert reader.read(4) == data[0].tobytes()
+        reader.close()
+
+
+def test_no_index(tmp_path):
+    data = np.arange(5500 * 2, dtype=np.int16).reshape(5500, 2)
+    filename = os.path.join(tmp_path, "test.iqz")
+    write_archive(filename, data)
+    with open(filename, "rb") as file:
+        contents = file.read()
+    with open(filename, "wb") as file:
+        file.write(contents[:-300])  # the index and some of the last chunk
+
+    reader = IqArchive.ArchiveReader(filename)
+    assert reader.get_samples() == 5000  # the complete chunks
+    assert reader.read(4 * 5500) == data[:5000].tobytes()
+    reader.close()
@@ -0,0 +1,12 @@
+from misc import benchmark
+
+
+def test_compare_flags_slower_results():
+    baseline = {'fft.numpy.1024': {'usec': 10.0}, 'process.1024': {'usec': 20.0}, 'gone': {'usec': 1.0}}
+    results = {'fft.numpy.1024': {'usec': 12.0}, 'process.1024': {'usec': 21.0}, 'new': {'usec': 5.0}}
+    assert benchmark.compare(results, baseline, 10.0) == [('fft.numpy.1024', 10.0, 12.0, 20.0)]
+    assert benchmark.compare(results, baseline, 25.0) == []
+
+
+def test_time_it():
+    assert benchmark.time_it(lambda: None, min_seconds=0.001, repeats=1) > 0
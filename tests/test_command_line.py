@@ -0,0 +1,31 @@
+import argparse
+import json
+
+from misc import commandLine
+
+
+def test_config_file_plugins_become_lists(tmp_path):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sampleRate', type=float)
+    parser.add_argument('--plugin', type=str, action='append', nargs='+')
+    config = tmp_path / "node.json"
+    config.write_text(json.dumps({"sampleRate": 2e6, "plugin": ["report:stdout"]}))
+
+    options = commandLine.read_config_file(str(config), parser)
+    assert options == {"sampleRate": 2e6, "plugin": [["report:stdout"]]}
+
+
+def test_command_line_plugins_replace_config(tmp_path):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--config', type=str)
+    parser.add_argument('--sampleRate', type=float)
+    parser.add_argument('--plugin', type=str, action='append', nargs='+')
+    config = tmp_path / "node.json"
+    config.write_text(json.dumps({"sampleRate": 2e6, "plugin": ["report:stdout", "analysis:peak"]}))
+
+    args = commandLine.parse_with_config(parser, ['--config', str(config)])
+    assert args['plugin'] == [["report:stdout"], ["analysis:peak"]] and args['sampleRate'] == 2e6
+
+    args = commandLine.parse_with_config(parser, ['--config', str(config), '--plugin', 'report:mqtt',
+                                                  '--sampleRate', '1e6'])
+    assert args['plugin'] == [["report:mqtt"]] and args['sampleRate'] == 1e6
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from dataProcessing import Ddc
+
+SPS = 1e6
+
+
+def tone(offset_hz: float, samples: int) -> np.ndarray:
+    return np.exp(2j * np.pi * offset_hz * np.arange(samples) / SPS).astype(np.complex64)
+
+
+def test_parse_channel():
+    assert Ddc.parse_channel("") is None
+    assert Ddc.parse_channel("-125e3:25e3") == (-125e3, 25e3)
+    for spec in ["125e3", "125e3:0", "a:b", "1:2:3"]:
+        with pytest.raises(ValueError):
+            Ddc.parse_channel(spec)
+
+
+def test_channel():
+    ddc = Ddc.Ddc(100e3, 20e3, SPS)
+    assert ddc.get_decimation() == 33 and ddc.get_sample_rate() == SPS / 33
+
+    # blocks that don't line up with the decimation give the same as one block
+    samples = tone(105e3, 33 * 600)
+    out = np.concatenate([ddc.process(samples[start:start + 1000]) for start in range(0, samples.size, 1000)])
+    assert out.size == 600  # the filter starts full of zeros
+    whole = Ddc.Ddc(100e3, 20e3, SPS).process(samples)
+    np.testing.assert_allclose(out, whole, atol=1e-5)
+
+    # settled, 5kHz above the centre of the channel at unity gain
+    settled = out[Ddc.TAPS_PER_PHASE:]
+    np.testing.assert_allclose(np.abs(settled), 1.0, atol=1e-3)
+    turns = np.diff(np.unwrap(np.angle(settled))) / (2 * np.pi)
+    np.testing.assert_allclose(turns * ddc.get_sample_rate(), 5e3, atol=1.0)
+
+    # outside the channel, where it would alias into it
+    rejected = Ddc.Ddc(100e3, 20e3, SPS).process(tone(100e3 + ddc.get_sample_rate() - 5e3, 33 * 600))
+    assert np.abs(rejected[Ddc.TAPS_PER_PHASE:]).max() < 1e-3
@@ -0,0 +1,34 @@
+import pytest
+
+from misc import LatencyHistogram
+
+
+def test_percentiles():
+    hist = LatencyHistogram.LatencyHistogram()
+    for _ in range(990):
+        hist.record(100e-6)
+    for _ in range(10):
+        hist.record(10e-3)
+    # bucket edges are within 1/8th of the value
+    assert hist.percentile(50.0) == pytest.approx(100e-6, rel=0.125)
+    assert hist.percentile(99.9) == pytest.approx(10e-3, rel=0.125)
+    assert hist.get_max() == pytest.approx(10e-3)
+    assert hist.get_count() == 1000
+
+
+def test_deadline_misses():
+    hist = LatencyHistogram.LatencyHistogram(budget=1e-3)
+    for value in [0.5e-3, 0.9e-3, 1.1e-3, 5e-3]:
+        hist.record(value)
+    assert hist.get_misses() == 2
+    hist.clear()
+    assert hist.get_misses() == 0
+    assert hist.percentile(50.0) == 0.0
+
+
+def test_stages_created_on_use():
+    stages = LatencyHistogram.StageHistograms(['read'], budget=1e-3)
+    stages.record('plugin.analysis', 2e-3)
+    summary = stages.summary()
+    assert summary['read']['count'] == 0
+    assert summary['plugin.analysis']['misses'] == 1
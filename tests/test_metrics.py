@@ -0,0 +1,19 @@
+from misc import Metrics
+
+
+def test_counters_and_gauges():
+    metrics = Metrics.Metrics()
+    metrics.inc(Metrics.SAMPLES, 2048)
+    metrics.inc(Metrics.SAMPLES, 2048)
+    metrics.set(Metrics.LOOP_CPU_PC, 12.5)
+    assert metrics.get(Metrics.SAMPLES) == 4096
+    text = metrics.render()
+    assert "# TYPE pyspectrum_samples_total counter\n" in text
+    assert "pyspectrum_samples_total 4096\n" in text
+    assert "pyspectrum_loop_cpu_percent 12.5\n" in text
+
+
+def test_every_metric_rendered():
+    text = Metrics.Metrics().render()
+    for name, _, _ in Metrics.METRICS:
+        assert f"\n{name} 0\n" in text
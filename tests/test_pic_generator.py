@@ -0,0 +1,73 @@
+import logging
+import os
+import pathlib
+import threading
+import time
+
+from misc import PicGenerator
+from misc import SpectrumPicture
+
+
+class FakePicture:
+    """
+    Stands in for SpectrumPicture in the workers, records each file it is asked to draw
+    """
+
+    def __init__(self, thumbnail_dir: str):
+        self._draws = pathlib.PurePath(thumbnail_dir, "draws")
+
+    def create_picture(self, filename: pathlib.PurePath) -> bool:
+        time.sleep(0.05)
+        with open(self._draws, "a") as draws:
+            draws.write(f"{filename.name}\n")
+        if filename.name.startswith("bad"):
+            raise ValueError("not samples")
+        pathlib.Path(str(filename) + ".png").touch()
+        return True
+
+
+def test_needs_picture(tmp_path):
+    for name in ["snap.a.16tle", "snap.a.16tle.png", "snap.b.sigmf-data", "snap.b.sigmf-meta", ".empty"]:
+        pathlib.Path(tmp_path, name).touch()
+    needs = sorted(path.name for path in pathlib.Path(tmp_path).iterdir() if PicGenerator.needs_picture(path))
+    assert needs == ["snap.b.sigmf-data"]
+
+
+def test_draws_each_file_once(tmp_path, monkeypatch, caplog):
+    monkeypatch.setattr(SpectrumPicture, "SpectrumPicture", FakePicture)  # the workers are forked with it
+    snap_dir = pathlib.Path(tmp_path, "snaps")
+    thumb_dir = pathlib.Path(tmp_path, "thumbs")
+    snap_dir.mkdir()
+    thumb_dir.mkdir()
+    draws = pathlib.Path(thumb_dir, "draws")
+    for name in ["old.a", "done.b", "done.b.png"]:  # old.a is found by the startup scan
+        pathlib.Path(snap_dir, name).touch()
+    new = [f"new.{number}" for number in range(6)] + ["bad.x"]
+    for name in new:
+        pathlib.Path(snap_dir, name).touch()
+    generator = PicGenerator.PicGenerator(snap_dir, thumb_dir, logging.INFO, workers=2)
+
+    def drawn() -> list:
+        return sorted(draws.read_text().split()) if draws.exists() else []
+
+    def main_loop():
+        for name in new + new[:3] + ["old.a", "done.b"]:  # a burst with duplicates
+            generator.notify(str(pathlib.PurePath(snap_dir, name)))
+        for _ in range(200):
+            if len(drawn()) >= len(new) + 1:
+                break
+            time.sleep(0.05)
+        for name in new[:-1] + ["old.a"]:  # again once they have pictures
+            generator.notify(str(pathlib.PurePath(snap_dir, name)))
+        time.sleep(0.5)
+        generator.shutdown()
+
+    notifier = threading.Thread(target=main_loop)
+    notifier.start()
+    with caplog.at_level(logging.ERROR, logger=PicGenerator.__name__):
+        generator._draw_pictures()
+    notifier.join()
+
+    assert drawn() == sorted(new + ["old.a"])
+    assert all(os.path.isfile(pathlib.PurePath(snap_dir, name + ".png")) for name in new[:-1] + ["old.a"])
+    assert "bad.x not samples" in caplog.text
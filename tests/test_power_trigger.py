@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from dataProcessing import PowerTrigger
+
+FFT_SIZE = 1000
+CF = 100e6
+SPS = 1e6  # 1kHz bins
+
+
+def frame(signal_hz: float = None, level: float = -40.0, cf: float = CF) -> np.ndarray:
+    powers = np.full(FFT_SIZE, -100.0)
+    if signal_hz is not None:
+        powers[int(round((signal_hz - cf) / 1e3)) % FFT_SIZE] = level  # zero frequency first
+    return powers
+
+
+def test_bad_rules():
+    for spec in ["mask:1:2", "noise:x", "rearm:sometimes", "peak:10"]:
+        with pytest.raises(ValueError):
+            PowerTrigger.PowerTrigger(spec)
+
+
+def test_mask_holdoff_and_rearm():
+    noise_floors = np.full(FFT_SIZE, -100.0)
+    trigger = PowerTrigger.PowerTrigger("mask:99.9e6:100.1e6:-60,holdoff:1")
+
+    # crosses zero frequency, so both ends of the powers
+    assert trigger.evaluate(frame(99.95e6), noise_floors, CF, SPS, 0)
+    assert not trigger.evaluate(frame(99.95e6), noise_floors, CF, SPS, 2e9)  # still over, edge needs it to drop
+    assert not trigger.evaluate(frame(), noise_floors, CF, SPS, 3e9)
+    assert not trigger.evaluate(frame(100.3e6), noise_floors, CF, SPS, 4e9)  # outside the mask
+    assert trigger.evaluate(frame(100.05e6), noise_floors, CF, SPS, 5e9)
+    assert not trigger.evaluate(frame(), noise_floors, CF, SPS, 5.1e9)
+    assert not trigger.evaluate(frame(100.05e6), noise_floors, CF, SPS, 5.5e9)  # in the holdoff
+    assert trigger.get_triggers() == 2
+
+    # a new centre frequency moves the mask
+    assert not trigger.evaluate(frame(102e6, cf=102e6), noise_floors, 102e6, SPS, 10e9)
+    assert trigger.evaluate(frame(100.05e6, cf=100.3e6), noise_floors, 100.3e6, SPS, 11e9)
+
+
+def test_noise_frames_and_level():
+    noise_floors = np.full(FFT_SIZE, -100.0)
+    trigger = PowerTrigger.PowerTrigger("noise:20,frames:2,rearm:level,holdoff:0")
+    for _ in range(PowerTrigger.SETTLE_FRAMES):
+        assert not trigger.evaluate(frame(100.2e6), noise_floors, CF, SPS, 0)  # the average is settling
+
+    assert not trigger.evaluate(frame(100.2e6, -85), noise_floors, CF, SPS, 0)  # only 15dB up
+    assert not trigger.evaluate(frame(100.2e6), noise_floors, CF, SPS, 0)
+    assert trigger.evaluate(frame(100.2e6), noise_floors, CF, SPS, 0)
+    assert trigger.evaluate(frame(100.2e6), noise_floors, CF, SPS, 0)  # level, again while still over
@@ -0,0 +1,28 @@
+import os
+
+from misc import Profiler
+
+
+def test_profile_stops_after_frames(tmp_path):
+    profiler = Profiler.Profiler(tmp_path)
+    profiler.start(frames=3, seconds=60)
+    assert profiler.is_running()
+    assert not profiler.tick()
+    assert not profiler.tick()
+    assert profiler.tick()
+    assert not profiler.is_running()
+
+    status = profiler.get_status()
+    assert status['state'] == 'done'
+    assert status['frames'] == 3
+    assert os.path.exists(status['file'])
+    assert len(status['top']) <= Profiler.TOP_FUNCTIONS
+    times = [entry['tottime'] for entry in status['top']]
+    assert times == sorted(times, reverse=True)
+
+
+def test_stop_when_idle(tmp_path):
+    profiler = Profiler.Profiler(tmp_path)
+    profiler.stop()
+    assert not profiler.tick()
+    assert profiler.get_status() == {'state': 'idle'}
@@ -0,0 +1,88 @@
+import os
+import pathlib
+import threading
+import time
+
+import numpy as np
+
+from dataSink import DataSink_stream
+from misc import Snapper
+
+
+def test_record_rotates(tmp_path):
+    config = Snapper.Snapper()
+    config.sps = 1e6
+    config.cf = 100e6
+    config.record_segment_mbytes = 1 / 64  # 16kBytes, two of the 8kByte buffers
+    recorder = DataSink_stream.StreamOutput(config, pathlib.PurePath(tmp_path), buffers=16, buffer_bytes=8192)
+
+    samples = np.arange(10000).astype(np.complex64)
+    for start in range(0, samples.size, 700):  # blocks that don't fit the buffers
+        recorder.write(samples[start:start + 700], 1_000_000_000 + start * 1000)
+    recorder.close()
+
+    names = sorted(os.listdir(tmp_path))
+    assert len(names) == 5  # 4 full files and what was left
+    assert sorted(os.path.basename(name) for name in recorder.get_finished()) == names
+    assert all(name.endswith(".cf100.000000.cplx.1000000.32fle") for name in names)
+    recorded = np.concatenate([np.fromfile(os.path.join(tmp_path, name), dtype=np.complex64) for name in names])
+    np.testing.assert_array_equal(recorded, samples)
+    status = recorder.get_status()
+    assert (status['segments'], status['dropped']) == (5, 0)
+    assert DataSink_stream.aligned_empty(100).ctypes.data % DataSink_stream.ALIGN == 0
+
+
+def test_record_error(tmp_path, monkeypatch):
+    config = Snapper.Snapper()
+    config.sps = 1e6
+    config.cf = 100e6
+    open_segment = DataSink_stream.StreamOutput._open_segment
+    calls = []
+
+    def fails_first(self, time_nsec):
+        calls.append(time_nsec)
+        if len(calls) == 1:
+            raise AttributeError("no sigmf")
+        open_segment(self, time_nsec)
+
+    monkeypatch.setattr(DataSink_stream.StreamOutput, "_open_segment", fails_first)
+    recorder = DataSink_stream.StreamOutput(config, pathlib.PurePath(tmp_path), buffers=2, buffer_bytes=8192)
+    recorder.write(np.zeros(1024, dtype=np.complex64), 1_000_000_000)  # a buffer full
+    for _ in range(100):
+        if recorder.get_status()['error']:
+            break
+        time.sleep(0.01)
+    assert "AttributeError" in recorder.get_status()['error']
+
+    # both buffers of the pool are free again, the failed one came back
+    recorder.write(np.zeros(2048, dtype=np.complex64), 1_002_000_000)
+    recorder.close()
+    status = recorder.get_status()
+    assert status['dropped'] == 0
+    names = os.listdir(tmp_path)
+    assert len(names) == 1 and os.path.getsize(os.path.join(tmp_path, names[0])) == 2 * 8192
+
+
+def test_stop_does_not_wait(tmp_path, monkeypatch):
+    config = Snapper.Snapper()
+    config.sps = 1e6
+    config.cf = 100e6
+    write_buffer = DataSink_stream.StreamOutput._write_buffer
+    disk = threading.Event()
+
+    def slow_disk(self, samples, time_nsec, dropped):
+        disk.wait(5)
+        write_buffer(self, samples, time_nsec, dropped)
+
+    monkeypatch.setattr(DataSink_stream.StreamOutput, "_write_buffer", slow_disk)
+    recorder = DataSink_stream.StreamOutput(config, pathlib.PurePath(tmp_path), buffers=4, buffer_bytes=8192)
+    recorder.write(np.zeros(1500, dtype=np.complex64), 1_000_000_000)  # a buffer and a part one
+    recorder.stop()  # returns with the writer stuck on the first buffer
+    assert not recorder.is_stopped() and recorder.get_finished() == []
+
+    disk.set()
+    recorder.close()
+    assert recorder.is_stopped()
+    names = os.listdir(tmp_path)
+    assert [os.path.basename(name) for name in recorder.get_finished()] == names
+    assert os.path.getsize(os.path.join(tmp_path, names[0])) == 1500 * 8
@@ -0,0 +1,139 @@
+import os
+import pathlib
+
+import numpy as np
+
+from dataSink import DataSink_file
+from dataSources import DataSource_file
+from misc import Snapper
+
+
+def test_pre_and_post_trigger(tmp_path):
+    snap_config = Snapper.Snapper()
+    snap_config.sps = 10000
+    snap_config.cf = 100e6
+    snap_config.preTriggerMilliSec = 25  # 250 samples, the ring wraps as the blocks are 100
+    snap_config.postTriggerMilliSec = 15  # 150 samples, the second block is cut short
+    sink = DataSink_file.FileOutput(snap_config, pathlib.PurePath(tmp_path))
+
+    block = 100
+    blocks = [np.arange(number * block, (number + 1) * block).astype(np.complex64) for number in range(8)]
+    for samples in blocks[:6]:
+        assert not sink.write(False, samples, 0)
+    assert sink.get_current_size_mbytes() == 8 * 250 / (1024 * 1024)
+    assert not sink.write(True, blocks[6], 1_000_000_000)
+    assert sink.write(False, blocks[7], 0)
+    sink.wait()
+    assert [os.path.basename(name) for name, _ in sink.get_finished()] == os.listdir(tmp_path)
+
+    names = os.listdir(tmp_path)
+    assert len(names) == 1 and names[0].endswith(".32fle")
+    written = np.fromfile(os.path.join(tmp_path, names[0]), dtype=np.complex64)
+    np.testing.assert_array_equal(written.real, np.arange(350, 750))
+    assert sink.get_current_size_mbytes() == 8 * 250 / (1024 * 1024)  # the pre-trigger samples for the next one
+
+
+def test_overlapping_captures(tmp_path):
+    snap_config = Snapper.Snapper()
+    snap_config.sps = 10000
+    snap_config.cf = 100e6
+    snap_config.preTriggerMilliSec = 20  # 200 samples
+    snap_config.postTriggerMilliSec = 30  # 300 samples
+    sink = DataSink_file.FileOutput(snap_config, pathlib.PurePath(tmp_path))
+
+    block = 100
+    ends = []
+    for number in range(30):
+        samples = np.arange(number * block, (number + 1) * block).astype(np.complex64)
+        # a trigger during the first capture, and another straight after it finishes
+        if sink.write(number in (5, 7, 10), samples, number * 10_000_000):
+            ends.append(number)
+        assert sink.get_active_captures() == sum(1 for start in (5, 7, 10) if start <= number < start + 2)
+    assert ends == [7, 9, 12]
+    sink.wait()
+
+    snaps = sorted((np.fromfile(name, dtype=np.complex64).real for name, _ in sink.get_finished()),
+                   key=lambda snap: snap[0])
+    assert len(snaps) == 3
+    for snap, trigger in zip(snaps, (5, 7, 10)):
+        np.testing.assert_array_equal(snap, np.arange(trigger * block - 200, trigger * block + 300))
+    assert sink.get_current_size_mbytes() == 8 * 200 / (1024 * 1024)
+
+
+def test_trigger_rejected(tmp_path):
+    snap_config = Snapper.Snapper()
+    snap_config.sps = 10000
+    snap_config.cf = 100e6
+    snap_config.preTriggerMilliSec = 0
+    snap_config.postTriggerMilliSec = 10
+    snap_config.max_write_bytes = 8 * 100 - 1  # not enough for the snap
+    sink = DataSink_file.FileOutput(snap_config, pathlib.PurePath(tmp_path))
+
+    assert sink.write(True, np.zeros(100, dtype=np.complex64), 0)
+    assert "rejected" in sink.get_and_reset_error()
+    sink.wait()
+    assert os.listdir(tmp_path) == []
+
+
+def test_write_error(tmp_path):
+    def fails(progress):
+        raise AttributeError("no sigmf")
+
+    def works(progress):
+        pathlib.Path(tmp_path, "good").write_bytes(b"1234")
+        return "good", 4
+
+    writer = DataSink_file.SnapWriter()
+    writer.put(fails, 100)
+    writer.put(works, 4)
+    writer.wait()
+    assert writer.get_finished() == [("good", 4)]  # the failed one doesn't stop the next
+    assert writer.get_pending_bytes() == 0
+
+
+def test_int_samples(tmp_path):
+    snap_config = Snapper.Snapper()
+    snap_config.sps = 10000
+    snap_config.cf = 100e6
+    snap_config.preTriggerMilliSec = 10
+    snap_config.postTriggerMilliSec = 10
+    snap_config.sample_type = '16tle'
+    sink = DataSink_file.FileOutput(snap_config, pathlib.PurePath(tmp_path))
+
+    rng = np.random.default_rng(1)
+    samples = (rng.uniform(-1.2, 1.2, 400) + 1j * rng.uniform(-1.2, 1.2, 400)).astype(np.complex64)
+    assert not sink.write(False, samples[:200], 0)
+    assert sink.get_current_size_mbytes() == 4 * 100 / (1024 * 1024)  # only the last 100 are kept
+    assert sink.write(True, samples[200:], 1_000_000_000)
+    sink.wait()
+
+    names = os.listdir(tmp_path)
+    assert len(names) == 1 and names[0].endswith(".16tle")
+    source = DataSource_file.Input(os.path.join(tmp_path, names[0]), '16tle', 10000, 100e6, 10000)
+    with open(os.path.join(tmp_path, names[0]), "rb") as file:
+        written = source.unpack_data(file.read())
+    expected = samples[100:300]
+    expected = np.clip(expected.real, -1, 1) + 1j * np.clip(expected.imag, -1, 1)  # out of range is clipped
+    np.testing.assert_allclose(written, expected, atol=1 / 32767)
+
+
+def test_channel(tmp_path):
+    snap_config = Snapper.Snapper()
+    snap_config.sps = 1e6
+    snap_config.cf = 100e6
+    snap_config.preTriggerMilliSec = 0
+    snap_config.postTriggerMilliSec = 10
+    snap_config.channel = "-200e3:10e3"
+    sink = DataSink_file.FileOutput(snap_config, pathlib.PurePath(tmp_path))
+    assert sink.get_sps() == 1e6 / 66 and sink.get_centre_frequency() == 99.8e6
+
+    samples = np.exp(2j * np.pi * -198e3 * np.arange(40000) / 1e6).astype(np.complex64)
+    assert not sink.write(True, samples[:5000], 1_000_000_000)  # 75 samples of the channel
+    assert sink.write(False, samples[5000:], 0)
+    sink.wait()
+
+    names = os.listdir(tmp_path)
+    assert len(names) == 1 and "cf99.800000" in names[0] and ".15152." in names[0]
+    written = np.fromfile(os.path.join(tmp_path, names[0]), dtype=np.complex64)
+    assert written.size == 152  # 10msec at the channel sample rate
+    np.testing.assert_allclose(np.abs(written[30:]), 1.0, atol=1e-3)  # after the filter has settled
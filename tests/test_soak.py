@@ -0,0 +1,44 @@
+import socket
+
+from misc import Sdr
+from misc import soak
+
+
+def test_sustainable():
+    assert soak.sustainable({'loop_pc': 100.0, 'misses_pc': soak.MAX_MISSES_PC})
+    assert not soak.sustainable({'loop_pc': 101.0, 'misses_pc': 0.0})
+    assert not soak.sustainable({'loop_pc': 50.0, 'misses_pc': soak.MAX_MISSES_PC + 1})
+
+
+def test_free_port():
+    port = soak.free_port()
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", port))
+
+
+def test_ramp_and_bisect(monkeypatch):
+    tried = []
+
+    def trial(pyspectrum, config, processor, plugin_manager, to_ui_queue, seconds):
+        tried.append(config.sample_rate)
+        return {'sps': config.sample_rate, 'loop_pc': 100.0 * config.sample_rate / 5e6, 'misses_pc': 0.0}
+
+    monkeypatch.setattr(soak, "run_trial", trial)
+    config = Sdr.Sdr()
+    assert soak.ramp(None, config, None, None, None, 0.1)['sps'] == 5e6
+    assert tried == [1e6, 2e6, 4e6, 8e6, 6e6, 5e6, 5.5e6]  # doubled until it failed, then bisected
+
+    tried.clear()
+    monkeypatch.setattr(soak, "MAX_SPS", 4e6)
+    assert soak.ramp(None, config, None, None, None, 0.1)['sps'] == 4e6  # never failed
+    assert tried == [1e6, 2e6, 4e6]
+
+
+def test_soak_synthetic_source(monkeypatch):
+    monkeypatch.setattr(soak, "MAX_SPS", 4e6)  # bounded, at most a few trials per configuration
+    monkeypatch.setattr(soak, "BISECT_STEPS", 1)
+    results = soak.run(Sdr.Sdr(), fft_sizes=[1024], seconds=0.05, ui_clients=[0])
+    assert {result['plugins'] for result in results} == {'off', 'on'}
+    for result in results:
+        assert result['fft_size'] == 1024 and result['ui_clients'] == 0
+        assert result['sps'] == 0 or (result['frames'] > 0 and soak.sustainable(result))
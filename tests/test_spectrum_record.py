@@ -0,0 +1,58 @@
+import datetime
+
+import numpy as np
+
+from dataSink import DataSink_spectrum
+
+FFT_SIZE = 64
+CF = 100e6
+SPS = 64e3  # 1kHz bins
+DAY_END_NSEC = int(datetime.datetime(2024, 3, 24, tzinfo=datetime.timezone.utc).timestamp() * 1e9) - 10_000_000_000
+
+
+def frame(offset_hz: float, level: float) -> np.ndarray:
+    powers = np.full(FFT_SIZE, -100.0)
+    powers[int(offset_hz / 1e3) % FFT_SIZE] = level  # zero frequency first
+    return powers
+
+
+def test_record_and_query(tmp_path):
+    recorder = DataSink_spectrum.SpectrumRecorder(tmp_path, 1.0, 'u8', width=32, block_rows=4)
+    # 20 seconds of 10 frames a second across midnight, a peak held in each row
+    for frame_number in range(200):
+        time_nsec = DAY_END_NSEC + frame_number * 100_000_000
+        level = -30.0 if frame_number % 10 == 3 else -90.0
+        recorder.add(frame(10e3, level), CF, SPS, time_nsec)
+    recorder.add(frame(10e3, -50.0), CF + 16e3, SPS, DAY_END_NSEC + 20_000_000_000)  # tuned up a quarter
+    recorder.close()
+    assert recorder.get_rows_written() == 21
+
+    reader = DataSink_spectrum.SpectrumReader(tmp_path)
+    assert reader.days() == ['2024-03-23', '2024-03-24']
+
+    times, frequencies, values = reader.query(DAY_END_NSEC, DAY_END_NSEC + 30e9)
+    assert times.size == 21 and np.all(np.diff(times) > 0)
+    assert frequencies.size == 32 and frequencies[0] == CF - SPS / 2 + 1e3  # two fft bins to each
+    signal = np.argmax(values[0])
+    assert frequencies[signal] == CF + 11e3
+    assert np.all(values[:20, signal] == -30.0)
+    assert values[0, 0] == -100.0
+
+    # the retuned row has nothing below its spectrum and the signal moved up
+    assert np.all(np.isnan(values[20, :8]))
+    assert values[20, np.argmax(np.nan_to_num(values[20], nan=-200))] == -50.0
+    assert frequencies[np.argmax(np.nan_to_num(values[20], nan=-200))] == CF + 27e3
+
+    times, frequencies, values = reader.query(DAY_END_NSEC + 9.5e9, DAY_END_NSEC + 12.5e9, CF, CF + 20e3)
+    assert times.size == 3 and values.shape == (3, frequencies.size)
+    assert frequencies[0] == CF + 1e3 and frequencies[-1] == CF + 19e3
+
+
+def test_half_floats(tmp_path):
+    recorder = DataSink_spectrum.SpectrumRecorder(tmp_path, 0.5, 'f16', width=128)
+    recorder.add(frame(-5e3, -42.25), CF, SPS, DAY_END_NSEC)
+    recorder.close()
+    _, frequencies, values = DataSink_spectrum.SpectrumReader(tmp_path).query(DAY_END_NSEC, DAY_END_NSEC)
+    assert values.shape == (1, 128)  # fft bins repeated
+    assert values.max() == -42.25
+    assert frequencies[values[0] == -42.25][0] < CF
@@ -0,0 +1,40 @@
+from flask import Flask
+from flask_restful import Api
+
+from webUI import FlaskInterface
+
+
+def make_client(status):
+    app = Flask(__name__)
+    api = Api(app)
+    api.add_resource(FlaskInterface.State, '/state',
+                     resource_class_kwargs={'status': status, 'version': FlaskInterface.StateVersion()})
+    return app.test_client()
+
+
+def test_state():
+    status = {'fps': {'set': 20, 'measured': 19.5}, 'delay': 1.0, 'snaps': ['a.wav']}
+    client = make_client(status)
+
+    reply = client.get('/state')
+    assert reply.status_code == 200
+    assert reply.json == {'version': 1, 'state': status}
+    etag = reply.headers['ETag']
+
+    # nothing changed, nothing sent
+    reply = client.get('/state', headers={'If-None-Match': etag})
+    assert reply.status_code == 304
+    assert reply.data == b""
+
+    reply = client.get('/state?keys=delay,snaps')
+    assert reply.json == {'version': 1, 'state': {'delay': 1.0, 'snaps': ['a.wav']}}
+    subset_etag = reply.headers['ETag']
+
+    # a change outside the subset moves the version on but the subset is still current
+    status['fps'] = {'set': 20, 'measured': 20.0}
+    assert client.get('/state?keys=delay,snaps', headers={'If-None-Match': subset_etag}).status_code == 304
+    reply = client.get('/state', headers={'If-None-Match': etag})
+    assert reply.status_code == 200
+    assert reply.json['version'] == 2
+
+    assert client.get('/state?keys=nothing').status_code == 400
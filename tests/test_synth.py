@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from dataSources import DataSource_synth
+
+
+def read(parameters: str, size: int = 4096, sps: float = 1e6) -> np.ndarray:
+    source = DataSource_synth.Input(parameters, "16tle", sps, 100e6, sps)
+    source.open()
+    samples, _ = source.read_cplx_samples(size)
+    return samples.copy()
+
+
+def test_tone_frequency_and_level():
+    samples = read("tone:125e3:-20,unpaced")
+    bins = np.fft.fftfreq(samples.size, 1 / 1e6)
+    assert bins[np.argmax(np.abs(np.fft.fft(samples)))] == pytest.approx(125e3, abs=1e6 / samples.size)
+    assert 10 * np.log10(np.mean(np.abs(samples) ** 2)) == pytest.approx(-20, abs=0.01)
+
+
+def test_phase_continuous_between_reads():
+    source = DataSource_synth.Input("tone:1e3:0,unpaced", "16tle", 1e6, 0, 0)
+    source.open()
+    first, time_first = source.read_cplx_samples(1000)
+    last = first[-1]
+    second, time_second = source.read_cplx_samples(1000)
+    assert np.angle(second[0] / last) == pytest.approx(2 * np.pi * 1e3 / 1e6, rel=1e-3)
+    assert time_second - time_first == pytest.approx(1e6)  # 1000 samples at 1Msps in nsec
+
+
+def test_deterministic():
+    signals = "noise:-30,ook:-200e3:-10:1e-4:0.01:32,chirp:-1e5:1e5:0.002:-20,seed:7,unpaced"
+    assert np.array_equal(read(signals), read(signals))
+
+
+def test_burst_is_keyed():
+    samples = read("burst:0:0:0.001:0.002,unpaced", size=2000)
+    assert np.all(np.abs(samples[:1000]) > 0.99)
+    assert np.all(samples[1000:] == 0)
+
+
+def test_bad_parameters():
+    source = DataSource_synth.Input("tone:1e3", "16tle", 1e6, 0, 0)
+    with pytest.raises(ValueError):
+        source.open()
@@ -0,0 +1,169 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import struct
+
+import numpy as np
+import websockets
+
+from misc import soak
+from webUI import WebSocketServer
+
+
+def test_encode_spectrum():
+    magnitudes = np.linspace(-120.0, -20.0, 1024)
+    message = WebSocketServer.encode_spectrum(2e6, 433.92e6, magnitudes, 1.5e9, 2.25e9)
+
+    data_type, sps, cf_mhz, start_sec, start_nsec, end_sec, end_nsec, num_floats, fft_size, total, start = \
+        struct.unpack_from("!2id8i", message)
+    assert data_type == 1
+    assert sps == 2000000
+    assert cf_mhz == 433.92
+    assert (start_sec, start_nsec, end_sec, end_nsec) == (1, 500000000, 2, 250000000)
+    assert (num_floats, fft_size, total, start) == (1024, 1024, 1024, 0)
+
+    # floats follow the header aligned for a direct Float32Array view
+    assert WebSocketServer.HEADER_SIZE % 4 == 0
+    assert len(message) == WebSocketServer.HEADER_SIZE + 4 * num_floats
+    floats = np.frombuffer(message, dtype='<f4', offset=WebSocketServer.HEADER_SIZE)
+    assert np.allclose(floats, magnitudes)
+
+
+def test_client_drops_oldest():
+    async def fill_and_drain():
+        client = WebSocketServer.Client("test", max_frames=3)
+        for frame in range(5):
+            client.put(frame)
+        return client.dropped, [await client.get() for _ in range(3)]
+
+    dropped, frames = asyncio.run(fill_and_drain())
+    assert dropped == 2
+    assert frames == [2, 3, 4]
+
+
+def test_broadcast_to_every_client():
+    port = soak.free_port()
+    to_ui_queue = multiprocessing.Queue(10)
+    server = WebSocketServer.WebSocketServer(to_ui_queue, logging.ERROR, port)
+    server.start()
+
+    async def receive_both():
+        for _ in range(50):  # server may take a while to start
+            try:
+                async with websockets.connect(f"ws://127.0.0.1:{port}") as first, \
+                        websockets.connect(f"ws://127.0.0.1:{port}") as second:
+                    await asyncio.sleep(0.2)  # both registered before we send
+                    for frame in range(3):
+                        to_ui_queue.put((1e6, 100e6, np.full(16, -100.0 - frame), 0, 0))
+                    return [[await asyncio.wait_for(web_socket.recv(), 5) for _ in range(3)]
+                            for web_socket in [first, second]]
+            except OSError:
+                await asyncio.sleep(0.1)
+
+    try:
+        received = asyncio.run(receive_both())
+    finally:
+        server.terminate()
+        server.join()
+    assert received[0] == received[1]
+    assert [message[-4:] for message in received[0]] == [np.float32(-100.0 - frame).tobytes() for frame in range(3)]
+
+
+def test_quantize_within_half_a_step():
+    magnitudes = np.linspace(-117.3, -12.1, 4096)
+    for wire_format in ['u8', 'u16']:
+        offset, step, values = WebSocketServer.quantize(magnitudes, WebSocketServer.WIRE_FORMATS[wire_format])
+        assert offset == -120.0
+        assert values.dtype == WebSocketServer.WIRE_FORMATS[wire_format]
+        assert np.max(np.abs(offset + values * step - magnitudes)) <= step / 2 + 1e-9
+
+
+def test_client_delta_frames():
+    async def encode_frames(frames):
+        client = WebSocketServer.Client("test")
+        client.configure('u16', True)
+        return [client.encode(WebSocketServer.Frame(1e6, 100e6, magnitudes, 0, 0)) for magnitudes in frames]
+
+    rng = np.random.default_rng(1)
+    frames = [rng.uniform(-100.0, -40.0, 512) for _ in range(3)]
+    messages = asyncio.run(encode_frames(frames))
+
+    reference = None
+    for magnitudes, message in zip(frames, messages):
+        offset, step, flags = WebSocketServer.QUANTIZED_HEADER.unpack_from(message, WebSocketServer.HEADER_SIZE)
+        values = np.frombuffer(message, dtype='<u2', offset=WebSocketServer.QUANTIZED_HEADER_SIZE)
+        assert flags & WebSocketServer.QUANTIZED_16BIT
+        if reference is None:
+            assert not flags & WebSocketServer.QUANTIZED_DELTA
+            reference = values.copy()
+        else:
+            assert flags & WebSocketServer.QUANTIZED_DELTA
+            reference += values  # wraps as the client's typed array does
+        assert np.allclose(offset + reference * np.float32(step), magnitudes, atol=step)
+
+
+def test_view_and_pooling_keep_peaks():
+    magnitudes = np.full(16384, -100.0)
+    magnitudes[5000] = -10.0
+
+    # all of it at 1500 pixels
+    factor, start, count, total = view = WebSocketServer.get_view(16384, 1e6, 100e6, 1500, 0, 0)
+    assert (factor, start, count, total) == (11, 0, 1490, 1490)
+    pooled = WebSocketServer.pool(magnitudes, view)
+    assert pooled.size == count
+    assert pooled[5000 // factor] == -10.0
+    assert np.count_nonzero(pooled == -10.0) == 1
+
+    # zoomed in to the 1/8th around the peak, the span was 2048 bins so we only pool by 2
+    peak_hz = 100e6 + (5000 / 16384 - 0.5) * 1e6
+    factor, start, count, total = view = WebSocketServer.get_view(16384, 1e6, 100e6, 1500, 1e6 / 8, peak_hz)
+    assert (factor, total) == (2, 8192)
+    assert count == 1024
+    assert start <= 2500 < start + count
+    assert WebSocketServer.pool(magnitudes, view)[2500 - start] == -10.0
+
+    # no width, no pooling
+    assert WebSocketServer.get_view(16384, 1e6, 100e6, 0, 0, 0) == (1, 0, 16384, 16384)
+
+
+def test_waterfall_history():
+    history = WebSocketServer.WaterfallHistory(rows=10, width=64)
+    for number in range(15):
+        magnitudes = np.full(256, -100.0)
+        magnitudes[number * 10] = -20.0 - number
+        history.add(WebSocketServer.Frame(1e6, 100e6, magnitudes, number * 1000, number * 1000 + 500))
+    assert len(history) == 10  # the oldest 5 have gone
+
+    rows = history.query(rows=3)
+    assert [time_ns for time_ns, _, _, _ in rows] == [12500, 13500, 14500]
+    time_ns, sps, centre, values = rows[-1]
+    assert (sps, centre, values.size) == (1e6, 100e6, 64)
+    assert WebSocketServer.HISTORY_OFFSET + values.max() * WebSocketServer.HISTORY_STEP == -34.0
+    assert np.argmax(values) == 140 // 4
+
+    # 6 rows in range pooled to 2, the peaks of both halves are kept
+    rows = history.query(start=7000, end=12500, rows=2)
+    assert [time_ns for time_ns, _, _, _ in rows] == [7500, 10500]
+    assert [np.count_nonzero(values == values.max()) for _, _, _, values in rows] == [1, 1]
+    assert [np.count_nonzero(values > 100) for _, _, _, values in rows] == [3, 3]  # a peak from each, above -100dB
+
+    messages = WebSocketServer.encode_history(rows)
+    flags = [WebSocketServer.QUANTIZED_HEADER.unpack_from(message, WebSocketServer.HEADER_SIZE)[2]
+             for message in messages]
+    assert flags == [0, WebSocketServer.QUANTIZED_LAST]
+
+
+def test_status_changes():
+    async def run():
+        client = WebSocketServer.Client("test")
+        client.put(WebSocketServer.Frame(1e6, 100e6, np.zeros(16), 0, 1))
+        client.put_status({'fps': 20, 'delay': 1.0})
+        client.put_status({'fps': 25})
+        # changes are merged and go before the frames
+        assert await client.get() == {'fps': 25, 'delay': 1.0}
+        assert isinstance(await client.get(), WebSocketServer.Frame)
+
+    asyncio.run(run())
+    message = json.loads(WebSocketServer.encode_status({'fps': np.float64(20.5), 'overflows': np.int64(3)}))
+    assert message == {'status': {'fps': 20.5, 'overflows': 3}}